@@ -1,7 +1,7 @@
 """Configuration management using pydantic-settings."""
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 
@@ -68,9 +68,148 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = Field(..., description="Gemini API Key")
     GEMINI_MODEL: str = "gemini-2.0-flash"
 
+    # Fila justa de geração com IA (app.utils.fair_queue)
+    AI_MAX_CONCURRENCY: int = Field(default=8, description="Gerações simultâneas por processo, divididas entre tenants por peso (0 = sem fila)")
+    AI_MAX_QUEUE_TIME: float = Field(default=20.0, description="Espera máxima na fila antes de responder com a mensagem de contingência (segundos)")
+    AI_PLAN_WEIGHTS: Dict[str, float] = Field(
+        default={"trial": 1.0, "starter": 1.0, "professional": 2.0, "tenet": 4.0},
+        description="Peso na fila por plano (sobrescrito por plans.features.ai_weight)"
+    )
+    AI_PLAN_WEIGHT_CACHE_TTL: float = Field(default=300.0, description="Tempo de cache do peso de cada tenant (segundos)")
+    AI_QUEUE_FALLBACK_MESSAGE: str = Field(
+        default="Recebemos sua mensagem! Estamos com alta demanda no momento e já já retornamos. 🙏",
+        description="Resposta enviada quando a fila de IA excede AI_MAX_QUEUE_TIME"
+    )
+
+    # RAG (Base de Conhecimento)
+    RAG_CONTEXT_TOKEN_BUDGET: int = Field(
+        default=1200,
+        description="Orçamento padrão de tokens do contexto RAG por chamada (sobrescrito por tenets.rag_token_budget)"
+    )
+    RAG_CHUNK_TOKENS: int = Field(
+        default=300,
+        description="Tamanho máximo (em tokens estimados) de cada trecho de documento no contexto RAG"
+    )
+    EMBEDDING_MODEL: str = Field(
+        default="models/embedding-001",
+        description="Modelo de embedding padrão (tenants migrados usam tenets.embedding_model)"
+    )
+    EMBEDDING_REINDEX_PAGE_SIZE: int = Field(default=200, description="Linhas lidas por página no re-index")
+    EMBEDDING_REINDEX_BATCH_SIZE: int = Field(default=50, description="Textos por chamada de embedding no re-index")
+    EMBEDDING_REINDEX_REQUESTS_PER_MINUTE: int = Field(
+        default=60,
+        description="Limite de chamadas de embedding por minuto durante o re-index"
+    )
+
+    # Timeouts das etapas paralelas do webhook (segundos)
+    WEBHOOK_HISTORY_TIMEOUT: float = Field(default=3.0, description="Timeout para carregar histórico da conversa")
+    WEBHOOK_QUOTA_TIMEOUT: float = Field(default=2.0, description="Timeout para verificar cota de tokens")
+    WEBHOOK_RAG_TIMEOUT: float = Field(default=2.5, description="Timeout para busca na Base de Conhecimento")
+
+    # Pipeline de mensagens (app.services.message_pipeline)
+    PIPELINE_ASYNC_SIDE_EFFECTS: bool = Field(default=True, description="CRM, Sheets e email em background, sem segurar a resposta do webhook")
+    PIPELINE_DEDUP_TTL: float = Field(default=600.0, description="Janela (segundos) para ignorar reentregas do mesmo message_id")
+    PIPELINE_DEDUP_MAX_ENTRIES: int = Field(default=10000, description="IDs mantidos antes de limpar os expirados")
+
+    # Workers de background (app.utils.background)
+    WORKER_SHUTDOWN_TIMEOUT: float = Field(default=15.0, description="Prazo total para os workers terminarem no encerramento (segundos)")
+
+    # CRM Configuration
+    CRM_REQUEST_TIMEOUT: float = Field(default=15.0, description="Timeout por requisição HTTP aos CRMs (sobrescrito por extra_config.timeout)")
+    CRM_PROVIDER_TIMEOUT: float = Field(default=30.0, description="Tempo máximo total de envio de um lead para cada CRM")
+    CRM_OUTBOX_ENABLED: bool = Field(default=True, description="Envia leads aos CRMs via outbox em background (False = envio direto no webhook; adiados ainda vão ao outbox)")
+    CRM_OUTBOX_POLL_INTERVAL: float = Field(default=2.0, description="Intervalo entre ciclos do dispatcher do outbox (segundos)")
+    CRM_OUTBOX_BATCH_SIZE: int = Field(default=50, description="Itens do outbox reservados por ciclo")
+    CRM_OUTBOX_MAX_ATTEMPTS: int = Field(default=8, description="Tentativas antes de marcar o envio como falho")
+    CRM_OUTBOX_BACKOFF_BASE: float = Field(default=5.0, description="Atraso base do backoff exponencial (segundos)")
+    CRM_OUTBOX_BACKOFF_MAX: float = Field(default=3600.0, description="Atraso máximo entre tentativas (segundos)")
+    CRM_RATE_LIMIT_MAX_WAIT: float = Field(default=5.0, description="Espera máxima na fila do rate limit antes de adiar o envio (segundos)")
+    CRM_CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5, description="Falhas seguidas que abrem o circuito de um CRM")
+    CRM_CIRCUIT_COOLDOWN: float = Field(default=60.0, description="Tempo com o circuito aberto antes de nova tentativa (segundos)")
+
+    # Google Sheets
+    SHEETS_BATCH_SIZE: int = Field(default=50, description="Linhas no buffer do tenant que disparam gravação imediata")
+    SHEETS_FLUSH_INTERVAL: float = Field(default=5.0, description="Intervalo máximo entre gravações na planilha (segundos)")
+    SHEETS_MAX_BUFFERED_ROWS: int = Field(default=1000, description="Máximo de linhas em buffer por tenant")
+    SHEETS_CACHE_TTL: float = Field(default=1800.0, description="Tempo de cache do cliente/worksheet por tenant (segundos)")
+    SHEETS_FLUSH_MAX_ATTEMPTS: int = Field(default=8, description="Falhas seguidas de gravação antes de descartar o buffer do tenant")
+    SHEETS_BACKOFF_BASE: float = Field(default=10.0, description="Atraso base entre tentativas de gravação na planilha (segundos)")
+    SHEETS_BACKOFF_MAX: float = Field(default=900.0, description="Atraso máximo entre tentativas de gravação na planilha (segundos)")
+
+    # Credenciais Google (Calendar/Sheets)
+    GOOGLE_CREDENTIALS_CACHE_TTL: float = Field(default=900.0, description="Tempo até recarregar credenciais do banco (segundos)")
+    GOOGLE_TOKEN_REFRESH_MARGIN: float = Field(default=300.0, description="Renova o token quando faltar menos que isso para expirar (segundos)")
+    GOOGLE_TOKEN_REFRESH_CHECK_INTERVAL: float = Field(default=60.0, description="Intervalo do refresh proativo de tokens (segundos)")
+    AVAILABILITY_CACHE_TTL: float = Field(default=60.0, description="Cache da disponibilidade da agenda por tenant (segundos)")
+    AVAILABILITY_CACHE_MAX_ENTRIES: int = Field(default=1000, description="Consultas de disponibilidade mantidas em cache (as mais antigas saem primeiro)")
+
+    # Notificações por email
+    NOTIFICATION_OUTBOX_POLL_INTERVAL: float = Field(default=2.0, description="Intervalo entre ciclos do outbox de emails (segundos)")
+    NOTIFICATION_OUTBOX_BATCH_SIZE: int = Field(default=50, description="Emails reservados por ciclo")
+    NOTIFICATION_MAX_ATTEMPTS: int = Field(default=5, description="Tentativas antes de marcar o email como falho")
+    NOTIFICATION_BACKOFF_BASE: float = Field(default=30.0, description="Atraso base entre tentativas de email (segundos)")
+    NOTIFICATION_BACKOFF_MAX: float = Field(default=3600.0, description="Atraso máximo entre tentativas de email (segundos)")
+    NOTIFICATION_DIGEST_CHECK_INTERVAL: float = Field(default=300.0, description="Intervalo entre verificações de resumos vencidos (segundos)")
+    NOTIFICATION_DIGEST_MAX_EVENTS: int = Field(default=1000, description="Eventos lidos por agência em cada resumo")
+    SMTP_MAX_CONNECTIONS_PER_HOST: int = Field(default=3, description="Conexões SMTP simultâneas por servidor")
+    SMTP_IDLE_TIMEOUT: float = Field(default=60.0, description="Tempo que uma sessão SMTP ociosa fica no pool (segundos)")
+    SMTP_TIMEOUT: float = Field(default=15.0, description="Timeout de conexão/comandos SMTP (segundos)")
+    SMTP_ALLOW_PLAINTEXT: bool = Field(default=False, description="Permite autenticar em servidores SMTP sem STARTTLS (apenas desenvolvimento)")
+
+    # Redis (opcional): estado compartilhado entre workers
+    REDIS_URL: str = Field(default="", description="URL do Redis (ex.: redis://localhost:6379/0); vazio = estado em memória")
+
+    # Logging (app.utils.logger)
+    LOG_QUEUE_ENABLED: bool = Field(default=True, description="Formata e escreve os logs em uma thread dedicada (QueueHandler/QueueListener)")
+    LOG_QUEUE_SIZE: int = Field(default=10000, description="Registros pendentes na fila de logs antes de descartar")
+    LOG_INFO_RATE_PER_LOGGER: float = Field(default=50.0, description="Registros INFO/DEBUG por segundo por logger (0 = sem limite)")
+    LOG_INFO_BURST: float = Field(default=200.0, description="Rajada de registros INFO/DEBUG permitida por logger")
+    LOG_INFO_SAMPLE_RATE: float = Field(default=1.0, description="Fração dos registros INFO/DEBUG mantida (1.0 = todos)")
+
+    # Métricas (GET /health/metrics)
+    METRICS_TOKEN: str = Field(default="", description="Token interno para coletores de métricas (header X-Metrics-Token); vazio = só super_admin")
+
+    # Audit logs (app.services.audit_service)
+    AUDIT_ASYNC_ENABLED: bool = Field(default=True, description="Grava audit logs em lote por um worker em background (False = insert por evento)")
+    AUDIT_FLUSH_INTERVAL: float = Field(default=2.0, description="Intervalo máximo entre gravações de audit logs (segundos)")
+    AUDIT_BATCH_SIZE: int = Field(default=200, description="Eventos por insert em lote (e que disparam gravação imediata)")
+    AUDIT_MAX_BUFFERED: int = Field(default=5000, description="Eventos em memória; acima disso vão para o spool em disco")
+    AUDIT_SPOOL_DIR: str = Field(default="/tmp/tenet-audit-spool", description="Diretório do spool de audit logs (eventos não gravados no banco)")
+    AUDIT_REPLAY_MAX_FAILURES: int = Field(default=5, description="Falhas ao regravar um lote do spool antes de isolar as linhas recusadas no dead-letter")
+
+    # Retenção de dados (app.services.data_retention_service)
+    RETENTION_BATCH_SIZE: int = Field(default=100, description="Linhas por lote da retenção (ids no filtro in.(), ~4KB de URL a cada 100)")
+    RETENTION_BATCH_DELAY: float = Field(default=0.5, description="Pausa entre lotes da retenção para aliviar o banco (segundos)")
+    RETENTION_MAX_BATCHES_PER_RUN: int = Field(default=0, description="Lotes por política em cada execução (0 = até terminar); o restante é retomado depois")
+
+    # Rate limiting (slowapi)
+    RATE_LIMIT_STORAGE_URI: str = Field(default="", description="Storage dos contadores (ex.: redis://...); vazio = REDIS_URL ou memória")
+    RATE_LIMIT_STRATEGY: str = Field(default="sliding-window-counter", description="Estratégia: sliding-window-counter, moving-window ou fixed-window")
+    WEBHOOK_TENANT_RATE_LIMIT: str = Field(default="300/minute", description="Limite do webhook Evolution por instância (agência)")
+    WEBHOOK_IP_RATE_LIMIT: str = Field(default="3000/minute", description="Limite do webhook Evolution por origem, somando todas as instâncias")
+    WEBHOOK_INSTANCE_CACHE_TTL: float = Field(default=300.0, description="Tempo em cache da verificação de instância cadastrada no webhook (segundos)")
+    RATE_LIMIT_STORAGE_TIMEOUT: float = Field(default=2.0, description="Timeout de conexão/comandos com o storage de rate limit (segundos)")
+
     # WhatsApp Configuration
     EVOLUTION_API_URL: str = Field(default="", description="URL da Evolution API")
     EVOLUTION_API_KEY: str = Field(default="", description="API Key da Evolution API")
+    EVOLUTION_TIMEOUT: float = Field(default=15.0, description="Timeout das requisições à Evolution API (segundos)")
+    EVOLUTION_MAX_RETRIES: int = Field(default=2, description="Retentativas em falhas transitórias da Evolution API")
+    EVOLUTION_RETRY_BACKOFF_BASE: float = Field(default=0.5, description="Atraso base entre retentativas (segundos)")
+    EVOLUTION_RETRY_BACKOFF_MAX: float = Field(default=4.0, description="Atraso máximo entre retentativas (segundos)")
+    WHATSAPP_OUTBOX_ENABLED: bool = Field(default=True, description="Envia respostas via fila em background (False = envio direto no webhook)")
+    WHATSAPP_OUTBOX_POLL_INTERVAL: float = Field(default=1.0, description="Intervalo entre ciclos da fila de envio (segundos)")
+    WHATSAPP_OUTBOX_BATCH_SIZE: int = Field(default=100, description="Mensagens reservadas por ciclo")
+    WHATSAPP_OUTBOX_MAX_PER_SENDER: int = Field(default=10, description="Mensagens reservadas por remetente em cada ciclo")
+    WHATSAPP_OUTBOX_MAX_ATTEMPTS: int = Field(default=5, description="Tentativas antes de marcar a mensagem como falha")
+    WHATSAPP_OUTBOX_BACKOFF_BASE: float = Field(default=2.0, description="Atraso base entre tentativas de envio (segundos)")
+    WHATSAPP_OUTBOX_BACKOFF_MAX: float = Field(default=120.0, description="Atraso máximo entre tentativas de envio (segundos)")
+    WHATSAPP_MESSAGES_PER_SECOND: float = Field(default=1.0, description="Mensagens por segundo por instância/número")
+    WHATSAPP_BURST: float = Field(default=3.0, description="Rajada máxima de mensagens por instância/número")
+    WHATSAPP_SHAPING_MAX_WAIT: float = Field(default=10.0, description="Espera máxima pela cadência antes de reagendar (segundos)")
+    WHATSAPP_TYPING_CHARS_PER_SECOND: float = Field(default=25.0, description="Velocidade simulada de digitação (0 desativa)")
+    WHATSAPP_TYPING_MAX_DELAY: float = Field(default=4.0, description="Tempo máximo de 'digitando...' (segundos)")
+    EVOLUTION_MAX_CONCURRENCY_PER_INSTANCE: int = Field(default=4, description="Requisições simultâneas por instância")
 
     # Google Calendar
     GOOGLE_CLIENT_ID: str = Field(
@@ -91,6 +230,10 @@ class Settings(BaseSettings):
         default="tenet_ai_verify_token",
         description="Token para verificação do webhook Meta"
     )
+    META_APP_SECRET: str = Field(
+        default="",
+        description="App secret da Meta para validar o X-Hub-Signature-256 dos webhooks (obrigatório em produção)"
+    )
 
     # Alertas
     SLACK_WEBHOOK_URL: str = Field(
@@ -4,13 +4,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import time
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.starlette import StarletteIntegration
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from app.utils.rate_limit import limiter
+from app.utils.rate_limit import limiter, check_rate_limit_storage
 from app.middleware.request_id import RequestIDMiddleware
+from app.middleware.webhook_tenant import WebhookTenantMiddleware
 from app.routes import health, webhooks, knowledge, templates, ab_tests, export, admin_metrics, lgpd
 from app.routes.lgpd import router as lgpd_router
 from app.routes.auth import router as auth_router
@@ -27,6 +29,16 @@ from app.routes.admin_config import router as admin_config_router
 from app.routes.billing import router as billing_router
 from app.routes.register import router as register_router
 from app.database import health_check
+from app.utils.background import stop_workers
+from app.utils.http_client import close_http_clients
+from app.services.crm_outbox_service import crm_outbox_dispatcher
+from app.services.google_sheets_service import sheets_writer
+from app.services.google_credentials_service import google_credentials
+from app.services.notification_service import notification_dispatcher
+from app.services.notification_digest_service import notification_digest
+from app.services.whatsapp_outbox_service import whatsapp_outbox
+from app.services.message_pipeline import message_pipeline
+from app.services.audit_service import audit_writer
 from app.config import settings
 
 # Inicializa Sentry se configurado
@@ -86,11 +98,12 @@ app.add_middleware(
 )
 
 # Log das origins configuradas (apenas em startup)
-import logging
-logger = logging.getLogger(__name__)
+from app.utils.logger import get_logger
+logger = get_logger(__name__)
 logger.info(f"CORS configurado para origins: {cors_origins}")
 
 app.add_middleware(RequestIDMiddleware)
+app.add_middleware(WebhookTenantMiddleware)
 
 # Include routers
 app.include_router(health.router)
@@ -152,6 +165,39 @@ async def startup_event():
         print("✓ Database connection successful")
     else:
         print("✗ Database connection failed")
+    await check_rate_limit_storage()
+
+    # Sempre ativo: no envio direto (CRM_OUTBOX_ENABLED=False) os envios
+    # adiados por rate limit/circuito também seguem pelo outbox
+    crm_outbox_dispatcher.start()
+    sheets_writer.start()
+    google_credentials.start()
+    notification_dispatcher.start()
+    notification_digest.start()
+    if settings.WHATSAPP_OUTBOX_ENABLED:
+        whatsapp_outbox.start()
+    if settings.AUDIT_ASYNC_ENABLED:
+        audit_writer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Application shutdown event handler."""
+    # Efeitos colaterais pendentes ainda enfileiram CRM/email/WhatsApp
+    await message_pipeline.drain()
+    # Workers param em paralelo, sem bloquear o loop, dentro de um prazo comum
+    deadline = time.monotonic() + settings.WORKER_SHUTDOWN_TIMEOUT
+    await stop_workers([
+        whatsapp_outbox,
+        crm_outbox_dispatcher,
+        sheets_writer,
+        google_credentials,
+        notification_digest,
+        notification_dispatcher,
+    ], timeout=settings.WORKER_SHUTDOWN_TIMEOUT)
+    # Por último: grava os audit logs em buffer (ou os deixa no spool em disco)
+    await stop_workers([audit_writer], timeout=max(deadline - time.monotonic(), 1.0))
+    await close_http_clients()
 
 
 @app.exception_handler(Exception)
@@ -2,6 +2,7 @@
 import uuid
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from app.utils.request_context import bind_context
 
 class RequestIDMiddleware(BaseHTTPMiddleware):
     """Middleware que adiciona um ID único a cada requisição"""
@@ -10,7 +11,9 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
         request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
         request.state.request_id = request_id
         
-        response = await call_next(request)
+        # Logs e métricas da requisição (e das tasks que ela criar) levam o ID
+        with bind_context(request_id=request_id):
+            response = await call_next(request)
         response.headers["X-Request-ID"] = request_id
         
         return response
@@ -0,0 +1,102 @@
+"""
+Identifica a agência (instance) do webhook Evolution antes do rate limit.
+O slowapi calcula a chave de forma síncrona, sem acesso ao corpo; este
+middleware ASGI lê o corpo, guarda a instância em `request.state` e
+repassa o corpo intacto para a rota.
+
+O campo `instance` vem do corpo sem autenticação: só é usado como chave
+quando pertence a uma agência cadastrada (consulta em cache), senão o
+rate limit segue pela origem.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Iterable, Tuple
+from app.config import settings
+from app.database import get_supabase_client
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+WEBHOOK_PATHS = ("/webhooks/whatsapp",)
+
+# Instâncias verificadas (cadastrada?, expira_em), em ordem de uso
+MAX_CACHED_INSTANCES = 10000
+_known_instances: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+
+
+class WebhookTenantMiddleware:
+    """Middleware ASGI puro: preenche `request.state.webhook_instance`."""
+
+    def __init__(self, app, paths: Iterable[str] = WEBHOOK_PATHS):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        instance = extract_instance(body)
+        if instance and await is_known_instance(instance):
+            scope.setdefault("state", {})["webhook_instance"] = instance
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+def extract_instance(body: bytes) -> str:
+    """Campo `instance` do payload da Evolution ('' se ausente ou inválido)."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return ""
+    instance = payload.get("instance") if isinstance(payload, dict) else None
+    return instance if isinstance(instance, str) else ""
+
+
+def _lookup_instance(instance: str) -> bool:
+    result = get_supabase_client().table("tenets").select("id")\
+        .eq("instance_name", instance).limit(1).execute()
+    return bool(result.data)
+
+
+async def is_known_instance(instance: str) -> bool:
+    """True se a instância pertence a uma agência cadastrada (com cache)."""
+    now = time.monotonic()
+    cached = _known_instances.get(instance)
+    if cached and cached[1] > now:
+        _known_instances.move_to_end(instance)
+        return cached[0]
+
+    try:
+        known = await asyncio.to_thread(_lookup_instance, instance)
+    except Exception as e:
+        # Sem confirmação a chave fica na origem; não entra no cache
+        logger.warning(f"Erro ao verificar instância do webhook '{instance[:50]}': {e}")
+        return False
+
+    _known_instances[instance] = (known, now + settings.WEBHOOK_INSTANCE_CACHE_TTL)
+    _known_instances.move_to_end(instance)
+    while len(_known_instances) > MAX_CACHED_INSTANCES:
+        _known_instances.popitem(last=False)
+    return known
@@ -1,7 +1,6 @@
 """
 Rotas administrativas para gerenciamento de agências.
 """
-import logging
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends
 from app.database import get_supabase_client
@@ -9,9 +8,10 @@ from app.services.tenet_service import TenetService
 from app.schemas.admin import TenetConfigResponse, TenetConfigUpdate, ApiResponse
 from app.utils.security import EncryptionService
 from app.routes.auth import get_current_user
+from app.utils.logger import get_logger
 
 # Configurar logging
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Aliases para compatibilidade
 AgencyConfigUpdate = TenetConfigUpdate
@@ -2,14 +2,14 @@
 """
 Rotas para configuração do admin do Tenet.
 """
-import logging
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional
 from app.routes.auth import get_current_user
 from app.database import get_supabase_client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/admin-config", tags=["Admin Config"])
 
@@ -1,7 +1,6 @@
 """
 Rotas para integração com Google Calendar.
 """
-import logging
 import os
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, Query
@@ -11,8 +10,9 @@ from typing import Optional, List
 from app.routes.auth import get_current_user
 from app.services.google_calendar_service import google_calendar_service
 from app.database import get_supabase_client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/google-calendar", tags=["Google Calendar"])
 
@@ -181,6 +181,7 @@ async def create_event(
 async def get_available_slots(
     date: str = Query(..., description="Data no formato YYYY-MM-DD"),
     duration: int = Query(60, description="Duração em minutos"),
+    days: int = Query(1, ge=1, le=14, description="Quantidade de dias a partir da data"),
     current_user: dict = Depends(get_current_user)
 ):
     """Retorna horários disponíveis para agendamento."""
@@ -190,6 +191,16 @@ async def get_available_slots(
 
     try:
         date_obj = datetime.strptime(date, "%Y-%m-%d")
+
+        if days > 1:
+            availability = await google_calendar_service.get_availability(
+                tenet_id=tenet_id,
+                start_date=date_obj.date(),
+                days=days,
+                duration_minutes=duration
+            )
+            return {"date": date, "slots": availability.get(date, []), "days": availability}
+
         slots = await google_calendar_service.get_available_slots(
             tenet_id=tenet_id,
             date=date_obj,
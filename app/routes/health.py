@@ -1,7 +1,13 @@
 
 """Health check endpoint."""
-from fastapi import APIRouter, HTTPException
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.security import HTTPAuthorizationCredentials
+from app.config import settings
 from app.database import health_check
+from app.routes.auth import get_current_user
+from app.utils.metrics import metrics
 
 router = APIRouter()
 
@@ -90,3 +96,33 @@ async def detailed_health_check():
         "service": "Tenet AI",
         "checks": checks
     }
+
+
+async def require_metrics_access(
+    authorization: Optional[str] = Header(default=None),
+    x_metrics_token: Optional[str] = Header(default=None)
+):
+    """
+    As métricas têm séries por tenant: exige o token interno (X-Metrics-Token,
+    para coletores) ou um usuário super_admin.
+    """
+    if settings.METRICS_TOKEN and x_metrics_token and \
+            hmac.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        return
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Não autenticado")
+
+    user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    if user.get("role") != "super_admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+
+@router.get("/health/metrics", dependencies=[Depends(require_metrics_access)])
+async def metrics_snapshot():
+    """
+    Snapshot das métricas em memória deste processo.
+    Útil para depuração de latência e consumo por tenant.
+    """
+    return metrics.snapshot()
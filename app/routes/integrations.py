@@ -2,15 +2,15 @@
 """
 Rotas para gerenciamento de integrações CRM.
 """
-import logging
 from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from app.database import get_supabase_client
 from app.services.crm_service import CRMService
 from app.routes.auth import get_current_user
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 router = APIRouter(prefix="/api/integrations", tags=["Integrations"])
 
 
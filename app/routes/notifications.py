@@ -2,15 +2,15 @@
 """
 Rotas para gerenciamento de notificações por email.
 """
-import logging
-from typing import Optional, List
+from typing import Literal, Optional, List
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
 from app.database import get_supabase_client
 from app.services.notification_service import NotificationService
 from app.routes.auth import get_current_user
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
 
 
@@ -18,12 +18,22 @@ router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
 # SCHEMAS
 # ============================================
 
+class EmailBranding(BaseModel):
+    name: Optional[str] = None
+    primary_color: Optional[str] = None
+    secondary_color: Optional[str] = None
+    logo_url: Optional[str] = None
+    footer_text: Optional[str] = None
+
+
 class NotificationConfigUpdate(BaseModel):
     email_ativo: bool = False
     emails_destinatarios: List[str] = []
     notificar_lead_qualificado: bool = True
     notificar_lead_agendado: bool = True
     notificar_resumo_diario: bool = False
+    frequencia_resumo: Literal["horario", "diario"] = "diario"
+    branding: EmailBranding = EmailBranding()
     smtp_host: Optional[str] = None
     smtp_port: int = 587
     smtp_user: Optional[str] = None
@@ -67,6 +77,8 @@ async def get_notification_config(
             "notificar_lead_qualificado": True,
             "notificar_lead_agendado": True,
             "notificar_resumo_diario": False,
+            "frequencia_resumo": "diario",
+            "branding": {},
             "smtp_host": None,
             "smtp_port": 587,
             "smtp_user": None,
@@ -82,6 +94,8 @@ async def get_notification_config(
         "notificar_lead_qualificado": config.get("notificar_lead_qualificado", True),
         "notificar_lead_agendado": config.get("notificar_lead_agendado", True),
         "notificar_resumo_diario": config.get("notificar_resumo_diario", False),
+        "frequencia_resumo": config.get("frequencia_resumo") or "diario",
+        "branding": config.get("branding") or {},
         "smtp_host": config.get("smtp_host"),
         "smtp_port": config.get("smtp_port", 587),
         "smtp_user": config.get("smtp_user"),
@@ -163,7 +177,8 @@ async def send_test_email(
     success = await notification_service.send_lead_notification(
         tenet_id=tenet_id,
         lead_data=test_lead,
-        notification_type="qualificado"
+        notification_type="qualificado",
+        immediate=True
     )
     
     if success:
@@ -2,15 +2,15 @@
 """
 Rotas de registro público de novos tenets.
 """
-import logging
 from datetime import datetime, timezone
 from typing import Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr, Field
 from passlib.context import CryptContext
 from app.database import get_supabase_client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 router = APIRouter(prefix="/api/register", tags=["Register"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -1,7 +1,6 @@
 """
 Rotas de Super Admin para gerenciamento de tenets e usuários.
 """
-import logging
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, Request
@@ -10,8 +9,9 @@ from app.database import get_supabase_client
 from app.routes.auth import get_current_user
 from app.utils.security import EncryptionService
 from passlib.context import CryptContext
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 router = APIRouter(prefix="/api/admin", tags=["Super Admin"])
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
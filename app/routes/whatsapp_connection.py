@@ -1,7 +1,6 @@
 """
 Rotas para gerenciamento de conexão WhatsApp via Evolution API.
 """
-import logging
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional
@@ -9,8 +8,9 @@ from app.routes.auth import get_current_user
 from app.services.evolution_instance_service import evolution_service
 from app.database import get_supabase_client
 from app.config import settings
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/whatsapp", tags=["WhatsApp Connection"])
 
@@ -2,12 +2,12 @@
 """
 Serviço para gerenciar comandos do admin via WhatsApp e relatórios.
 """
-import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List
 from app.database import get_supabase_client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class AdminWhatsAppService:
@@ -384,15 +384,17 @@ class AdminWhatsAppService:
             # Gerar relatório
             report = await self._generate_full_report(tenet_id)
             
-            # Enviar via Evolution API
-            from app.services.whatsapp_service import whatsapp_service
-            await whatsapp_service.send_message(
-                instance_name=instance_name,
-                to=admin_number,
+            # Enviar via fila de saída (Evolution API)
+            from app.services.whatsapp_outbox_service import whatsapp_outbox
+            result = await whatsapp_outbox.enqueue(
+                tenet_id=tenet_id,
+                channel="evolution",
+                sender_id=instance_name,
+                recipient=admin_number,
                 message=f"📊 *Relatório Diário*\n\n{report}"
             )
             
-            return True
+            return result.get("success", False)
             
         except Exception as e:
             logger.error(f"Erro ao enviar relatório diário: {e}")
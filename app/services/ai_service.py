@@ -2,18 +2,50 @@
 Serviço de IA para geração de respostas usando Google Gemini.
 Inclui suporte a histórico de conversas e extração de dados do lead.
 """
-import logging
+import asyncio
 import json
 import re
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
 import google.generativeai as genai
 from app.config import settings
 from app.services.token_tracking_service import TokenTrackingService
 from app.database import get_supabase_client
+from app.utils.fair_queue import FairQueue, QueueTimeout
+from app.utils.metrics import metrics
+from app.utils.logger import get_logger
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+
+# Vagas de geração divididas entre tenants pelo peso do plano
+ai_queue = FairQueue("ai", settings.AI_MAX_CONCURRENCY)
+
+_tenet_weights: Dict[str, Tuple[float, float]] = {}
+
+
+def _load_tenet_weight(tenet_id: str) -> float:
+    """Peso do plano da assinatura: plans.features.ai_weight ou AI_PLAN_WEIGHTS."""
+    result = get_supabase_client().table("subscriptions").select(
+        "plans(name, features)"
+    ).eq("tenet_id", tenet_id).execute()
+
+    plan = (result.data[0].get("plans") if result.data else None) or {"name": "trial"}
+    features = plan.get("features") or {}
+    return float(features.get("ai_weight") or settings.AI_PLAN_WEIGHTS.get(plan.get("name"), 1.0))
+
+
+async def get_tenet_weight(tenet_id: str) -> float:
+    """Peso do tenant na fila de IA, em cache por AI_PLAN_WEIGHT_CACHE_TTL."""
+    cached = _tenet_weights.get(tenet_id)
+    if cached and time.monotonic() - cached[1] < settings.AI_PLAN_WEIGHT_CACHE_TTL:
+        return cached[0]
+    try:
+        weight = await asyncio.to_thread(_load_tenet_weight, tenet_id)
+    except Exception as e:
+        logger.warning(f"Erro ao buscar plano do tenant {tenet_id}, usando peso 1: {e}")
+        return 1.0
+    _tenet_weights[tenet_id] = (weight, time.monotonic())
+    return weight
 
 
 class AIService:
@@ -39,7 +71,7 @@ class AIService:
         # Usar modelo gemini-2.0-flash
         self.model = genai.GenerativeModel('gemini-2.0-flash')
 
-        logger.info("AIService inicializado com sucesso")
+        logger.debug("AIService inicializado com sucesso")
 
     async def generate_response(
         self,
@@ -48,7 +80,52 @@ class AIService:
         agency_prompt: Optional[str] = None,
         conversation_history: Optional[str] = None,
         lead_data: Optional[Dict[str, Any]] = None,
-        agent_config: Optional[Dict[str, Any]] = None
+        agent_config: Optional[Dict[str, Any]] = None,
+        knowledge_context: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Gera uma resposta usando o Gemini AI, na vez do tenant na fila justa.
+
+        Se a espera passar de AI_MAX_QUEUE_TIME, retorna a mensagem de
+        contingência (`fallback: True`) sem chamar o Gemini.
+        """
+        tenet_id = (agent_config or {}).get("tenet_id")
+        if not tenet_id or settings.AI_MAX_CONCURRENCY <= 0:
+            return await self._generate_response(
+                message, agency_name, agency_prompt, conversation_history,
+                lead_data, agent_config, knowledge_context
+            )
+
+        weight = await get_tenet_weight(tenet_id)
+        try:
+            await ai_queue.acquire(tenet_id, weight, timeout=settings.AI_MAX_QUEUE_TIME)
+        except QueueTimeout:
+            logger.warning(f"Fila de IA excedeu {settings.AI_MAX_QUEUE_TIME}s para tenant {tenet_id}; enviando contingência")
+            metrics.increment("ai_queue_fallbacks", tenet_id=tenet_id)
+            return {
+                "response": settings.AI_QUEUE_FALLBACK_MESSAGE,
+                "extracted_data": {},
+                "success": False,
+                "fallback": True
+            }
+
+        try:
+            return await self._generate_response(
+                message, agency_name, agency_prompt, conversation_history,
+                lead_data, agent_config, knowledge_context
+            )
+        finally:
+            ai_queue.release()
+
+    async def _generate_response(
+        self,
+        message: str,
+        agency_name: str,
+        agency_prompt: Optional[str] = None,
+        conversation_history: Optional[str] = None,
+        lead_data: Optional[Dict[str, Any]] = None,
+        agent_config: Optional[Dict[str, Any]] = None,
+        knowledge_context: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Gera uma resposta usando o Gemini AI.
@@ -60,12 +137,13 @@ class AIService:
             conversation_history: Histórico formatado da conversa (opcional)
             lead_data: Dados já conhecidos do lead (opcional)
             agent_config: Configurações personalizadas para o agente (opcional)
+            knowledge_context: Contexto da Base de Conhecimento (RAG) já limitado ao orçamento de tokens (opcional)
 
         Returns:
             Dict contendo resposta e dados extraídos do lead
         """
         try:
-            logger.info("Iniciando geração de resposta IA")
+            logger.debug("Iniciando geração de resposta IA")
 
             # Construir contexto do lead
             lead_context = ""
@@ -82,6 +160,16 @@ class AIService:
                 if known_data:
                     lead_context = "\n=== DADOS JÁ CONHECIDOS DO LEAD ===\n" + "\n".join(known_data) + "\n=== FIM DOS DADOS ===\n\n"
 
+            # Construir contexto da Base de Conhecimento
+            knowledge_block = ""
+            if knowledge_context:
+                knowledge_block = (
+                    "\n=== INFORMAÇÕES DA BASE DE CONHECIMENTO ===\n"
+                    "Use as informações abaixo quando forem relevantes para responder. "
+                    "Não invente dados que não estejam aqui.\n"
+                    f"{knowledge_context}\n=== FIM DA BASE DE CONHECIMENTO ===\n\n"
+                )
+
             # Montar o prompt base com configurações personalizadas
             if agent_config:
                 base_prompt = self._build_custom_prompt(agency_name, agent_config)
@@ -118,14 +206,14 @@ Preencha apenas os campos que conseguiu identificar na conversa atual ou anterio
 
 {extraction_instructions}
 
-{lead_context}{conversation_history or ''}Mensagem atual do cliente: {message}
+{knowledge_block}{lead_context}{conversation_history or ''}Mensagem atual do cliente: {message}
 
 Responda de forma natural e profissional:"""
 
-            logger.info("Prompt montado")
+            logger.debug("Prompt montado")
 
-            # Gerar resposta
-            response = self.model.generate_content(full_prompt)
+            # Gerar resposta (assíncrono: não bloqueia o event loop durante a vaga)
+            response = await self.model.generate_content_async(full_prompt)
 
             # Rastrear uso de tokens
             try:
@@ -142,7 +230,7 @@ Responda de forma natural e profissional:"""
             except Exception as track_error:
                 logger.warning(f"Erro ao rastrear tokens: {track_error}")
 
-            logger.info("Resposta da IA recebida")
+            logger.debug("Resposta da IA recebida")
 
             # Processar resposta e extrair dados
             full_response = response.text
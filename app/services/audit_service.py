@@ -1,15 +1,26 @@
 """
 Serviço de Audit Logs para conformidade e segurança.
 Registra ações importantes do sistema de forma estruturada.
+Com o worker ativo, os eventos entram em um buffer em memória e são
+gravados em lote fora da requisição (AuditLogWriter).
 """
-import logging
+import glob
 import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from enum import Enum
+from app.config import settings
 from app.database import get_supabase_client
+from app.utils.background import BackgroundWorker
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class AuditAction(str, Enum):
@@ -47,6 +58,11 @@ class AuditAction(str, Enum):
     CONVERSATION_END = "conversation.end"
 
 
+def audit_row(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha de audit_logs a partir do evento (details serializado como JSON)."""
+    return {**entry, "details": json.dumps(entry.get("details") or {}, default=str)}
+
+
 class AuditService:
     """Serviço para registro de audit logs."""
     
@@ -92,15 +108,20 @@ class AuditService:
                 "tenet_id": tenet_id,
                 "resource_type": resource_type,
                 "resource_id": resource_id,
-                "details": json.dumps(safe_details),
+                "details": safe_details,
                 "ip_address": ip_address,
                 "user_agent": user_agent[:500] if user_agent else None,
                 "status": status,
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             
+            # Com o worker ativo, a gravação (e o json.dumps) sai da requisição
+            if audit_writer.running:
+                audit_writer.enqueue(audit_entry)
+                return True
+            
             # Inserir no banco
-            response = self.supabase.table("audit_logs").insert(audit_entry).execute()
+            response = self.supabase.table("audit_logs").insert(audit_row(audit_entry)).execute()
             
             if response.data:
                 logger.debug(f"Audit log registrado: {action.value}")
@@ -176,5 +197,231 @@ class AuditService:
         )
 
 
+class AuditLogWriter(BackgroundWorker):
+    """
+    Buffer de eventos gravado com um único insert em lote quando atinge
+    AUDIT_BATCH_SIZE ou a cada AUDIT_FLUSH_INTERVAL segundos.
+    Eventos acima de AUDIT_MAX_BUFFERED, ou de lotes que o banco recusou, vão
+    para um spool em disco (JSON lines) e são regravados nos ciclos seguintes.
+    Um lote do spool que falha AUDIT_REPLAY_MAX_FAILURES vezes é dividido ao
+    meio até isolar as linhas recusadas, que vão para o dead-letter.
+    """
+    
+    name = "audit-writer"
+    
+    # Spools de outros processos sem escrita há esse tempo são assumidos (segundos)
+    ORPHAN_SPOOL_AGE = 600.0
+    
+    def __init__(self, supabase_client=None, spool_dir: Optional[str] = None):
+        super().__init__(interval=settings.AUDIT_FLUSH_INTERVAL)
+        self._supabase = supabase_client
+        self.spool_dir = spool_dir or settings.AUDIT_SPOOL_DIR
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._buffer: deque = deque()
+        self._replay_failures: Dict[str, int] = {}
+    
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            self._supabase = get_supabase_client()
+        return self._supabase
+    
+    @property
+    def spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"audit-{os.getpid()}.jsonl")
+    
+    @property
+    def dead_letter_path(self) -> str:
+        # Fora do glob do spool: linhas recusadas não são regravadas
+        return os.path.join(self.spool_dir, "dead-letter", f"audit-{os.getpid()}.jsonl")
+    
+    def enqueue(self, entry: Dict[str, Any]):
+        with self._lock:
+            overflow = len(self._buffer) >= settings.AUDIT_MAX_BUFFERED
+            if not overflow:
+                self._buffer.append(entry)
+            full = overflow or len(self._buffer) >= settings.AUDIT_BATCH_SIZE
+        
+        if overflow:
+            # Memória limitada: o evento vai para o disco em vez de ser descartado
+            self._spool([entry])
+        if full:
+            self.wake()
+    
+    def flush(self) -> int:
+        """Grava o spool pendente e depois o buffer, em lotes. Retorna os eventos gravados."""
+        written = self._replay_spool()
+        while True:
+            with self._lock:
+                size = min(len(self._buffer), settings.AUDIT_BATCH_SIZE)
+                batch = [self._buffer.popleft() for _ in range(size)]
+            if not batch:
+                return written
+            
+            if not self._insert(batch):
+                # Banco indisponível: o restante do buffer também vai para o disco
+                with self._lock:
+                    batch.extend(self._buffer)
+                    self._buffer.clear()
+                self._spool(batch)
+                return written
+            written += len(batch)
+    
+    def _insert(self, entries: List[Dict[str, Any]]) -> bool:
+        start = time.perf_counter()
+        try:
+            self.supabase.table("audit_logs").insert([audit_row(e) for e in entries]).execute()
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote de {len(entries)} audit logs: {e}")
+            metrics.increment("audit_logs_errors")
+            return False
+        
+        metrics.observe("audit_flush_ms", (time.perf_counter() - start) * 1000)
+        metrics.increment("audit_logs_written", len(entries))
+        return True
+    
+    # ------------------------------------------------------------------
+    # Spool em disco
+    # ------------------------------------------------------------------
+    
+    def _spool(self, entries: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+        try:
+            with self._spool_lock:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                with open(self.spool_path, "a", encoding="utf-8") as spool:
+                    spool.write(lines)
+            metrics.increment("audit_logs_spooled", len(entries))
+        except OSError as e:
+            logger.error(f"Erro ao gravar spool de audit logs, {len(entries)} evento(s) perdidos: {e}")
+            metrics.increment("audit_logs_dropped", len(entries))
+    
+    def _claim_spools(self) -> List[str]:
+        """
+        Renomeia para este processo o próprio spool e os spools órfãos
+        (processos encerrados); novos eventos seguem para um arquivo novo.
+        """
+        pid = os.getpid()
+        now = time.time()
+        
+        with self._spool_lock:
+            for path in glob.glob(os.path.join(self.spool_dir, "*.jsonl")):
+                name = os.path.basename(path)
+                if name.startswith(f"replay-{pid}-"):
+                    continue
+                try:
+                    own = name == f"audit-{pid}.jsonl"
+                    if not own and now - os.path.getmtime(path) < self.ORPHAN_SPOOL_AGE:
+                        continue
+                    os.rename(path, os.path.join(self.spool_dir, f"replay-{pid}-{uuid.uuid4().hex}.jsonl"))
+                except OSError:
+                    continue  # assumido por outro processo
+        
+        return sorted(
+            glob.glob(os.path.join(self.spool_dir, f"replay-{pid}-*.jsonl")),
+            key=os.path.getmtime
+        )
+    
+    def _replay_spool(self) -> int:
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        
+        written = 0
+        for path in self._claim_spools():
+            with open(path, encoding="utf-8") as spool:
+                lines = [line for line in spool if line.strip()]
+            
+            for index in range(0, len(lines), settings.AUDIT_BATCH_SIZE):
+                batch = []
+                for line in lines[index:index + settings.AUDIT_BATCH_SIZE]:
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError:
+                        logger.error(f"Linha inválida ignorada no spool de audit logs: {line[:100]}")
+                
+                if batch and not self._insert(batch):
+                    failures = self._replay_failures.get(path, 0) + 1
+                    self._replay_failures[path] = failures
+                    pending = batch
+                    if failures >= settings.AUDIT_REPLAY_MAX_FAILURES:
+                        # Recusado repetidamente: grava o que for aceito e isola o resto
+                        inserted, pending = self._isolate_rejected(batch)
+                        written += inserted
+                    if pending is batch:
+                        # Mantém só o que falta; o arquivo é retomado no próximo ciclo
+                        if index:
+                            with open(path, "w", encoding="utf-8") as spool:
+                                spool.writelines(lines[index:])
+                        return written
+                    if pending:
+                        # Banco caiu durante a divisão: regrava o que não foi resolvido
+                        with open(path, "w", encoding="utf-8") as spool:
+                            spool.writelines(json.dumps(entry, default=str) + "\n" for entry in pending)
+                            spool.writelines(lines[index + settings.AUDIT_BATCH_SIZE:])
+                        return written
+                else:
+                    written += len(batch)
+                self._replay_failures.pop(path, None)
+            
+            os.remove(path)
+        
+        if written:
+            logger.info(f"{written} audit log(s) regravados a partir do spool")
+        return written
+    
+    def _isolate_rejected(self, entries: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Divide o lote ao meio até isolar as linhas que o banco recusa e as
+        move para o dead-letter. Retorna (gravados, pendentes); há pendentes
+        quando o banco fica indisponível no meio da divisão.
+        """
+        if len(entries) == 1:
+            if not self._database_available():
+                return 0, entries
+            self._dead_letter(entries)
+            return 0, []
+        
+        middle = len(entries) // 2
+        written = 0
+        for half, rest in ((entries[:middle], entries[middle:]), (entries[middle:], [])):
+            if self._insert(half):
+                written += len(half)
+                continue
+            inserted, pending = self._isolate_rejected(half)
+            written += inserted
+            if pending:
+                return written, pending + rest
+        return written, []
+    
+    def _database_available(self) -> bool:
+        """Distingue linha recusada de banco fora do ar."""
+        try:
+            self.supabase.table("audit_logs").select("id").limit(1).execute()
+            return True
+        except Exception:
+            return False
+    
+    def _dead_letter(self, entries: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+        try:
+            with self._spool_lock:
+                os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+                with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letter:
+                    dead_letter.write(lines)
+            logger.error(f"{len(entries)} audit log(s) recusados pelo banco movidos para {self.dead_letter_path}")
+            metrics.increment("audit_logs_dead_lettered", len(entries))
+        except OSError as e:
+            logger.error(f"Erro ao gravar dead-letter de audit logs, {len(entries)} evento(s) perdidos: {e}")
+            metrics.increment("audit_logs_dropped", len(entries))
+    
+    async def run_once(self):
+        self.flush()
+    
+    async def on_stop(self):
+        self.flush()
+
+
 # Instância singleton
 audit_service = AuditService()
+audit_writer = AuditLogWriter()
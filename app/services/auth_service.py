@@ -1,15 +1,15 @@
 """
 Serviço de autenticação com JWT.
 """
-import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.database import get_supabase_client
 from app.config import settings
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Configurações - Usando config validado
 SECRET_KEY = settings.jwt_secret_validated
@@ -3,16 +3,14 @@
 Serviço de Gerenciamento de Conversas e Memória.
 Responsável por armazenar e recuperar histórico de conversas no Supabase.
 """
-import logging
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 from supabase import Client
 from uuid import UUID
 from app.models.mensagem import MessageRole
+from app.utils.logger import get_logger
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class ConversationService:
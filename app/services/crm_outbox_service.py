@@ -0,0 +1,149 @@
+"""
+Dispatcher do outbox de CRMs.
+Entrega em background os leads registrados em crm_outbox, com retentativas
+(backoff exponencial com jitter) e envio em lote quando o CRM suporta.
+"""
+import asyncio
+import random
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.crm_service import CRMService
+from app.utils.background import BackgroundWorker, exponential_backoff
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Atraso até a próxima tentativa de envio ao CRM."""
+    return exponential_backoff(attempts, settings.CRM_OUTBOX_BACKOFF_BASE, settings.CRM_OUTBOX_BACKOFF_MAX)
+
+
+class CRMOutboxDispatcher(BackgroundWorker):
+    """Worker que processa o outbox de CRMs."""
+
+    name = "crm-outbox"
+
+    def __init__(self, supabase_client=None):
+        super().__init__(interval=settings.CRM_OUTBOX_POLL_INTERVAL)
+        self._supabase = supabase_client
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    async def run_once(self):
+        response = self.supabase.rpc("claim_crm_outbox", {
+            "p_limit": settings.CRM_OUTBOX_BATCH_SIZE
+        }).execute()
+
+        if response.data:
+            await self.process(response.data)
+
+        self._record_queue_metrics()
+
+    async def process(self, items: List[Dict[str, Any]]):
+        """Entrega os itens reservados, agrupados por tenant e CRM."""
+        crm_service = CRMService(self.supabase)
+
+        groups: Dict[tuple, List[Dict]] = defaultdict(list)
+        for item in items:
+            groups[(item["tenet_id"], item["crm_type"])].append(item)
+
+        async def deliver_group(tenet_id: str, crm_type: str, entries: List[Dict]):
+            integration = self._get_integration(tenet_id, crm_type)
+            if not integration:
+                for entry in entries:
+                    self._mark_failed(entry, "Integração inativa ou removida")
+                return
+
+            results = await crm_service.deliver(integration, entries)
+            for entry, result in zip(entries, results):
+                if result.get("success"):
+                    self._mark_sent(entry)
+                elif result.get("deferred"):
+                    self._defer(entry, result.get("retry_after") or settings.CRM_RATE_LIMIT_MAX_WAIT)
+                else:
+                    self._schedule_retry(entry, result.get("error") or "Falha no envio")
+
+        await asyncio.gather(*[
+            deliver_group(tenet_id, crm_type, entries)
+            for (tenet_id, crm_type), entries in groups.items()
+        ])
+
+    def _get_integration(self, tenet_id: str, crm_type: str) -> Optional[Dict[str, Any]]:
+        response = self.supabase.table("integracoes_crm").select("*")\
+            .eq("tenet_id", tenet_id).eq("crm_type", crm_type).eq("is_active", True).execute()
+        return response.data[0] if response.data else None
+
+    def _mark_sent(self, item: Dict[str, Any]):
+        now = datetime.now(timezone.utc).isoformat()
+        self.supabase.table("crm_outbox").update({
+            "status": "sent",
+            "attempts": (item.get("attempts") or 0) + 1,
+            "last_error": None,
+            "sent_at": now,
+            "updated_at": now
+        }).eq("id", item["id"]).execute()
+        metrics.increment("crm_outbox_delivered", crm=item["crm_type"])
+
+    def _mark_failed(self, item: Dict[str, Any], error: str):
+        self.supabase.table("crm_outbox").update({
+            "status": "failed",
+            "last_error": error[:1000],
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", item["id"]).execute()
+        metrics.increment("crm_outbox_dead", crm=item["crm_type"])
+        logger.error(f"Envio {item['id']} para {item['crm_type']} descartado: {error}")
+
+    def _schedule_retry(self, item: Dict[str, Any], error: str):
+        attempts = (item.get("attempts") or 0) + 1
+        if attempts >= settings.CRM_OUTBOX_MAX_ATTEMPTS:
+            self._mark_failed({**item, "attempts": attempts}, error)
+            return
+
+        now = datetime.now(timezone.utc)
+        self.supabase.table("crm_outbox").update({
+            "status": "pending",
+            "attempts": attempts,
+            "last_error": error[:1000],
+            "next_attempt_at": (now + timedelta(seconds=backoff_delay(attempts))).isoformat(),
+            "updated_at": now.isoformat()
+        }).eq("id", item["id"]).execute()
+        metrics.increment("crm_outbox_retries", crm=item["crm_type"])
+
+    def _defer(self, item: Dict[str, Any], retry_after: float):
+        """Reagenda sem consumir tentativa (rate limit ou circuito aberto)."""
+        now = datetime.now(timezone.utc)
+        self.supabase.table("crm_outbox").update({
+            "status": "pending",
+            "next_attempt_at": (now + timedelta(seconds=retry_after + random.uniform(0, 1))).isoformat(),
+            "updated_at": now.isoformat()
+        }).eq("id", item["id"]).execute()
+
+    def _record_queue_metrics(self):
+        """Profundidade da fila e idade do item pendente mais antigo."""
+        try:
+            depth = self.supabase.table("crm_outbox").select("id", count="exact")\
+                .in_("status", ["pending", "processing"]).limit(1).execute()
+            metrics.set_gauge("crm_outbox_depth", depth.count or 0)
+
+            oldest = self.supabase.table("crm_outbox").select("created_at")\
+                .in_("status", ["pending", "processing"]).order("created_at").limit(1).execute()
+            age = 0.0
+            if oldest.data:
+                created_at = datetime.fromisoformat(oldest.data[0]["created_at"].replace("Z", "+00:00"))
+                age = (datetime.now(timezone.utc) - created_at).total_seconds()
+            metrics.set_gauge("crm_outbox_oldest_age_seconds", round(age, 1))
+        except Exception as e:
+            logger.warning(f"Erro ao calcular métricas do outbox: {e}")
+
+
+# Singleton
+crm_outbox_dispatcher = CRMOutboxDispatcher()
@@ -3,28 +3,74 @@
 Serviço de integração com CRMs.
 Suporta: RD Station, Pipedrive, Notion, Moskit, Zoho
 """
-import logging
+import asyncio
+import hashlib
+import json
+import time
 import httpx
 from typing import Optional, Dict, Any, List
 from abc import ABC, abstractmethod
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from app.config import settings
 from app.utils.security import EncryptionService
+from app.utils.http_client import get_http_client
+from app.utils.metrics import metrics
+from app.utils.throttle import Throttle
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+
+# Rate limit e circuit breaker por (tenant, CRM), compartilhados entre instâncias do serviço
+crm_throttle = Throttle()
+
+# Campos do lead que, ao mudarem, exigem nova sincronização com o CRM
+SYNC_FIELDS = ("phone", "nome", "email", "empresa", "cargo", "interesse", "orcamento")
+
+
+def lead_fields_hash(lead_data: Dict[str, Any]) -> str:
+    """Hash estável dos campos sincronizados do lead."""
+    normalized = {field: str(lead_data.get(field) or "").strip() for field in SYNC_FIELDS}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
 
 
 class BaseCRMIntegration(ABC):
     """Classe base para integrações CRM."""
     
+    # Quantidade máxima de leads por requisição (1 = sem envio em lote)
+    BATCH_SIZE = 1
+    
+    # Limite de requisições por segundo do provedor e requisições feitas por envio
+    RATE_LIMIT_PER_SECOND = 5.0
+    RATE_LIMIT_BURST = 5.0
+    REQUESTS_PER_SEND = 1
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.encryption = EncryptionService()
+        extra_config = config.get("extra_config") or {}
+        self.timeout = float(extra_config.get("timeout") or settings.CRM_REQUEST_TIMEOUT)
+    
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """Cliente HTTP compartilhado (pool de conexões) para o host do CRM."""
+        return get_http_client(url, timeout=self.timeout)
     
     @abstractmethod
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         """Envia lead para o CRM."""
         pass
     
+    async def upsert_lead(self, lead_data: Dict[str, Any],
+                          remote_ids: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Atualiza o registro remoto já criado para o lead (remote_ids) ou cria um novo.
+        Padrão: reenvia o lead (CRMs cuja API de criação já é idempotente).
+        """
+        return await self.send_lead(lead_data)
+    
+    async def send_leads_batch(self, leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Envia vários leads; CRMs com API em lote sobrescrevem (ver BATCH_SIZE)."""
+        return [await self.send_lead(lead_data) for lead_data in leads]
+    
     @abstractmethod
     async def test_connection(self) -> bool:
         """Testa conexão com o CRM."""
@@ -35,6 +81,8 @@ class RDStationIntegration(BaseCRMIntegration):
     """Integração com RD Station Marketing."""
     
     API_URL = "https://api.rd.services/platform/conversions"
+    RATE_LIMIT_PER_SECOND = 2.0
+    RATE_LIMIT_BURST = 4.0
     
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
@@ -56,23 +104,23 @@ class RDStationIntegration(BaseCRMIntegration):
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.API_URL,
-                    json=payload,
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    timeout=30.0
-                )
-                
-                return {
-                    "success": response.status_code in [200, 201],
-                    "status_code": response.status_code,
-                    "response": response.json() if response.status_code in [200, 201] else response.text
-                }
-                
+            client = self.get_client(self.API_URL)
+            response = await client.post(
+                self.API_URL,
+                json=payload,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout
+            )
+            
+            return {
+                "success": response.status_code in [200, 201],
+                "status_code": response.status_code,
+                "response": response.json() if response.status_code in [200, 201] else response.text
+            }
+            
         except Exception as e:
             logger.error(f"Erro RD Station: {e}")
             return {"success": False, "error": str(e)}
@@ -80,14 +128,14 @@ class RDStationIntegration(BaseCRMIntegration):
     async def test_connection(self) -> bool:
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://api.rd.services/platform/contacts",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    params={"limit": 1},
-                    timeout=10.0
-                )
-                return response.status_code == 200
+            client = self.get_client(self.API_URL)
+            response = await client.get(
+                "https://api.rd.services/platform/contacts",
+                headers={"Authorization": f"Bearer {api_key}"},
+                params={"limit": 1},
+                timeout=10.0
+            )
+            return response.status_code == 200
         except:
             return False
 
@@ -95,55 +143,117 @@ class RDStationIntegration(BaseCRMIntegration):
 class PipedriveIntegration(BaseCRMIntegration):
     """Integração com Pipedrive CRM."""
     
+    RATE_LIMIT_PER_SECOND = 8.0
+    RATE_LIMIT_BURST = 10.0
+    REQUESTS_PER_SEND = 2
+    
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
             api_url = self.config.get("extra_config", {}).get("api_url", "https://api.pipedrive.com/v1")
             pipeline_id = self.config.get("pipeline_id")
             
+            client = self.get_client(api_url)
             # Criar pessoa
-            person_payload = {
-                "name": lead_data.get("nome", "Lead WhatsApp"),
-                "phone": [{"value": lead_data.get("phone"), "primary": True}],
-                "email": [{"value": lead_data.get("email", "")}] if lead_data.get("email") else []
+            person_response = await client.post(
+                f"{api_url}/persons",
+                params={"api_token": api_key},
+                json=self._person_payload(lead_data),
+                timeout=self.timeout
+            )
+            
+            if person_response.status_code not in [200, 201]:
+                return {"success": False, "error": "Falha ao criar pessoa", "response": person_response.text}
+            
+            person_id = person_response.json().get("data", {}).get("id")
+            
+            # Criar deal
+            deal_payload = {
+                "title": self._deal_title(lead_data),
+                "person_id": person_id,
+                "pipeline_id": int(pipeline_id) if pipeline_id else None,
+                "status": "open"
             }
             
-            async with httpx.AsyncClient() as client:
-                # Criar pessoa
-                person_response = await client.post(
-                    f"{api_url}/persons",
-                    params={"api_token": api_key},
-                    json=person_payload,
-                    timeout=30.0
-                )
-                
-                if person_response.status_code not in [200, 201]:
-                    return {"success": False, "error": "Falha ao criar pessoa", "response": person_response.text}
-                
-                person_id = person_response.json().get("data", {}).get("id")
-                
-                # Criar deal
-                deal_payload = {
-                    "title": f"Lead WhatsApp - {lead_data.get('nome', 'Novo Lead')}",
-                    "person_id": person_id,
-                    "pipeline_id": int(pipeline_id) if pipeline_id else None,
-                    "status": "open"
-                }
-                
-                deal_response = await client.post(
-                    f"{api_url}/deals",
+            deal_response = await client.post(
+                f"{api_url}/deals",
+                params={"api_token": api_key},
+                json=deal_payload,
+                timeout=self.timeout
+            )
+            
+            deal_ok = deal_response.status_code in [200, 201]
+            deal_id = deal_response.json().get("data", {}).get("id") if deal_ok else None
+            
+            return {
+                "success": deal_ok,
+                "status_code": deal_response.status_code,
+                "person_id": person_id,
+                "remote_ids": {"person_id": person_id, "deal_id": deal_id},
+                "response": deal_response.json() if deal_ok else deal_response.text
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro Pipedrive: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _person_payload(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "name": lead_data.get("nome", "Lead WhatsApp"),
+            "phone": [{"value": lead_data.get("phone"), "primary": True}],
+            "email": [{"value": lead_data.get("email", "")}] if lead_data.get("email") else []
+        }
+    
+    def _deal_title(self, lead_data: Dict[str, Any]) -> str:
+        return f"Lead WhatsApp - {lead_data.get('nome', 'Novo Lead')}"
+    
+    async def upsert_lead(self, lead_data: Dict[str, Any],
+                          remote_ids: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        remote_ids = remote_ids or {}
+        person_id = remote_ids.get("person_id")
+        deal_id = remote_ids.get("deal_id")
+        
+        if not person_id:
+            return await self.send_lead(lead_data)
+        
+        try:
+            api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
+            api_url = self.config.get("extra_config", {}).get("api_url", "https://api.pipedrive.com/v1")
+            client = self.get_client(api_url)
+            
+            # Atualizar pessoa existente
+            person_response = await client.put(
+                f"{api_url}/persons/{person_id}",
+                params={"api_token": api_key},
+                json=self._person_payload(lead_data),
+                timeout=self.timeout
+            )
+            
+            # Registro removido no CRM: cria de novo
+            if person_response.status_code in [404, 410]:
+                return await self.send_lead(lead_data)
+            
+            if person_response.status_code not in [200, 201]:
+                return {"success": False, "error": "Falha ao atualizar pessoa", "response": person_response.text}
+            
+            if deal_id:
+                deal_response = await client.put(
+                    f"{api_url}/deals/{deal_id}",
                     params={"api_token": api_key},
-                    json=deal_payload,
-                    timeout=30.0
+                    json={"title": self._deal_title(lead_data)},
+                    timeout=self.timeout
                 )
-                
-                return {
-                    "success": deal_response.status_code in [200, 201],
-                    "status_code": deal_response.status_code,
-                    "person_id": person_id,
-                    "response": deal_response.json() if deal_response.status_code in [200, 201] else deal_response.text
-                }
-                
+                if deal_response.status_code not in [200, 201]:
+                    return {"success": False, "error": "Falha ao atualizar deal", "response": deal_response.text}
+            
+            return {
+                "success": True,
+                "status_code": person_response.status_code,
+                "person_id": person_id,
+                "remote_ids": {"person_id": person_id, "deal_id": deal_id},
+                "response": person_response.json()
+            }
+            
         except Exception as e:
             logger.error(f"Erro Pipedrive: {e}")
             return {"success": False, "error": str(e)}
@@ -152,13 +262,13 @@ class PipedriveIntegration(BaseCRMIntegration):
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
             api_url = self.config.get("extra_config", {}).get("api_url", "https://api.pipedrive.com/v1")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{api_url}/users/me",
-                    params={"api_token": api_key},
-                    timeout=10.0
-                )
-                return response.status_code == 200
+            client = self.get_client(api_url)
+            response = await client.get(
+                f"{api_url}/users/me",
+                params={"api_token": api_key},
+                timeout=10.0
+            )
+            return response.status_code == 200
         except:
             return False
 
@@ -167,6 +277,9 @@ class NotionIntegration(BaseCRMIntegration):
     """Integração com Notion Database."""
     
     API_URL = "https://api.notion.com/v1"
+    # Notion: média de 3 requisições por segundo por integração
+    RATE_LIMIT_PER_SECOND = 3.0
+    RATE_LIMIT_BURST = 3.0
     
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
@@ -179,34 +292,77 @@ class NotionIntegration(BaseCRMIntegration):
             payload = {
                 "parent": {"database_id": database_id},
                 "properties": {
-                    "Nome": {"title": [{"text": {"content": lead_data.get("nome", "Lead WhatsApp")}}]},
-                    "Telefone": {"phone_number": lead_data.get("phone", "")},
-                    "Email": {"email": lead_data.get("email", "")},
-                    "Empresa": {"rich_text": [{"text": {"content": lead_data.get("empresa", "")}}]},
-                    "Interesse": {"rich_text": [{"text": {"content": lead_data.get("interesse", "")}}]},
+                    **self._properties(lead_data),
                     "Status": {"select": {"name": "Novo Lead"}},
                     "Origem": {"select": {"name": "WhatsApp SDR"}}
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.API_URL}/pages",
-                    json=payload,
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                        "Notion-Version": "2022-06-28"
-                    },
-                    timeout=30.0
-                )
-                
-                return {
-                    "success": response.status_code in [200, 201],
-                    "status_code": response.status_code,
-                    "response": response.json() if response.status_code in [200, 201] else response.text
-                }
-                
+            client = self.get_client(self.API_URL)
+            response = await client.post(
+                f"{self.API_URL}/pages",
+                json=payload,
+                headers=self._headers(api_key),
+                timeout=self.timeout
+            )
+            
+            success = response.status_code in [200, 201]
+            return {
+                "success": success,
+                "status_code": response.status_code,
+                "remote_ids": {"page_id": response.json().get("id")} if success else {},
+                "response": response.json() if success else response.text
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro Notion: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Notion-Version": "2022-06-28"
+        }
+    
+    def _properties(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "Nome": {"title": [{"text": {"content": lead_data.get("nome", "Lead WhatsApp")}}]},
+            "Telefone": {"phone_number": lead_data.get("phone", "")},
+            "Email": {"email": lead_data.get("email", "")},
+            "Empresa": {"rich_text": [{"text": {"content": lead_data.get("empresa", "")}}]},
+            "Interesse": {"rich_text": [{"text": {"content": lead_data.get("interesse", "")}}]}
+        }
+    
+    async def upsert_lead(self, lead_data: Dict[str, Any],
+                          remote_ids: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        page_id = (remote_ids or {}).get("page_id")
+        if not page_id:
+            return await self.send_lead(lead_data)
+        
+        try:
+            api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
+            client = self.get_client(self.API_URL)
+            
+            # Atualiza só os dados do lead; Status pode ter sido alterado pela equipe
+            response = await client.patch(
+                f"{self.API_URL}/pages/{page_id}",
+                json={"properties": self._properties(lead_data)},
+                headers=self._headers(api_key),
+                timeout=self.timeout
+            )
+            
+            if response.status_code == 404:
+                return await self.send_lead(lead_data)
+            
+            success = response.status_code == 200
+            return {
+                "success": success,
+                "status_code": response.status_code,
+                "remote_ids": {"page_id": page_id},
+                "response": response.json() if success else response.text
+            }
+            
         except Exception as e:
             logger.error(f"Erro Notion: {e}")
             return {"success": False, "error": str(e)}
@@ -214,16 +370,16 @@ class NotionIntegration(BaseCRMIntegration):
     async def test_connection(self) -> bool:
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.API_URL}/users/me",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Notion-Version": "2022-06-28"
-                    },
-                    timeout=10.0
-                )
-                return response.status_code == 200
+            client = self.get_client(self.API_URL)
+            response = await client.get(
+                f"{self.API_URL}/users/me",
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Notion-Version": "2022-06-28"
+                },
+                timeout=10.0
+            )
+            return response.status_code == 200
         except:
             return False
 
@@ -232,59 +388,121 @@ class MoskitIntegration(BaseCRMIntegration):
     """Integração com Moskit CRM."""
     
     API_URL = "https://api.moskit.com.br/v2"
+    REQUESTS_PER_SEND = 2
     
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
             pipeline_id = self.config.get("pipeline_id")
             
+            client = self.get_client(self.API_URL)
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+            
             # Criar contato
-            contact_payload = {
-                "name": lead_data.get("nome", "Lead WhatsApp"),
-                "phones": [{"number": lead_data.get("phone")}],
-                "emails": [{"address": lead_data.get("email")}] if lead_data.get("email") else []
+            contact_response = await client.post(
+                f"{self.API_URL}/contacts",
+                json=self._contact_payload(lead_data),
+                headers=headers,
+                timeout=self.timeout
+            )
+            
+            if contact_response.status_code not in [200, 201]:
+                return {"success": False, "error": "Falha ao criar contato", "response": contact_response.text}
+            
+            contact_id = contact_response.json().get("id")
+            
+            # Criar negócio
+            deal_payload = {
+                "name": self._deal_name(lead_data),
+                "contact_id": contact_id,
+                "pipeline_id": pipeline_id
             }
             
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                # Criar contato
-                contact_response = await client.post(
-                    f"{self.API_URL}/contacts",
-                    json=contact_payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if contact_response.status_code not in [200, 201]:
-                    return {"success": False, "error": "Falha ao criar contato", "response": contact_response.text}
-                
-                contact_id = contact_response.json().get("id")
-                
-                # Criar negócio
-                deal_payload = {
-                    "name": f"Lead WhatsApp - {lead_data.get('nome', 'Novo')}",
-                    "contact_id": contact_id,
-                    "pipeline_id": pipeline_id
-                }
-                
-                deal_response = await client.post(
-                    f"{self.API_URL}/deals",
-                    json=deal_payload,
+            deal_response = await client.post(
+                f"{self.API_URL}/deals",
+                json=deal_payload,
+                headers=headers,
+                timeout=self.timeout
+            )
+            
+            deal_ok = deal_response.status_code in [200, 201]
+            deal_id = deal_response.json().get("id") if deal_ok else None
+            
+            return {
+                "success": deal_ok,
+                "status_code": deal_response.status_code,
+                "contact_id": contact_id,
+                "remote_ids": {"contact_id": contact_id, "deal_id": deal_id},
+                "response": deal_response.json() if deal_ok else deal_response.text
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro Moskit: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _contact_payload(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "name": lead_data.get("nome", "Lead WhatsApp"),
+            "phones": [{"number": lead_data.get("phone")}],
+            "emails": [{"address": lead_data.get("email")}] if lead_data.get("email") else []
+        }
+    
+    def _deal_name(self, lead_data: Dict[str, Any]) -> str:
+        return f"Lead WhatsApp - {lead_data.get('nome', 'Novo')}"
+    
+    async def upsert_lead(self, lead_data: Dict[str, Any],
+                          remote_ids: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        remote_ids = remote_ids or {}
+        contact_id = remote_ids.get("contact_id")
+        deal_id = remote_ids.get("deal_id")
+        
+        if not contact_id:
+            return await self.send_lead(lead_data)
+        
+        try:
+            api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
+            client = self.get_client(self.API_URL)
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+            
+            # Atualizar contato existente
+            contact_response = await client.put(
+                f"{self.API_URL}/contacts/{contact_id}",
+                json=self._contact_payload(lead_data),
+                headers=headers,
+                timeout=self.timeout
+            )
+            
+            # Registro removido no CRM: cria de novo
+            if contact_response.status_code in [404, 410]:
+                return await self.send_lead(lead_data)
+            
+            if contact_response.status_code not in [200, 201]:
+                return {"success": False, "error": "Falha ao atualizar contato", "response": contact_response.text}
+            
+            if deal_id:
+                deal_response = await client.put(
+                    f"{self.API_URL}/deals/{deal_id}",
+                    json={"name": self._deal_name(lead_data)},
                     headers=headers,
-                    timeout=30.0
+                    timeout=self.timeout
                 )
-                
-                return {
-                    "success": deal_response.status_code in [200, 201],
-                    "status_code": deal_response.status_code,
-                    "contact_id": contact_id,
-                    "response": deal_response.json() if deal_response.status_code in [200, 201] else deal_response.text
-                }
-                
+                if deal_response.status_code not in [200, 201]:
+                    return {"success": False, "error": "Falha ao atualizar negócio", "response": deal_response.text}
+            
+            return {
+                "success": True,
+                "status_code": contact_response.status_code,
+                "contact_id": contact_id,
+                "remote_ids": {"contact_id": contact_id, "deal_id": deal_id},
+                "response": contact_response.json()
+            }
+            
         except Exception as e:
             logger.error(f"Erro Moskit: {e}")
             return {"success": False, "error": str(e)}
@@ -292,13 +510,13 @@ class MoskitIntegration(BaseCRMIntegration):
     async def test_connection(self) -> bool:
         try:
             api_key = self.encryption.decrypt(self.config.get("api_key_encrypted", ""))
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.API_URL}/users/me",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    timeout=10.0
-                )
-                return response.status_code == 200
+            client = self.get_client(self.API_URL)
+            response = await client.get(
+                f"{self.API_URL}/users/me",
+                headers={"Authorization": f"Bearer {api_key}"},
+                timeout=10.0
+            )
+            return response.status_code == 200
         except:
             return False
 
@@ -306,54 +524,85 @@ class MoskitIntegration(BaseCRMIntegration):
 class ZohoIntegration(BaseCRMIntegration):
     """Integração com Zoho CRM."""
     
+    # A API de Leads aceita até 100 registros em `data`
+    BATCH_SIZE = 100
+    RATE_LIMIT_PER_SECOND = 1.5
+    RATE_LIMIT_BURST = 3.0
+    
+    # Upsert deduplica pelo telefone: reenviar o lead atualiza o registro existente
+    DUPLICATE_CHECK_FIELDS = ["Phone"]
+    
+    def _build_record(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "Last_Name": lead_data.get("nome", "Lead WhatsApp"),
+            "Phone": lead_data.get("phone"),
+            "Email": lead_data.get("email"),
+            "Company": lead_data.get("empresa"),
+            "Lead_Source": "WhatsApp SDR Agent",
+            "Description": lead_data.get("interesse", "")
+        }
+    
     async def send_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self.send_leads_batch([lead_data]))[0]
+    
+    async def send_leads_batch(self, leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         try:
             api_token = self.encryption.decrypt(self.config.get("api_token_encrypted", ""))
             api_url = self.config.get("extra_config", {}).get("api_url", "https://www.zohoapis.com/crm/v2")
             
             payload = {
-                "data": [{
-                    "Last_Name": lead_data.get("nome", "Lead WhatsApp"),
-                    "Phone": lead_data.get("phone"),
-                    "Email": lead_data.get("email"),
-                    "Company": lead_data.get("empresa"),
-                    "Lead_Source": "WhatsApp SDR Agent",
-                    "Description": lead_data.get("interesse", "")
-                }]
+                "data": [self._build_record(lead_data) for lead_data in leads],
+                "duplicate_check_fields": self.DUPLICATE_CHECK_FIELDS
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{api_url}/Leads",
-                    json=payload,
-                    headers={
-                        "Authorization": f"Zoho-oauthtoken {api_token}",
-                        "Content-Type": "application/json"
-                    },
-                    timeout=30.0
-                )
-                
-                return {
-                    "success": response.status_code in [200, 201],
+            client = self.get_client(api_url)
+            response = await client.post(
+                f"{api_url}/Leads/upsert",
+                json=payload,
+                headers={
+                    "Authorization": f"Zoho-oauthtoken {api_token}",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout
+            )
+            
+            if response.status_code not in [200, 201, 202]:
+                return [{
+                    "success": False,
                     "status_code": response.status_code,
-                    "response": response.json() if response.status_code in [200, 201] else response.text
-                }
-                
+                    "response": response.text
+                } for _ in leads]
+            
+            # Resposta traz um status por registro, na mesma ordem do envio
+            records = response.json().get("data", [])
+            results = []
+            for index in range(len(leads)):
+                record = records[index] if index < len(records) else {}
+                success = record.get("status") == "success"
+                results.append({
+                    "success": success,
+                    "status_code": response.status_code,
+                    "remote_ids": {"record_id": record.get("details", {}).get("id")} if success else {},
+                    "response": record,
+                    "error": None if success else record.get("message", "Registro rejeitado pelo Zoho")
+                })
+            return results
+            
         except Exception as e:
             logger.error(f"Erro Zoho: {e}")
-            return {"success": False, "error": str(e)}
+            return [{"success": False, "error": str(e)} for _ in leads]
     
     async def test_connection(self) -> bool:
         try:
             api_token = self.encryption.decrypt(self.config.get("api_token_encrypted", ""))
             api_url = self.config.get("extra_config", {}).get("api_url", "https://www.zohoapis.com/crm/v2")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{api_url}/users?type=CurrentUser",
-                    headers={"Authorization": f"Zoho-oauthtoken {api_token}"},
-                    timeout=10.0
-                )
-                return response.status_code == 200
+            client = self.get_client(api_url)
+            response = await client.get(
+                f"{api_url}/users?type=CurrentUser",
+                headers={"Authorization": f"Zoho-oauthtoken {api_token}"},
+                timeout=10.0
+            )
+            return response.status_code == 200
         except:
             return False
 
@@ -403,50 +652,39 @@ class CRMService:
             logger.info(f"Nenhuma integração CRM ativa para agência {tenet_id}")
             return {"sent": 0, "results": []}
         
-        results = []
-        
+        supported = []
         for integration in integrations:
-            crm_type = integration.get("crm_type")
-            
-            if crm_type not in self.CRM_CLASSES:
-                logger.warning(f"CRM não suportado: {crm_type}")
+            if integration.get("crm_type") not in self.CRM_CLASSES:
+                logger.warning(f"CRM não suportado: {integration.get('crm_type')}")
                 continue
-            
+            supported.append(integration)
+        
+        # Só sincroniza CRMs cujos dados do lead mudaram desde o último envio
+        states = self._get_sync_states(tenet_id, lead_data.get("phone"))
+        changed = self._filter_changed(supported, states, lead_data)
+        
+        # Envia para todos os CRMs em paralelo: um provedor lento não atrasa os demais
+        results = await asyncio.gather(*[
+            self._send_to_crm(tenet_id, conversa_id, integration, lead_data,
+                              remote_ids=(states.get(integration.get("crm_type")) or {}).get("remote_ids"))
+            for integration in changed
+        ])
+        
+        # Envios adiados pelo rate limit/circuito seguem pelo outbox
+        deferred = [r for r in results if r.get("deferred")]
+        if deferred:
+            now = datetime.now(timezone.utc)
             try:
-                # Instanciar integração
-                crm_class = self.CRM_CLASSES[crm_type]
-                crm_instance = crm_class(integration)
-                
-                # Enviar lead
-                result = await crm_instance.send_lead(lead_data)
-                
-                # Registrar log
-                await self._log_sync(
-                    tenet_id=tenet_id,
-                    conversa_id=conversa_id,
-                    crm_type=crm_type,
-                    lead_phone=lead_data.get("phone"),
-                    lead_data=lead_data,
-                    status="success" if result.get("success") else "error",
-                    crm_response=result.get("response"),
-                    error_message=result.get("error")
-                )
-                
-                results.append({
-                    "crm": crm_type,
-                    "success": result.get("success"),
-                    "error": result.get("error")
-                })
-                
-                logger.info(f"Lead enviado para {crm_type}: {'sucesso' if result.get('success') else 'erro'}")
-                
+                self.supabase.table("crm_outbox").insert([{
+                    "tenet_id": tenet_id,
+                    "conversa_id": conversa_id,
+                    "crm_type": r["crm"],
+                    "lead_phone": lead_data.get("phone"),
+                    "lead_data": lead_data,
+                    "next_attempt_at": (now + timedelta(seconds=r["retry_after"])).isoformat()
+                } for r in deferred]).execute()
             except Exception as e:
-                logger.error(f"Erro ao enviar para {crm_type}: {e}")
-                results.append({
-                    "crm": crm_type,
-                    "success": False,
-                    "error": str(e)
-                })
+                logger.error(f"Erro ao enfileirar envios adiados: {e}")
         
         return {
             "sent": len([r for r in results if r.get("success")]),
@@ -454,6 +692,312 @@ class CRMService:
             "results": results
         }
     
+    async def enqueue_lead(
+        self,
+        tenet_id: str,
+        conversa_id: str,
+        lead_data: Dict[str, Any]
+    ) -> int:
+        """
+        Registra o envio do lead no outbox (um item por CRM ativo).
+        O dispatcher em background faz a entrega com retentativas.
+        """
+        integrations = await self.get_active_integrations(tenet_id)
+        supported = [i for i in integrations if i.get("crm_type") in self.CRM_CLASSES]
+        
+        states = self._get_sync_states(tenet_id, lead_data.get("phone")) if supported else {}
+        changed = self._filter_changed(supported, states, lead_data)
+        
+        rows = [{
+            "tenet_id": tenet_id,
+            "conversa_id": conversa_id or "unknown",
+            "crm_type": integration.get("crm_type"),
+            "lead_phone": lead_data.get("phone"),
+            "lead_data": lead_data
+        } for integration in changed]
+        
+        if not rows:
+            return 0
+        
+        self.supabase.table("crm_outbox").insert(rows).execute()
+        metrics.increment("crm_outbox_enqueued", len(rows))
+        return len(rows)
+    
+    async def deliver(
+        self,
+        integration: Dict[str, Any],
+        entries: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Entrega itens do outbox para um CRM. Usa a API em lote quando o
+        provedor suporta; caso contrário envia os leads em paralelo.
+        Retorna um resultado por item, na mesma ordem.
+        """
+        crm_type = integration.get("crm_type")
+        crm_class = self.CRM_CLASSES.get(crm_type)
+        
+        if not crm_class:
+            return [{"crm": crm_type, "success": False, "error": "CRM não suportado"} for _ in entries]
+        
+        # Vários itens do mesmo lead: só o mais recente é enviado
+        latest: Dict[tuple, int] = {}
+        for index, entry in enumerate(entries):
+            key = (entry["tenet_id"], entry.get("lead_phone"))
+            if key not in latest or str(entry.get("created_at") or "") >= str(entries[latest[key]].get("created_at") or ""):
+                latest[key] = index
+        
+        skipped = {"crm": crm_type, "success": True, "error": None, "skipped": True}
+        results: List[Optional[Dict[str, Any]]] = [skipped] * len(entries)
+        
+        # Descarta itens cujos dados já foram sincronizados
+        pending = []
+        for (tenet_id, lead_phone), index in latest.items():
+            state = self._get_sync_states(tenet_id, lead_phone).get(crm_type) or {}
+            if state.get("fields_hash") == lead_fields_hash(entries[index]["lead_data"]):
+                metrics.increment("crm_sync_skipped_unchanged", crm=crm_type)
+                continue
+            pending.append((index, state.get("remote_ids")))
+        
+        if crm_class.BATCH_SIZE > 1 and len(pending) > 1:
+            for i in range(0, len(pending), crm_class.BATCH_SIZE):
+                chunk = pending[i:i + crm_class.BATCH_SIZE]
+                batch_results = await self._send_batch_to_crm(integration, [entries[index] for index, _ in chunk])
+                for (index, _), result in zip(chunk, batch_results):
+                    results[index] = result
+            return results
+        
+        sent = await asyncio.gather(*[
+            self._send_to_crm(entries[index]["tenet_id"], entries[index].get("conversa_id"),
+                              integration, entries[index]["lead_data"], remote_ids=remote_ids)
+            for index, remote_ids in pending
+        ])
+        for (index, _), result in zip(pending, sent):
+            results[index] = result
+        return results
+    
+    async def _send_to_crm(
+        self,
+        tenet_id: str,
+        conversa_id: str,
+        integration: Dict[str, Any],
+        lead_data: Dict[str, Any],
+        remote_ids: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Envia o lead para um CRM com timeout próprio e registra latência.
+        Com remote_ids de um envio anterior, atualiza o registro existente.
+        """
+        crm_type = integration.get("crm_type")
+        
+        try:
+            # Instanciar integração
+            crm_class = self.CRM_CLASSES[crm_type]
+            crm_instance = crm_class(integration)
+            
+            # Aguarda vez no rate limit do provedor (ou adia se circuito aberto/fila longa)
+            throttle_key = f"crm:{tenet_id}:{crm_type}"
+            retry_after = await self._admit(throttle_key, crm_class, crm_class.REQUESTS_PER_SEND)
+            if retry_after is not None:
+                return self._deferred(crm_type, retry_after)
+            
+            start = time.perf_counter()
+            
+            # Enviar lead (timeout total cobre as múltiplas chamadas de alguns CRMs)
+            try:
+                result = await asyncio.wait_for(
+                    crm_instance.upsert_lead(lead_data, remote_ids),
+                    timeout=settings.CRM_PROVIDER_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                result = {"success": False, "error": f"Timeout após {settings.CRM_PROVIDER_TIMEOUT}s"}
+            
+            metrics.observe("crm_send_latency_ms", (time.perf_counter() - start) * 1000, crm=crm_type)
+            
+            if result.get("status_code") == 429:
+                return self._deferred(crm_type, settings.CRM_RATE_LIMIT_MAX_WAIT)
+            await self._update_circuit(throttle_key, result)
+            
+            return await self._record_result(tenet_id, conversa_id, crm_type, lead_data, result)
+            
+        except Exception as e:
+            logger.error(f"Erro ao enviar para {crm_type}: {e}")
+            metrics.increment("crm_send_total", crm=crm_type, status="error")
+            return {
+                "crm": crm_type,
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def _send_batch_to_crm(
+        self,
+        integration: Dict[str, Any],
+        entries: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Envia um lote de leads em uma única requisição ao CRM."""
+        crm_type = integration.get("crm_type")
+        tenet_id = entries[0]["tenet_id"]
+        throttle_key = f"crm:{tenet_id}:{crm_type}"
+        
+        retry_after = await self._admit(throttle_key, self.CRM_CLASSES[crm_type], 1)
+        if retry_after is not None:
+            return [self._deferred(crm_type, retry_after) for _ in entries]
+        
+        start = time.perf_counter()
+        
+        try:
+            crm_instance = self.CRM_CLASSES[crm_type](integration)
+            try:
+                batch_results = await asyncio.wait_for(
+                    crm_instance.send_leads_batch([entry["lead_data"] for entry in entries]),
+                    timeout=settings.CRM_PROVIDER_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                error = f"Timeout após {settings.CRM_PROVIDER_TIMEOUT}s"
+                batch_results = [{"success": False, "error": error} for _ in entries]
+        except Exception as e:
+            logger.error(f"Erro ao enviar lote para {crm_type}: {e}")
+            batch_results = [{"success": False, "error": str(e)} for _ in entries]
+        
+        metrics.observe("crm_send_latency_ms", (time.perf_counter() - start) * 1000, crm=crm_type)
+        metrics.observe("crm_batch_size", len(entries), crm=crm_type)
+        
+        if any(result.get("status_code") == 429 for result in batch_results):
+            return [self._deferred(crm_type, settings.CRM_RATE_LIMIT_MAX_WAIT) for _ in entries]
+        # Falha da requisição inteira conta para o circuito; rejeição de registro não
+        request_ok = any(200 <= (r.get("status_code") or 0) < 300 for r in batch_results)
+        await self._update_circuit(throttle_key, {"success": request_ok})
+        
+        return [
+            await self._record_result(entry["tenet_id"], entry.get("conversa_id"), crm_type,
+                                      entry["lead_data"], result)
+            for entry, result in zip(entries, batch_results)
+        ]
+    
+    async def _record_result(
+        self,
+        tenet_id: str,
+        conversa_id: str,
+        crm_type: str,
+        lead_data: Dict[str, Any],
+        result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Registra métricas e log de sincronização de um envio."""
+        status = "success" if result.get("success") else "error"
+        metrics.increment("crm_send_total", crm=crm_type, status=status)
+        
+        if result.get("success"):
+            self._save_sync_state(tenet_id, crm_type, lead_data, result.get("remote_ids") or {})
+        
+        # Registrar log
+        await self._log_sync(
+            tenet_id=tenet_id,
+            conversa_id=conversa_id,
+            crm_type=crm_type,
+            lead_phone=lead_data.get("phone"),
+            lead_data=lead_data,
+            status=status,
+            crm_response=result.get("response"),
+            error_message=result.get("error")
+        )
+        
+        logger.info(f"Lead enviado para {crm_type}: {'sucesso' if result.get('success') else 'erro'}")
+        
+        return {
+            "crm": crm_type,
+            "success": result.get("success"),
+            "error": result.get("error")
+        }
+    
+    async def _admit(self, throttle_key: str, crm_class, cost: int) -> Optional[float]:
+        """
+        Libera o envio respeitando circuit breaker e rate limit.
+        Retorna None se liberado, ou segundos até tentar de novo.
+        """
+        open_for = await crm_throttle.circuit_open_for(throttle_key)
+        if open_for > 0:
+            return open_for
+        
+        return await crm_throttle.acquire(
+            throttle_key,
+            rate=crm_class.RATE_LIMIT_PER_SECOND,
+            burst=crm_class.RATE_LIMIT_BURST,
+            cost=cost,
+            max_wait=settings.CRM_RATE_LIMIT_MAX_WAIT
+        )
+    
+    async def _update_circuit(self, throttle_key: str, result: Dict[str, Any]):
+        if result.get("success"):
+            await crm_throttle.record_success(throttle_key)
+        else:
+            await crm_throttle.record_failure(
+                throttle_key,
+                threshold=settings.CRM_CIRCUIT_FAILURE_THRESHOLD,
+                cooldown=settings.CRM_CIRCUIT_COOLDOWN
+            )
+    
+    def _deferred(self, crm_type: str, retry_after: float) -> Dict[str, Any]:
+        """Resultado de envio adiado (rate limit ou circuito aberto); não conta como falha."""
+        metrics.increment("crm_send_deferred", crm=crm_type)
+        return {
+            "crm": crm_type,
+            "success": False,
+            "deferred": True,
+            "retry_after": retry_after,
+            "error": f"Envio adiado por {retry_after:.1f}s (limite do provedor)"
+        }
+    
+    def _filter_changed(
+        self,
+        integrations: List[Dict[str, Any]],
+        states: Dict[str, Dict[str, Any]],
+        lead_data: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Integrações cujo último envio tem dados diferentes dos atuais."""
+        lead_hash = lead_fields_hash(lead_data)
+        changed = []
+        for integration in integrations:
+            crm_type = integration.get("crm_type")
+            if (states.get(crm_type) or {}).get("fields_hash") == lead_hash:
+                metrics.increment("crm_sync_skipped_unchanged", crm=crm_type)
+                continue
+            changed.append(integration)
+        return changed
+    
+    def _get_sync_states(self, tenet_id: str, lead_phone: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """Estado da última sincronização do lead, por CRM."""
+        if not lead_phone:
+            return {}
+        try:
+            response = self.supabase.table("crm_lead_sync_state").select(
+                "crm_type, fields_hash, remote_ids"
+            ).eq("tenet_id", tenet_id).eq("lead_phone", lead_phone).execute()
+            return {row["crm_type"]: row for row in (response.data or [])}
+        except Exception as e:
+            logger.error(f"Erro ao buscar estado de sincronização: {e}")
+            return {}
+    
+    def _save_sync_state(
+        self,
+        tenet_id: str,
+        crm_type: str,
+        lead_data: Dict[str, Any],
+        remote_ids: Dict[str, Any]
+    ):
+        """Guarda hash dos dados enviados e IDs do registro no CRM."""
+        if not lead_data.get("phone"):
+            return
+        try:
+            self.supabase.table("crm_lead_sync_state").upsert({
+                "tenet_id": tenet_id,
+                "crm_type": crm_type,
+                "lead_phone": lead_data.get("phone"),
+                "fields_hash": lead_fields_hash(lead_data),
+                "remote_ids": {k: v for k, v in remote_ids.items() if v is not None},
+                "synced_at": datetime.now(timezone.utc).isoformat()
+            }, on_conflict="tenet_id,crm_type,lead_phone").execute()
+        except Exception as e:
+            logger.error(f"Erro ao salvar estado de sincronização: {e}")
+    
     async def _log_sync(
         self,
         tenet_id: str,
@@ -1,13 +1,22 @@
 """
 Serviço de retenção de dados para conformidade com LGPD.
 Implementa políticas de retenção e exclusão automática.
+
+Cada política é aplicada em lotes:
+1. Lê as linhas vencidas em páginas (keyset por coluna de data + id)
+2. Exclui ou anonimiza a página com filtros in.() de tamanho limitado
+3. Salva checkpoint (retention_jobs) após cada lote, retomando dele se a
+   execução for interrompida ou limitada por RETENTION_MAX_BATCHES_PER_RUN
 """
-import logging
+import asyncio
+import time
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
+from app.config import settings
 from app.database import get_supabase_client
 from app.services.audit_service import audit_service, AuditAction
 from app.utils.logger import get_logger
+from app.utils.metrics import metrics
 
 logger = get_logger(__name__)
 
@@ -15,161 +24,278 @@ logger = get_logger(__name__)
 # Políticas de retenção (em dias)
 RETENTION_POLICIES = {
     "conversas": 90,           # Conversas: 90 dias após última mensagem
-    "mensagens": 90,           # Mensagens: 90 dias
+    "mensagens": 90,           # Mensagens: removidas com a conversa (90 dias sem atividade)
     "leads_inativos": 365,     # Leads sem interação: 1 ano
     "audit_logs": 365 * 2,     # Logs de auditoria: 2 anos
     "tokens_expirados": 7,     # Tokens expirados: 7 dias
     "lgpd_requests": 365 * 5,  # Solicitações LGPD: 5 anos (requisito legal)
 }
 
+# Políticas aplicadas como parte de outra: mensagens só são removidas junto
+# com a conversa vencida (children de "conversas"), nunca de conversas ativas
+COVERED_POLICIES = {
+    "mensagens": "conversas",
+}
+
+# Como cada política é aplicada. Políticas sem entrada aqui não têm tabela
+# correspondente (ex.: tokens JWT não são persistidos) e são ignoradas.
+RETENTION_JOBS = {
+    "conversas": {
+        "table": "conversas",
+        "date_column": "updated_at",
+        "action": "delete",
+        "children": [("mensagens", "conversa_id")],
+        "audit_action": AuditAction.LEAD_DELETE,
+    },
+    "leads_inativos": {
+        "table": "leads",
+        "date_column": "updated_at",
+        "action": "anonymize",
+        "filters": {"status": "inativo"},
+        "audit_action": AuditAction.LEAD_UPDATE,
+    },
+    "audit_logs": {
+        "table": "audit_logs",
+        "date_column": "created_at",
+        "action": "delete",
+        "audit_action": AuditAction.CONFIG_UPDATE,
+    },
+    "lgpd_requests": {
+        "table": "lgpd_deletion_requests",
+        "date_column": "requested_at",
+        "action": "delete",
+        "audit_action": AuditAction.USER_DELETE,
+    },
+}
+
 
 class DataRetentionService:
     """Serviço para gerenciar retenção e exclusão de dados."""
-    
-    def __init__(self):
-        self.supabase = get_supabase_client()
-    
-    async def cleanup_old_conversations(self, dry_run: bool = True) -> Dict:
+
+    def __init__(self, supabase_client=None):
+        self.supabase = supabase_client or get_supabase_client()
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def _load_checkpoint(self, policy: str) -> Optional[Dict[str, Any]]:
+        result = self.supabase.table("retention_jobs").select("*").eq("policy", policy).execute()
+        return result.data[0] if result.data else None
+
+    def _save_checkpoint(self, policy: str, **fields):
+        data = {
+            "policy": policy,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **fields
+        }
+        self.supabase.table("retention_jobs").upsert(data, on_conflict="policy").execute()
+
+    # ------------------------------------------------------------------
+    # Lotes
+    # ------------------------------------------------------------------
+
+    def _base_query(self, job: Dict[str, Any], query, cutoff: str):
+        query = query.lt(job["date_column"], cutoff)
+        for column, value in job.get("filters", {}).items():
+            query = query.eq(column, value)
+        if job["action"] == "anonymize":
+            query = query.is_("anonimizado_em", "null")
+        return query
+
+    def _count(self, job: Dict[str, Any], cutoff: str) -> int:
+        query = self.supabase.table(job["table"]).select("id", count="exact")
+        result = self._base_query(job, query, cutoff).limit(1).execute()
+        return result.count or 0
+
+    def _fetch_page(self, job: Dict[str, Any], cutoff: str, after: Optional[tuple], batch_size: int) -> List[Dict]:
+        """Próxima página de linhas vencidas, em ordem (data, id), após o cursor."""
+        column = job["date_column"]
+        query = self._base_query(job, self.supabase.table(job["table"]).select(f"id, {column}"), cutoff)
+
+        if after:
+            value, last_id = after
+            query = query.or_(f'{column}.gt."{value}",and({column}.eq."{value}",id.gt.{last_id})')
+
+        result = query.order(column).order("id").limit(batch_size).execute()
+        return result.data or []
+
+    def _apply(self, job: Dict[str, Any], ids: List[str]):
+        if job["action"] == "anonymize":
+            # Anonimizar em vez de deletar (preserva estatísticas)
+            self.supabase.table(job["table"]).update({
+                "nome": "ANONIMIZADO",
+                "email": None,
+                "telefone": None,
+                "dados_adicionais": None,
+                "anonimizado_em": datetime.now(timezone.utc).isoformat()
+            }).in_("id", ids).execute()
+            return
+
+        # Primeiro as linhas dependentes (ex.: mensagens das conversas)
+        for child_table, foreign_key in job.get("children", []):
+            self.supabase.table(child_table).delete().in_(foreign_key, ids).execute()
+        self.supabase.table(job["table"]).delete().in_("id", ids).execute()
+
+    async def enforce_policy(
+        self,
+        policy: str,
+        dry_run: bool = True,
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
-        Remove conversas antigas conforme política de retenção.
-        
+        Aplica uma política de retenção em lotes.
+        Retoma do último checkpoint se uma execução anterior não terminou;
+        com `max_batches` atingido o status fica "partial" e o restante é
+        processado na próxima execução.
+
         Args:
-            dry_run: Se True, apenas simula sem deletar
-            
+            policy: Chave de RETENTION_POLICIES
+            dry_run: Se True, apenas conta as linhas vencidas
+            batch_size: Linhas por lote (padrão RETENTION_BATCH_SIZE)
+            max_batches: Lotes nesta execução (padrão RETENTION_MAX_BATCHES_PER_RUN; 0 = todos)
+
         Returns:
             Estatísticas da operação
         """
-        retention_days = RETENTION_POLICIES["conversas"]
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
-        
+        if policy in COVERED_POLICIES:
+            return {"policy": policy, "skipped": True,
+                    "reason": f"aplicada junto com a política '{COVERED_POLICIES[policy]}'"}
+
+        job = RETENTION_JOBS.get(policy)
+        if job is None:
+            return {"policy": policy, "skipped": True, "reason": "sem tabela para esta política"}
+
+        batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        if max_batches is None:
+            max_batches = settings.RETENTION_MAX_BATCHES_PER_RUN
+
+        checkpoint = {} if dry_run else (self._load_checkpoint(policy) or {})
+        resuming = checkpoint.get("status") in ("running", "failed")
+        if resuming:
+            cutoff = checkpoint["cutoff_date"]
+            after = (checkpoint["last_value"], checkpoint["last_id"]) if checkpoint.get("last_id") else None
+            processed = checkpoint.get("processed") or 0
+            logger.info(f"Retomando retenção '{policy}' a partir de {after} ({processed} já processadas)")
+        else:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_POLICIES[policy])).isoformat()
+            after = None
+            processed = 0
+
+        result = {
+            "policy": policy,
+            "table": job["table"],
+            "dry_run": dry_run,
+            "cutoff_date": cutoff
+        }
+
         try:
-            # Buscar conversas antigas
-            response = self.supabase.table("conversas").select(
-                "id, tenet_id, updated_at"
-            ).lt("updated_at", cutoff_date.isoformat()).execute()
-            
-            old_conversations = response.data or []
-            count = len(old_conversations)
-            
-            logger.info(f"Encontradas {count} conversas para exclusão (cutoff: {cutoff_date})")
-            
-            if not dry_run and count > 0:
-                # Deletar em lotes
-                conversation_ids = [c["id"] for c in old_conversations]
-                
-                # Primeiro deletar mensagens associadas
-                self.supabase.table("mensagens").delete().in_(
-                    "conversa_id", conversation_ids
-                ).execute()
-                
-                # Depois deletar conversas
-                self.supabase.table("conversas").delete().in_(
-                    "id", conversation_ids
-                ).execute()
-                
-                # Log de auditoria
-                await audit_service.log(
-                    action=AuditAction.LEAD_DELETE,
-                    details={
-                        "type": "retention_cleanup",
-                        "table": "conversas",
-                        "count": count,
-                        "cutoff_date": cutoff_date.isoformat()
-                    }
-                )
-            
-            return {
-                "table": "conversas",
-                "found": count,
-                "deleted": count if not dry_run else 0,
-                "dry_run": dry_run,
-                "cutoff_date": cutoff_date.isoformat()
-            }
-            
+            if dry_run:
+                found = self._count(job, cutoff)
+                logger.info(f"Retenção '{policy}': {found} linha(s) vencidas (cutoff: {cutoff})")
+                return {**result, "found": found, "processed": 0, "status": "dry_run"}
+
+            fields = {"status": "running", "cutoff_date": cutoff, "error": None}
+            if not resuming:
+                fields.update(last_value=None, last_id=None, processed=0, finished_at=None,
+                              started_at=datetime.now(timezone.utc).isoformat())
+            self._save_checkpoint(policy, **fields)
+
+            batches = 0
+            status = "done"
+            while True:
+                if max_batches and batches >= max_batches:
+                    status = "partial"
+                    break
+
+                rows = self._fetch_page(job, cutoff, after, batch_size)
+                if not rows:
+                    break
+
+                start = time.perf_counter()
+                self._apply(job, [row["id"] for row in rows])
+                metrics.observe("retention_batch_ms", (time.perf_counter() - start) * 1000, policy=policy)
+                metrics.increment("retention_rows", len(rows), policy=policy)
+
+                processed += len(rows)
+                batches += 1
+                last = rows[-1]
+                after = (last[job["date_column"]], last["id"])
+                self._save_checkpoint(policy, status="running", last_value=after[0], last_id=after[1],
+                                      processed=processed)
+
+                if len(rows) < batch_size:
+                    break
+                # Espaça os lotes para não monopolizar o banco
+                await asyncio.sleep(settings.RETENTION_BATCH_DELAY)
+
+            if status == "done":
+                self._save_checkpoint(policy, status="done",
+                                      finished_at=datetime.now(timezone.utc).isoformat())
+                if processed:
+                    await audit_service.log(
+                        action=job["audit_action"],
+                        details={
+                            "type": "retention_anonymization" if job["action"] == "anonymize" else "retention_cleanup",
+                            "policy": policy,
+                            "table": job["table"],
+                            "count": processed,
+                            "cutoff_date": cutoff
+                        }
+                    )
+
+            logger.info(f"Retenção '{policy}': {processed} linha(s) processadas ({status})")
+            return {**result, "found": processed, "processed": processed, "status": status}
+
         except Exception as e:
-            logger.error(f"Erro no cleanup de conversas: {e}")
-            return {"error": str(e)}
-    
+            logger.error(f"Erro na retenção '{policy}': {e}")
+            self._save_checkpoint(policy, status="failed", error=str(e)[:500])
+            return {**result, "processed": processed, "status": "failed", "error": str(e)}
+
+    async def cleanup_old_conversations(self, dry_run: bool = True) -> Dict:
+        """
+        Remove conversas antigas (e suas mensagens) conforme política de retenção.
+
+        Args:
+            dry_run: Se True, apenas simula sem deletar
+
+        Returns:
+            Estatísticas da operação
+        """
+        result = await self.enforce_policy("conversas", dry_run)
+        return {**result, "deleted": result.get("processed", 0)}
+
     async def anonymize_inactive_leads(self, dry_run: bool = True) -> Dict:
         """
         Anonimiza leads inativos conforme política de retenção.
         Mantém dados estatísticos, remove dados pessoais.
         """
-        retention_days = RETENTION_POLICIES["leads_inativos"]
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
-        
-        try:
-            # Buscar leads inativos
-            response = self.supabase.table("leads").select(
-                "id, tenet_id, updated_at"
-            ).lt("updated_at", cutoff_date.isoformat()).eq(
-                "status", "inativo"
-            ).execute()
-            
-            old_leads = response.data or []
-            count = len(old_leads)
-            
-            logger.info(f"Encontrados {count} leads para anonimização")
-            
-            if not dry_run and count > 0:
-                lead_ids = [l["id"] for l in old_leads]
-                
-                # Anonimizar em vez de deletar (preserva estatísticas)
-                self.supabase.table("leads").update({
-                    "nome": "ANONIMIZADO",
-                    "email": None,
-                    "telefone": None,
-                    "dados_adicionais": None,
-                    "anonimizado_em": datetime.now(timezone.utc).isoformat()
-                }).in_("id", lead_ids).execute()
-                
-                await audit_service.log(
-                    action=AuditAction.LEAD_UPDATE,
-                    details={
-                        "type": "retention_anonymization",
-                        "count": count
-                    }
-                )
-            
-            return {
-                "table": "leads",
-                "found": count,
-                "anonymized": count if not dry_run else 0,
-                "dry_run": dry_run
-            }
-            
-        except Exception as e:
-            logger.error(f"Erro na anonimização de leads: {e}")
-            return {"error": str(e)}
-    
+        result = await self.enforce_policy("leads_inativos", dry_run)
+        return {**result, "anonymized": result.get("processed", 0)}
+
     async def run_full_cleanup(self, dry_run: bool = True) -> List[Dict]:
         """
         Executa todas as políticas de retenção.
-        
+
         Args:
             dry_run: Se True, apenas simula
-            
+
         Returns:
             Lista de resultados de cada operação
         """
         results = []
-        
-        # Cleanup de conversas
-        result = await self.cleanup_old_conversations(dry_run)
-        results.append(result)
-        
-        # Anonimização de leads
-        result = await self.anonymize_inactive_leads(dry_run)
-        results.append(result)
-        
+        for policy in RETENTION_POLICIES:
+            results.append(await self.enforce_policy(policy, dry_run))
+
         logger.info(f"Cleanup completo (dry_run={dry_run}): {results}")
-        
+
         return results
-    
+
     def get_retention_policies(self) -> Dict:
         """Retorna as políticas de retenção configuradas."""
         return {
-            name: f"{days} dias" 
+            name: f"{days} dias"
             for name, days in RETENTION_POLICIES.items()
         }
 
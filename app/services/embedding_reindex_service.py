@@ -0,0 +1,213 @@
+"""
+Job de re-index da Base de Conhecimento para troca de modelo de embedding.
+
+Fluxo por tenant:
+1. Lê knowledge_base em páginas (keyset por id), retomando do último checkpoint
+2. Re-embeda os documentos em lotes, respeitando o limite de chamadas por minuto
+3. Grava o novo vetor na coluna sombra (embedding_next) via RPC em lote
+4. Salva checkpoint após cada página
+5. Troca o tenant para o novo modelo de forma atômica (switch_knowledge_embeddings)
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.embedding_service import embedding_service, EMBEDDING_DIMENSIONS
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+class _RateLimiter:
+    """Espaça chamadas para não exceder N requisições por minuto."""
+
+    def __init__(self, requests_per_minute: int):
+        self.min_interval = 60.0 / max(requests_per_minute, 1)
+        self._last_call = 0.0
+
+    async def wait(self):
+        elapsed = time.monotonic() - self._last_call
+        if elapsed < self.min_interval:
+            await asyncio.sleep(self.min_interval - elapsed)
+        self._last_call = time.monotonic()
+
+
+class EmbeddingReindexService:
+    """Re-embeda a Base de Conhecimento com um novo modelo, com checkpoints."""
+
+    def __init__(self, supabase_client=None):
+        self.supabase = supabase_client or get_supabase_client()
+
+    def _load_checkpoint(self, tenet_id: str, target_model: str) -> Optional[Dict[str, Any]]:
+        result = self.supabase.table("embedding_reindex_jobs").select("*")\
+            .eq("tenet_id", tenet_id).eq("target_model", target_model).execute()
+        return result.data[0] if result.data else None
+
+    def _save_checkpoint(self, tenet_id: str, target_model: str, **fields):
+        data = {
+            "tenet_id": tenet_id,
+            "target_model": target_model,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **fields
+        }
+        self.supabase.table("embedding_reindex_jobs").upsert(
+            data, on_conflict="tenet_id,target_model"
+        ).execute()
+
+    def _fetch_page(self, tenet_id: str, target_model: str,
+                    after_id: Optional[str], page_size: int) -> List[Dict]:
+        """Próxima página de documentos ativos ainda sem embedding do modelo alvo."""
+        query = self.supabase.table("knowledge_base")\
+            .select("id, titulo, conteudo")\
+            .eq("tenet_id", tenet_id)\
+            .eq("ativo", True)\
+            .neq("embedding_model", target_model)\
+            .or_(f'embedding_next_model.is.null,embedding_next_model.neq."{target_model}"')
+
+        if after_id:
+            query = query.gt("id", after_id)
+
+        result = query.order("id").limit(page_size).execute()
+        return result.data or []
+
+    async def _reembed_rows(self, rows: List[Dict], target_model: str,
+                            batch_size: int, limiter: _RateLimiter) -> Dict[str, int]:
+        """Gera embeddings em lotes e grava na coluna sombra."""
+        written = 0
+        failed = 0
+
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            await limiter.wait()
+
+            start = time.perf_counter()
+            vectors = await embedding_service.generate_embeddings_batch(
+                [f"{row['titulo']}\n\n{row['conteudo']}" for row in batch],
+                model=target_model
+            )
+            metrics.observe("embedding_reindex_batch_ms", (time.perf_counter() - start) * 1000,
+                            model=target_model)
+
+            if not vectors or len(vectors) != len(batch):
+                failed += len(batch)
+                continue
+
+            payload = []
+            for row, vector in zip(batch, vectors):
+                if len(vector) != EMBEDDING_DIMENSIONS:
+                    raise ValueError(
+                        f"Modelo {target_model} gera vetores de {len(vector)} dimensões; "
+                        f"a coluna espera {EMBEDDING_DIMENSIONS}"
+                    )
+                payload.append({"id": row["id"], "embedding": vector})
+
+            self.supabase.rpc("set_knowledge_embedding_next", {
+                "p_model": target_model,
+                "p_rows": payload
+            }).execute()
+            written += len(payload)
+
+        return {"written": written, "failed": failed}
+
+    async def reindex_tenant(
+        self,
+        tenet_id: str,
+        target_model: str,
+        page_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        switch: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Re-embeda todos os documentos de um tenant com o modelo alvo.
+        Retoma do último checkpoint se uma execução anterior foi interrompida.
+        """
+        page_size = page_size or settings.EMBEDDING_REINDEX_PAGE_SIZE
+        batch_size = batch_size or settings.EMBEDDING_REINDEX_BATCH_SIZE
+        limiter = _RateLimiter(settings.EMBEDDING_REINDEX_REQUESTS_PER_MINUTE)
+
+        checkpoint = self._load_checkpoint(tenet_id, target_model) or {}
+        if checkpoint.get("status") == "switched":
+            return {"tenet_id": tenet_id, "status": "switched", "processed": checkpoint.get("processed", 0)}
+
+        last_id = checkpoint.get("last_id")
+        processed = checkpoint.get("processed") or 0
+        failed = checkpoint.get("failed") or 0
+
+        if last_id:
+            logger.info(f"Retomando re-index do tenant {tenet_id} a partir de {last_id}")
+
+        self._save_checkpoint(tenet_id, target_model, status="running", error=None)
+
+        try:
+            while True:
+                rows = self._fetch_page(tenet_id, target_model, last_id, page_size)
+                if not rows:
+                    break
+
+                result = await self._reembed_rows(rows, target_model, batch_size, limiter)
+                processed += result["written"]
+                failed += result["failed"]
+                last_id = rows[-1]["id"]
+
+                self._save_checkpoint(tenet_id, target_model, status="running",
+                                      last_id=last_id, processed=processed, failed=failed)
+                metrics.increment("embedding_reindex_rows", result["written"], model=target_model)
+
+            # Segunda passada sem cursor: pega documentos criados durante o job
+            # e lotes que falharam na primeira passada
+            failed = 0
+            cursor = None
+            while True:
+                leftovers = self._fetch_page(tenet_id, target_model, cursor, page_size)
+                if not leftovers:
+                    break
+                result = await self._reembed_rows(leftovers, target_model, batch_size, limiter)
+                processed += result["written"]
+                failed += result["failed"]
+                cursor = leftovers[-1]["id"]
+                self._save_checkpoint(tenet_id, target_model, status="running",
+                                      processed=processed, failed=failed)
+
+            if failed:
+                raise RuntimeError(f"{failed} documentos não puderam ser re-embedados")
+
+            switched = 0
+            if switch:
+                response = self.supabase.rpc("switch_knowledge_embeddings", {
+                    "p_tenet_id": tenet_id,
+                    "p_model": target_model
+                }).execute()
+                switched = response.data or 0
+                logger.info(f"Tenant {tenet_id} migrado para {target_model} ({switched} documentos)")
+
+            return {
+                "tenet_id": tenet_id,
+                "status": "switched" if switch else "ready",
+                "processed": processed,
+                "switched": switched
+            }
+
+        except Exception as e:
+            logger.error(f"Erro no re-index do tenant {tenet_id}: {e}")
+            self._save_checkpoint(tenet_id, target_model, status="failed", error=str(e)[:500],
+                                  last_id=last_id, processed=processed, failed=failed)
+            return {"tenet_id": tenet_id, "status": "failed", "processed": processed, "error": str(e)}
+
+    async def run(self, target_model: str, tenet_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Executa o re-index para os tenants informados ou todos ainda em outro modelo."""
+        if not tenet_ids:
+            result = self.supabase.table("tenets").select("id")\
+                .neq("embedding_model", target_model).execute()
+            tenet_ids = [row["id"] for row in (result.data or [])]
+
+        results = []
+        for tenet_id in tenet_ids:
+            results.append(await self.reindex_tenant(tenet_id, target_model))
+        return results
+
+
+# Singleton
+embedding_reindex_service = EmbeddingReindexService()
@@ -8,21 +8,25 @@ from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Dimensão da coluna vector(768) em knowledge_base
+EMBEDDING_DIMENSIONS = 768
+
+
 class EmbeddingService:
     """Gera embeddings de texto usando Gemini"""
     
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = "models/embedding-001"
+        self.model = settings.EMBEDDING_MODEL
     
-    async def generate_embedding(self, text: str) -> Optional[List[float]]:
+    async def generate_embedding(self, text: str, model: Optional[str] = None) -> Optional[List[float]]:
         """Gera embedding para um texto"""
         try:
             # Limita tamanho do texto
             text = text[:8000] if len(text) > 8000 else text
             
             result = genai.embed_content(
-                model=self.model,
+                model=model or self.model,
                 content=text,
                 task_type="retrieval_document"
             )
@@ -33,11 +37,29 @@ class EmbeddingService:
             logger.error(f"Erro ao gerar embedding: {e}")
             return None
     
-    async def generate_query_embedding(self, query: str) -> Optional[List[float]]:
+    async def generate_embeddings_batch(self, texts: List[str],
+                                        model: Optional[str] = None) -> Optional[List[List[float]]]:
+        """Gera embeddings para vários textos em uma única chamada"""
+        try:
+            contents = [text[:8000] for text in texts]
+            
+            result = genai.embed_content(
+                model=model or self.model,
+                content=contents,
+                task_type="retrieval_document"
+            )
+            
+            return result['embedding']
+            
+        except Exception as e:
+            logger.error(f"Erro ao gerar embeddings em lote: {e}")
+            return None
+    
+    async def generate_query_embedding(self, query: str, model: Optional[str] = None) -> Optional[List[float]]:
         """Gera embedding para uma query de busca"""
         try:
             result = genai.embed_content(
-                model=self.model,
+                model=model or self.model,
                 content=query,
                 task_type="retrieval_query"
             )
@@ -0,0 +1,119 @@
+"""
+Cliente compartilhado da Evolution API.
+Usado pelo WhatsAppService (envio) e pelo EvolutionInstanceService (instâncias):
+- Conexões keep-alive reaproveitadas (app.utils.http_client)
+- Retentativas com backoff apenas quando repetir é seguro
+- Limite de requisições simultâneas por instância
+- Métricas de latência e erros por operação
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from app.config import settings
+from app.utils.background import exponential_backoff
+from app.utils.http_client import get_http_client
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+EVOLUTION_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+# Semáforos por (event loop, instância), compartilhados entre clientes
+_instance_limits: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+_limits_lock = threading.Lock()
+
+
+def _instance_semaphore(instance_name: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    key = (id(loop), instance_name)
+    with _limits_lock:
+        entry = _instance_limits.get(key)
+        if entry and entry[0] is loop:
+            return entry[1]
+        for stale_key in [k for k, (l, _) in _instance_limits.items() if l.is_closed()]:
+            _instance_limits.pop(stale_key, None)
+        semaphore = asyncio.Semaphore(settings.EVOLUTION_MAX_CONCURRENCY_PER_INSTANCE)
+        _instance_limits[key] = (loop, semaphore)
+        return semaphore
+
+
+class EvolutionAPIClient:
+    """Requisições à Evolution API com pool, retentativas e métricas."""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.base_url = (base_url if base_url is not None else settings.EVOLUTION_API_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None else settings.EVOLUTION_API_KEY
+        self.headers = {
+            "apikey": self.api_key,
+            "Content-Type": "application/json"
+        }
+
+    def get_client(self) -> httpx.AsyncClient:
+        return get_http_client(self.base_url, timeout=settings.EVOLUTION_TIMEOUT, limits=EVOLUTION_LIMITS)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        operation: str,
+        instance_name: Optional[str] = None,
+        idempotent: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Executa a requisição. Falhas de conexão (a requisição não chegou ao
+        servidor) são sempre repetidas; timeouts de leitura e respostas
+        429/5xx só em operações idempotentes. Levanta a última exceção
+        httpx quando as tentativas se esgotam.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = settings.EVOLUTION_MAX_RETRIES + 1
+        url = f"{self.base_url}{path}"
+        semaphore = _instance_semaphore(instance_name) if instance_name else None
+
+        for attempt in range(1, attempts + 1):
+            start = time.perf_counter()
+            retry = False
+            try:
+                if semaphore:
+                    async with semaphore:
+                        response = await self._send(method, url, timeout, **kwargs)
+                else:
+                    response = await self._send(method, url, timeout, **kwargs)
+
+                metrics.observe("evolution_request_ms", (time.perf_counter() - start) * 1000, operation=operation)
+                if response.status_code >= 400:
+                    metrics.increment("evolution_request_errors", operation=operation, status=response.status_code)
+                    retry = idempotent and response.status_code in RETRYABLE_STATUS
+                if not retry or attempt == attempts:
+                    return response
+
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                metrics.increment("evolution_request_errors", operation=operation, status=e.__class__.__name__)
+                if attempt == attempts:
+                    raise
+            except httpx.TransportError as e:
+                metrics.increment("evolution_request_errors", operation=operation, status=e.__class__.__name__)
+                if not idempotent or attempt == attempts:
+                    raise
+
+            metrics.increment("evolution_request_retries", operation=operation)
+            await asyncio.sleep(exponential_backoff(attempt, settings.EVOLUTION_RETRY_BACKOFF_BASE, settings.EVOLUTION_RETRY_BACKOFF_MAX))
+
+    async def _send(self, method: str, url: str, timeout: Optional[float], **kwargs: Any) -> httpx.Response:
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return await self.get_client().request(method, url, headers=self.headers, **kwargs)
+
+
+# Singleton
+evolution_client = EvolutionAPIClient()
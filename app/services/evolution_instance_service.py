@@ -3,13 +3,12 @@
 Serviço para gerenciar instâncias da Evolution API.
 Permite criar instâncias, gerar QR Code, verificar status e desconectar.
 """
-import logging
-import httpx
 from typing import Optional, Dict, Any
 from datetime import datetime
-from app.config import settings
+from app.services.evolution_client import EvolutionAPIClient, evolution_client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class EvolutionInstanceService:
@@ -17,13 +16,9 @@ class EvolutionInstanceService:
     Serviço para gerenciamento de instâncias na Evolution API.
     """
     
-    def __init__(self):
-        self.base_url = settings.EVOLUTION_API_URL.rstrip('/')
-        self.api_key = settings.EVOLUTION_API_KEY
-        self.headers = {
-            "apikey": self.api_key,
-            "Content-Type": "application/json"
-        }
+    def __init__(self, client: Optional[EvolutionAPIClient] = None):
+        self.client = client or evolution_client
+        self.base_url = self.client.base_url
     
     async def create_instance(self, instance_name: str, webhook_url: str = None) -> Dict[str, Any]:
         """
@@ -37,7 +32,7 @@ class EvolutionInstanceService:
             Dados da instância criada
         """
         try:
-            url = f"{self.base_url}/instance/create"
+            path = f"/instance/create"
             
             payload = {
                 "instanceName": instance_name,
@@ -49,30 +44,31 @@ class EvolutionInstanceService:
             # if webhook_url:
             #     payload["webhook"] = webhook_url
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=self.headers,
-                    timeout=60.0
-                )
+            response = await self.client.request(
+                "POST",
+                path,
+                operation="create_instance",
+                instance_name=instance_name,
+                timeout=30.0,
+                json=payload
+            )
+            
+            if response.status_code in [200, 201]:
+                data = response.json()
+                logger.info(f"Instância {instance_name} criada com sucesso")
+                return {
+                    "success": True,
+                    "instance": data.get("instance", {}),
+                    "qrcode": data.get("qrcode", {}),
+                    "hash": data.get("hash", data.get("instance", {}).get("token", ""))
+                }
+            else:
+                logger.error(f"Erro ao criar instância: {response.status_code} - {response.text}")
+                return {
+                    "success": False,
+                    "error": response.text
+                }
                 
-                if response.status_code in [200, 201]:
-                    data = response.json()
-                    logger.info(f"Instância {instance_name} criada com sucesso")
-                    return {
-                        "success": True,
-                        "instance": data.get("instance", {}),
-                        "qrcode": data.get("qrcode", {}),
-                        "hash": data.get("hash", data.get("instance", {}).get("token", ""))
-                    }
-                else:
-                    logger.error(f"Erro ao criar instância: {response.status_code} - {response.text}")
-                    return {
-                        "success": False,
-                        "error": response.text
-                    }
-                    
         except Exception as e:
             logger.error(f"Erro ao criar instância: {e}")
             return {"success": False, "error": str(e)}
@@ -88,29 +84,29 @@ class EvolutionInstanceService:
             QR Code em base64 e status
         """
         try:
-            url = f"{self.base_url}/instance/connect/{instance_name}"
+            path = f"/instance/connect/{instance_name}"
+            
+            response = await self.client.request(
+                "GET",
+                path,
+                operation="get_qrcode",
+                instance_name=instance_name
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    timeout=30.0
-                )
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "success": True,
+                    "qrcode": data.get("base64", data.get("qrcode", {}).get("base64")),
+                    "code": data.get("code", data.get("qrcode", {}).get("code")),
+                    "status": "waiting_scan"
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": response.text
+                }
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "qrcode": data.get("base64", data.get("qrcode", {}).get("base64")),
-                        "code": data.get("code", data.get("qrcode", {}).get("code")),
-                        "status": "waiting_scan"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": response.text
-                    }
-                    
         except Exception as e:
             logger.error(f"Erro ao obter QR Code: {e}")
             return {"success": False, "error": str(e)}
@@ -126,41 +122,41 @@ class EvolutionInstanceService:
             Status da conexão (connected, disconnected, connecting)
         """
         try:
-            url = f"{self.base_url}/instance/connectionState/{instance_name}"
+            path = f"/instance/connectionState/{instance_name}"
+            
+            response = await self.client.request(
+                "GET",
+                path,
+                operation="connection_status",
+                instance_name=instance_name
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    timeout=15.0
-                )
+            if response.status_code == 200:
+                data = response.json()
+                state = data.get("instance", {}).get("state", "unknown")
+                
+                # Só considera conectado se state for "open" E tiver owner (número)
+                owner = data.get("instance", {}).get("owner", "")
+                is_truly_connected = state == "open" and bool(owner)
+                
+                return {
+                    "success": True,
+                    "status": state,
+                    "connected": is_truly_connected,
+                    "owner": owner
+                }
+            elif response.status_code == 404:
+                return {
+                    "success": True,
+                    "status": "not_found",
+                    "connected": False
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": response.text
+                }
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    state = data.get("instance", {}).get("state", "unknown")
-                    
-                    # Só considera conectado se state for "open" E tiver owner (número)
-                    owner = data.get("instance", {}).get("owner", "")
-                    is_truly_connected = state == "open" and bool(owner)
-                    
-                    return {
-                        "success": True,
-                        "status": state,
-                        "connected": is_truly_connected,
-                        "owner": owner
-                    }
-                elif response.status_code == 404:
-                    return {
-                        "success": True,
-                        "status": "not_found",
-                        "connected": False
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": response.text
-                    }
-                    
         except Exception as e:
             logger.error(f"Erro ao verificar status: {e}")
             return {"success": False, "error": str(e)}
@@ -176,21 +172,22 @@ class EvolutionInstanceService:
             Resultado da operação
         """
         try:
-            url = f"{self.base_url}/instance/logout/{instance_name}"
+            path = f"/instance/logout/{instance_name}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    headers=self.headers,
-                    timeout=15.0
-                )
+            response = await self.client.request(
+                "POST",
+                path,
+                operation="logout",
+                instance_name=instance_name,
+                idempotent=True
+            )
+            
+            if response.status_code in [200, 204]:
+                logger.info(f"Instância {instance_name} desconectada")
+                return {"success": True, "message": "Desconectado com sucesso"}
+            else:
+                return {"success": False, "error": response.text}
                 
-                if response.status_code in [200, 204]:
-                    logger.info(f"Instância {instance_name} desconectada")
-                    return {"success": True, "message": "Desconectado com sucesso"}
-                else:
-                    return {"success": False, "error": response.text}
-                    
         except Exception as e:
             logger.error(f"Erro ao desconectar: {e}")
             return {"success": False, "error": str(e)}
@@ -206,21 +203,21 @@ class EvolutionInstanceService:
             Resultado da operação
         """
         try:
-            url = f"{self.base_url}/instance/delete/{instance_name}"
+            path = f"/instance/delete/{instance_name}"
+            
+            response = await self.client.request(
+                "DELETE",
+                path,
+                operation="delete_instance",
+                instance_name=instance_name
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.delete(
-                    url,
-                    headers=self.headers,
-                    timeout=15.0
-                )
+            if response.status_code in [200, 204]:
+                logger.info(f"Instância {instance_name} removida")
+                return {"success": True, "message": "Instância removida"}
+            else:
+                return {"success": False, "error": response.text}
                 
-                if response.status_code in [200, 204]:
-                    logger.info(f"Instância {instance_name} removida")
-                    return {"success": True, "message": "Instância removida"}
-                else:
-                    return {"success": False, "error": response.text}
-                    
         except Exception as e:
             logger.error(f"Erro ao remover instância: {e}")
             return {"success": False, "error": str(e)}
@@ -236,36 +233,36 @@ class EvolutionInstanceService:
             Informações da instância (número conectado, nome, etc)
         """
         try:
-            url = f"{self.base_url}/instance/fetchInstances"
+            path = f"/instance/fetchInstances"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params={"instanceName": instance_name},
-                    timeout=15.0
-                )
+            response = await self.client.request(
+                "GET",
+                path,
+                operation="fetch_instances",
+                instance_name=instance_name,
+                params={"instanceName": instance_name}
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                # Procurar a instância específica
+                instances = data if isinstance(data, list) else [data]
+                for inst in instances:
+                    if inst.get("instance", {}).get("instanceName") == instance_name:
+                        owner = inst.get("instance", {}).get("owner", "")
+                        return {
+                            "success": True,
+                            "instance_name": instance_name,
+                            "phone_number": owner.split("@")[0] if owner else None,
+                            "status": inst.get("instance", {}).get("status", "unknown"),
+                            "profile_name": inst.get("instance", {}).get("profileName"),
+                            "profile_picture": inst.get("instance", {}).get("profilePictureUrl"),
+                            "token": inst.get("instance", {}).get("token", "")
+                        }
+                return {"success": True, "status": "not_found"}
+            else:
+                return {"success": False, "error": response.text}
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    # Procurar a instância específica
-                    instances = data if isinstance(data, list) else [data]
-                    for inst in instances:
-                        if inst.get("instance", {}).get("instanceName") == instance_name:
-                            owner = inst.get("instance", {}).get("owner", "")
-                            return {
-                                "success": True,
-                                "instance_name": instance_name,
-                                "phone_number": owner.split("@")[0] if owner else None,
-                                "status": inst.get("instance", {}).get("status", "unknown"),
-                                "profile_name": inst.get("instance", {}).get("profileName"),
-                                "profile_picture": inst.get("instance", {}).get("profilePictureUrl"),
-                                "token": inst.get("instance", {}).get("token", "")
-                            }
-                    return {"success": True, "status": "not_found"}
-                else:
-                    return {"success": False, "error": response.text}
-                    
         except Exception as e:
             logger.error(f"Erro ao obter info: {e}")
             return {"success": False, "error": str(e)}
@@ -288,29 +285,30 @@ class EvolutionInstanceService:
                 return {"healthy": False, "reason": "not_connected", "status": status.get("status")}
             
             # 2. Verificar se consegue buscar informações do perfil
-            url = f"{self.base_url}/chat/fetchProfilePictureUrl/{instance_name}"
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    headers=self.headers,
-                    json={"number": status.get("owner", "").replace("@s.whatsapp.net", "")},
-                    timeout=10.0
-                )
+            path = f"/chat/fetchProfilePictureUrl/{instance_name}"
+            response = await self.client.request(
+                "POST",
+                path,
+                operation="profile_picture",
+                instance_name=instance_name,
+                idempotent=True,
+                json={"number": status.get("owner", "").replace("@s.whatsapp.net", "")}
+            )
+            
+            if response.status_code == 200:
+                return {
+                    "healthy": True,
+                    "reason": "fully_connected",
+                    "phone_number": status.get("owner", "").split("@")[0],
+                    "last_check": datetime.now().isoformat()
+                }
+            else:
+                return {
+                    "healthy": False,
+                    "reason": "profile_unreachable",
+                    "status": "unstable"
+                }
                 
-                if response.status_code == 200:
-                    return {
-                        "healthy": True,
-                        "reason": "fully_connected",
-                        "phone_number": status.get("owner", "").split("@")[0],
-                        "last_check": datetime.now().isoformat()
-                    }
-                else:
-                    return {
-                        "healthy": False,
-                        "reason": "profile_unreachable",
-                        "status": "unstable"
-                    }
-                    
         except Exception as e:
             logger.error(f"Health check failed: {e}")
             return {"healthy": False, "reason": "check_failed", "error": str(e)}
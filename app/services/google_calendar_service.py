@@ -2,20 +2,23 @@
 """
 Serviço de integração com Google Calendar.
 """
-import logging
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, date as date_type
+from typing import Optional, Dict, List, Tuple
+from zoneinfo import ZoneInfo
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from google.auth.transport.requests import Request
 from app.database import get_supabase_client
+from app.services.google_credentials_service import google_credentials, build_api_client
 from app.utils.security import EncryptionService
 from app.config import settings
+from app.utils.metrics import metrics
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Escopos necessários
 SCOPES = [
@@ -24,6 +27,77 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive.file'
 ]
 
+DEFAULT_TIMEZONE = "America/Sao_Paulo"
+
+# Horário comercial padrão: todos os dias, 08:00–18:00 (chave = weekday, 0 = segunda)
+DEFAULT_BUSINESS_HOURS = {str(day): [["08:00", "18:00"]] for day in range(7)}
+
+Interval = Tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Sweep-line: ordena por início e funde intervalos sobrepostos ou contíguos."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def business_windows(start_date: date_type, days: int, business_hours: Dict,
+                     tz: ZoneInfo) -> List[Interval]:
+    """Janelas de atendimento (com fuso) para cada dia do período."""
+    windows = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for opening, closing in business_hours.get(str(day.weekday()), []):
+            open_h, open_m = map(int, opening.split(":"))
+            close_h, close_m = map(int, closing.split(":"))
+            windows.append((
+                datetime(day.year, day.month, day.day, open_h, open_m, tzinfo=tz),
+                datetime(day.year, day.month, day.day, close_h, close_m, tzinfo=tz)
+            ))
+    return sorted(windows)
+
+
+def compute_free_slots(windows: List[Interval], busy: List[Interval], duration_minutes: int,
+                       step_minutes: int = 30, not_before: Optional[datetime] = None) -> List[Interval]:
+    """
+    Slots livres dentro das janelas. Como janelas e ocupações estão ordenadas,
+    percorre as duas listas uma única vez (O(slots + ocupações)).
+    """
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    busy = merge_intervals(busy)
+    slots = []
+    index = 0
+
+    for window_start, window_end in windows:
+        current = window_start
+        while current + duration <= window_end:
+            slot_end = current + duration
+
+            # Descarta ocupações que terminaram antes do slot
+            while index < len(busy) and busy[index][1] <= current:
+                index += 1
+
+            if index < len(busy) and busy[index][0] < slot_end:
+                # Conflito: pula para o primeiro passo após o fim da ocupação
+                busy_end = busy[index][1]
+                steps = max(1, -(-(busy_end - current) // step))
+                current += step * steps
+                continue
+
+            if not not_before or current >= not_before:
+                slots.append((current, slot_end))
+            current += step
+
+    return slots
+
+
 class GoogleCalendarService:
     def __init__(self):
         self.encryption = EncryptionService()
@@ -31,6 +105,8 @@ class GoogleCalendarService:
         self.client_id = os.environ.get("GOOGLE_CLIENT_ID", "")
         self.client_secret = os.environ.get("GOOGLE_CLIENT_SECRET", "")
         self.redirect_uri = os.environ.get("GOOGLE_REDIRECT_URI", "")
+        # Em ordem de gravação: as entradas mais antigas ficam no início
+        self._availability_cache: "OrderedDict[tuple, Tuple[float, Dict[str, List[Dict]]]]" = OrderedDict()
         
         # Log de inicialização
         logger.info(f"GoogleCalendarService inicializado:")
@@ -88,7 +164,7 @@ class GoogleCalendarService:
             credentials = flow.credentials
             
             # Obter email da conta Google
-            service = build('calendar', 'v3', credentials=credentials)
+            service = build_api_client('calendar', 'v3', credentials)
             calendar = service.calendars().get(calendarId='primary').execute()
             google_email = calendar.get('id', '')
             
@@ -118,6 +194,8 @@ class GoogleCalendarService:
                 data["created_at"] = datetime.utcnow().isoformat()
                 supabase.table("google_calendar_integrations").insert(data).execute()
             
+            google_credentials.invalidate(tenet_id)
+            
             return {"success": True, "email": google_email}
             
         except Exception as e:
@@ -125,39 +203,8 @@ class GoogleCalendarService:
             return {"success": False, "error": str(e)}
     
     async def get_credentials(self, tenet_id: str) -> Optional[Credentials]:
-        """Obtém credenciais válidas para um tenet."""
-        supabase = get_supabase_client()
-        
-        result = supabase.table("google_calendar_integrations").select("*").eq("tenet_id", tenet_id).eq("is_active", True).execute()
-        
-        if not result.data:
-            return None
-        
-        integration = result.data[0]
-        
-        access_token = self.encryption.decrypt(integration["access_token_encrypted"])
-        refresh_token = self.encryption.decrypt(integration["refresh_token_encrypted"]) if integration.get("refresh_token_encrypted") else None
-        
-        credentials = Credentials(
-            token=access_token,
-            refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=self.client_id,
-            client_secret=self.client_secret
-        )
-        
-        # Refresh se expirado
-        if credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
-            
-            # Atualizar no banco
-            supabase.table("google_calendar_integrations").update({
-                "access_token_encrypted": self.encryption.encrypt(credentials.token),
-                "token_expiry": credentials.expiry.isoformat() if credentials.expiry else None,
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("tenet_id", tenet_id).execute()
-        
-        return credentials
+        """Obtém credenciais válidas para um tenet (cache compartilhado com refresh em background)."""
+        return google_credentials.get_credentials("calendar", tenet_id)
     
     async def create_event(
         self,
@@ -171,12 +218,10 @@ class GoogleCalendarService:
     ) -> Dict:
         """Cria um evento no Google Calendar."""
         try:
-            credentials = await self.get_credentials(tenet_id)
-            if not credentials:
+            service = google_credentials.get_calendar_client(tenet_id)
+            if not service:
                 return {"success": False, "error": "Google Calendar não conectado"}
             
-            service = build('calendar', 'v3', credentials=credentials)
-            
             event = {
                 'summary': summary,
                 'location': location,
@@ -202,6 +247,7 @@ class GoogleCalendarService:
                 event['attendees'] = [{'email': email} for email in attendees]
             
             created_event = service.events().insert(calendarId='primary', body=event).execute()
+            self.invalidate_availability(tenet_id)
             
             return {
                 "success": True,
@@ -213,6 +259,99 @@ class GoogleCalendarService:
             logger.error(f"Erro ao criar evento: {e}")
             return {"success": False, "error": str(e)}
     
+    def _get_schedule_settings(self, tenet_id: str) -> Tuple[Dict, ZoneInfo]:
+        """Horário comercial e fuso do tenant (com padrão 08–18h, America/Sao_Paulo)."""
+        business_hours, tz_name = DEFAULT_BUSINESS_HOURS, DEFAULT_TIMEZONE
+        try:
+            result = get_supabase_client().table("tenets").select(
+                "business_hours, timezone"
+            ).eq("id", tenet_id).execute()
+            if result.data:
+                business_hours = result.data[0].get("business_hours") or business_hours
+                tz_name = result.data[0].get("timezone") or tz_name
+        except Exception as e:
+            logger.warning(f"Erro ao buscar horário comercial do tenant {tenet_id}: {e}")
+        
+        try:
+            return business_hours, ZoneInfo(tz_name)
+        except Exception:
+            logger.warning(f"Fuso inválido '{tz_name}' no tenant {tenet_id}, usando {DEFAULT_TIMEZONE}")
+            return business_hours, ZoneInfo(DEFAULT_TIMEZONE)
+    
+    def invalidate_availability(self, tenet_id: str):
+        """Descarta disponibilidade em cache do tenant (ex.: após criar evento)."""
+        for key in [k for k in self._availability_cache if k[0] == tenet_id]:
+            self._availability_cache.pop(key, None)
+    
+    async def get_availability(
+        self,
+        tenet_id: str,
+        start_date: date_type,
+        days: int = 1,
+        duration_minutes: int = 60,
+        step_minutes: int = 30
+    ) -> Dict[str, List[Dict]]:
+        """
+        Horários livres para vários dias com uma única consulta FreeBusy.
+        Retorna {"YYYY-MM-DD": [{"start": "HH:MM", "end": "HH:MM"}, ...]}.
+        Resultados ficam em cache por AVAILABILITY_CACHE_TTL segundos.
+        """
+        cache_key = (tenet_id, start_date.isoformat(), days, duration_minutes, step_minutes)
+        cached = self._availability_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < settings.AVAILABILITY_CACHE_TTL:
+            metrics.increment("calendar_availability_cache", result="hit")
+            return cached[1]
+        metrics.increment("calendar_availability_cache", result="miss")
+        
+        service = google_credentials.get_calendar_client(tenet_id)
+        if not service:
+            return {}
+        
+        business_hours, tz = self._get_schedule_settings(tenet_id)
+        windows = business_windows(start_date, days, business_hours, tz)
+        availability = {(start_date + timedelta(days=offset)).isoformat(): [] for offset in range(days)}
+        if not windows:
+            return availability
+        
+        start = time.perf_counter()
+        response = service.freebusy().query(body={
+            "timeMin": windows[0][0].isoformat(),
+            "timeMax": windows[-1][1].isoformat(),
+            "timeZone": str(tz),
+            "items": [{"id": "primary"}]
+        }).execute()
+        metrics.observe("calendar_freebusy_ms", (time.perf_counter() - start) * 1000)
+        
+        busy = [
+            (datetime.fromisoformat(period["start"].replace("Z", "+00:00")),
+             datetime.fromisoformat(period["end"].replace("Z", "+00:00")))
+            for period in response.get("calendars", {}).get("primary", {}).get("busy", [])
+        ]
+        
+        slots = compute_free_slots(windows, busy, duration_minutes, step_minutes,
+                                   not_before=datetime.now(tz))
+        for slot_start, slot_end in slots:
+            local_start, local_end = slot_start.astimezone(tz), slot_end.astimezone(tz)
+            availability.setdefault(local_start.date().isoformat(), []).append({
+                "start": local_start.strftime("%H:%M"),
+                "end": local_end.strftime("%H:%M")
+            })
+        
+        self._store_availability(cache_key, availability)
+        return availability
+    
+    def _store_availability(self, cache_key: tuple, availability: Dict[str, List[Dict]]):
+        """Grava no cache descartando as entradas expiradas e as mais antigas acima do limite."""
+        now = time.monotonic()
+        self._availability_cache.pop(cache_key, None)
+        self._availability_cache[cache_key] = (now, availability)
+        while self._availability_cache:
+            key, (stored_at, _) = next(iter(self._availability_cache.items()))
+            if now - stored_at < settings.AVAILABILITY_CACHE_TTL and \
+                    len(self._availability_cache) <= settings.AVAILABILITY_CACHE_MAX_ENTRIES:
+                break
+            self._availability_cache.pop(key)
+    
     async def get_available_slots(
         self,
         tenet_id: str,
@@ -221,57 +360,9 @@ class GoogleCalendarService:
     ) -> List[Dict]:
         """Retorna horários disponíveis para um dia."""
         try:
-            credentials = await self.get_credentials(tenet_id)
-            if not credentials:
-                return []
-            
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Buscar eventos do dia
-            start_of_day = date.replace(hour=8, minute=0, second=0, microsecond=0)
-            end_of_day = date.replace(hour=18, minute=0, second=0, microsecond=0)
-            
-            events_result = service.events().list(
-                calendarId='primary',
-                timeMin=start_of_day.isoformat() + 'Z',
-                timeMax=end_of_day.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            # Calcular slots disponíveis
-            busy_times = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-                busy_times.append((datetime.fromisoformat(start.replace('Z', '+00:00')), datetime.fromisoformat(end.replace('Z', '+00:00'))))
-            
-            # Gerar slots de hora em hora
-            available_slots = []
-            current_time = start_of_day
-            
-            while current_time < end_of_day:
-                slot_end = current_time + timedelta(minutes=duration_minutes)
-                
-                # Verificar se slot está livre
-                is_available = True
-                for busy_start, busy_end in busy_times:
-                    # Verificar se há conflito
-                    if not (slot_end <= busy_start or current_time >= busy_end):
-                        is_available = False
-                        break
-                
-                if is_available:
-                    available_slots.append({
-                        "start": current_time.strftime("%H:%M"),
-                        "end": slot_end.strftime("%H:%M")
-                    })
-                
-                current_time += timedelta(minutes=30)
-            
-            return available_slots
+            availability = await self.get_availability(tenet_id, date.date(), days=1,
+                                                       duration_minutes=duration_minutes)
+            return availability.get(date.date().isoformat(), [])
             
         except Exception as e:
             logger.error(f"Erro ao buscar slots: {e}")
@@ -280,6 +371,7 @@ class GoogleCalendarService:
     async def disconnect(self, tenet_id: str) -> Dict:
         """Desconecta integração do Google Calendar."""
         try:
+            google_credentials.invalidate(tenet_id)
             supabase = get_supabase_client()
             supabase.table("google_calendar_integrations").update({
                 "is_active": False,
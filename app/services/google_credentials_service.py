@@ -0,0 +1,266 @@
+"""
+Cache compartilhado de credenciais Google por tenant.
+
+Usado pelos serviços de Calendar e Sheets:
+- Credenciais ficam em memória (evita decrypt/consulta ao banco por chamada)
+- Tokens são renovados em background antes de expirar e persistidos no banco
+- O documento de discovery é carregado uma vez; cada chamada recebe seu próprio
+  Resource da Calendar API (o httplib2.Http interno não é thread-safe)
+- Clientes gspread são reaproveitados por tenant
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, Optional, Tuple
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from app.config import settings
+from app.database import get_supabase_client
+from app.utils.background import BackgroundWorker
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.security import EncryptionService
+
+logger = get_logger(__name__)
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# Documentos de discovery já carregados (serviceName, version) -> dict
+_discovery_docs: Dict[Tuple[str, str], dict] = {}
+_discovery_lock = threading.Lock()
+
+
+def build_api_client(service_name: str, version: str, credentials: Credentials):
+    """build() reaproveitando o documento de discovery (estático) já carregado."""
+    key = (service_name, version)
+    with _discovery_lock:
+        if key not in _discovery_docs:
+            document = discovery_cache.get_static_doc(service_name, version)
+            _discovery_docs[key] = json.loads(document) if document else None
+
+    document = _discovery_docs[key]
+    if document is None:
+        return build(service_name, version, credentials=credentials, cache_discovery=False)
+    return build_from_document(document, credentials=credentials)
+
+
+def _parse_expiry(value) -> Optional[datetime]:
+    """google-auth usa datetime UTC sem timezone em Credentials.expiry."""
+    if not value:
+        return None
+    try:
+        expiry = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if expiry.tzinfo:
+        expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry
+
+
+class _Entry:
+    """Credenciais em cache de um tenant para uma origem (calendar/sheets)."""
+
+    def __init__(self, credentials: Credentials, persist: Callable[[Credentials], None]):
+        self.credentials = credentials
+        self.persist = persist
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.clients: Dict[str, object] = {}
+
+
+class GoogleCredentialsCache(BackgroundWorker):
+    """Cache de credenciais e clientes Google por tenant, com refresh proativo."""
+
+    name = "google-credentials"
+
+    def __init__(self):
+        super().__init__(interval=settings.GOOGLE_TOKEN_REFRESH_CHECK_INTERVAL)
+        self.encryption = EncryptionService()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client_id(self) -> str:
+        return os.environ.get("GOOGLE_CLIENT_ID", "")
+
+    @property
+    def client_secret(self) -> str:
+        return os.environ.get("GOOGLE_CLIENT_SECRET", "")
+
+    # ------------------------------------------------------------------
+    # Carregamento a partir do banco
+    # ------------------------------------------------------------------
+
+    def _load_calendar(self, tenet_id: str) -> Optional[_Entry]:
+        supabase = get_supabase_client()
+        result = supabase.table("google_calendar_integrations").select("*")\
+            .eq("tenet_id", tenet_id).eq("is_active", True).execute()
+
+        if not result.data:
+            return None
+
+        integration = result.data[0]
+        credentials = Credentials(
+            token=self.encryption.decrypt(integration["access_token_encrypted"]),
+            refresh_token=self.encryption.decrypt(integration["refresh_token_encrypted"])
+            if integration.get("refresh_token_encrypted") else None,
+            token_uri=TOKEN_URI,
+            client_id=self.client_id,
+            client_secret=self.client_secret
+        )
+        credentials.expiry = _parse_expiry(integration.get("token_expiry"))
+
+        def persist(creds: Credentials):
+            supabase.table("google_calendar_integrations").update({
+                "access_token_encrypted": self.encryption.encrypt(creds.token),
+                "token_expiry": creds.expiry.isoformat() if creds.expiry else None,
+                "updated_at": datetime.utcnow().isoformat()
+            }).eq("tenet_id", tenet_id).execute()
+
+        return _Entry(credentials, persist)
+
+    def _load_sheets(self, tenet_id: str) -> Optional[_Entry]:
+        supabase = get_supabase_client()
+        result = supabase.table("tenets").select("google_tokens").eq("id", tenet_id).execute()
+
+        tokens = result.data[0].get("google_tokens") if result.data else None
+        if not tokens:
+            # O consentimento do Calendar já inclui os escopos de Sheets/Drive
+            return self._load_calendar(tenet_id)
+
+        credentials = Credentials(
+            token=tokens.get("access_token"),
+            refresh_token=tokens.get("refresh_token"),
+            token_uri=TOKEN_URI,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=tokens.get("scopes") or [
+                'https://www.googleapis.com/auth/spreadsheets',
+                'https://www.googleapis.com/auth/drive.file'
+            ]
+        )
+        credentials.expiry = _parse_expiry(tokens.get("expiry"))
+
+        def persist(creds: Credentials):
+            supabase.table("tenets").update({
+                "google_tokens": {
+                    **tokens,
+                    "access_token": creds.token,
+                    "expiry": creds.expiry.isoformat() if creds.expiry else None
+                }
+            }).eq("id", tenet_id).execute()
+
+        return _Entry(credentials, persist)
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def _get_entry(self, source: str, tenet_id: str) -> Optional[_Entry]:
+        key = (source, tenet_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry.loaded_at >= settings.GOOGLE_CREDENTIALS_CACHE_TTL:
+                self._entries.pop(key, None)
+                entry = None
+
+        if entry is None:
+            loader = self._load_calendar if source == "calendar" else self._load_sheets
+            entry = loader(tenet_id)
+            if entry is None:
+                return None
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+
+        # Garantia: se o refresh em background não rodou a tempo, renova aqui
+        if self._needs_refresh(entry.credentials, margin=0):
+            self._refresh(source, tenet_id, entry)
+        return entry
+
+    def get_credentials(self, source: str, tenet_id: str) -> Optional[Credentials]:
+        """Credenciais válidas do tenant ('calendar' ou 'sheets')."""
+        entry = self._get_entry(source, tenet_id)
+        return entry.credentials if entry else None
+
+    def get_calendar_client(self, tenet_id: str):
+        """
+        Cliente da Calendar API v3 do tenant. Um novo Resource por chamada
+        (build_from_document, sem I/O), pois o chamador pode estar em qualquer
+        thread; credenciais e discovery continuam em cache.
+        """
+        entry = self._get_entry("calendar", tenet_id)
+        if not entry:
+            return None
+        return build_api_client("calendar", "v3", entry.credentials)
+
+    def get_sheets_client(self, tenet_id: str) -> Optional[gspread.Client]:
+        """Cliente gspread autorizado reaproveitado por tenant."""
+        entry = self._get_entry("sheets", tenet_id)
+        if not entry:
+            return None
+        with entry.lock:
+            if "gspread" not in entry.clients:
+                entry.clients["gspread"] = gspread.authorize(entry.credentials)
+            return entry.clients["gspread"]
+
+    def invalidate(self, tenet_id: str):
+        """Descarta credenciais/clientes do tenant (reconexão ou desconexão)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == tenet_id]:
+                self._entries.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def _needs_refresh(self, credentials: Credentials, margin: float) -> bool:
+        if not credentials.refresh_token:
+            return False
+        if not credentials.token or not credentials.expiry:
+            return credentials.expired or not credentials.token
+        return credentials.expiry - timedelta(seconds=margin) <= datetime.utcnow()
+
+    def _refresh(self, source: str, tenet_id: str, entry: _Entry) -> bool:
+        with entry.lock:
+            # Outro thread pode ter renovado enquanto aguardávamos o lock
+            if not self._needs_refresh(entry.credentials, margin=settings.GOOGLE_TOKEN_REFRESH_MARGIN):
+                return True
+
+            start = time.perf_counter()
+            try:
+                entry.credentials.refresh(Request())
+                entry.persist(entry.credentials)
+                metrics.observe("google_token_refresh_ms", (time.perf_counter() - start) * 1000, source=source)
+                return True
+            except Exception as e:
+                metrics.increment("google_token_refresh_failures", source=source)
+                logger.error(f"Erro ao renovar token Google ({source}) do tenant {tenet_id}: {e}")
+                return False
+
+    async def run_once(self):
+        """
+        Renova tokens que expiram dentro de GOOGLE_TOKEN_REFRESH_MARGIN.
+        Entradas além de GOOGLE_CREDENTIALS_CACHE_TTL (tenant sem uso) são
+        removidas em vez de renovadas.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, e in self._entries.items()
+                        if now - e.loaded_at >= settings.GOOGLE_CREDENTIALS_CACHE_TTL]:
+                self._entries.pop(key, None)
+            entries = list(self._entries.items())
+
+        for (source, tenet_id), entry in entries:
+            if self._needs_refresh(entry.credentials, margin=settings.GOOGLE_TOKEN_REFRESH_MARGIN):
+                self._refresh(source, tenet_id, entry)
+
+        metrics.set_gauge("google_credentials_cached", len(entries))
+
+
+# Singleton
+google_credentials = GoogleCredentialsCache()
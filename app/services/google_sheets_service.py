@@ -2,15 +2,21 @@
 """
 Serviço de integração com Google Sheets.
 """
-import os
-import logging
+import time
+import threading
+from collections import defaultdict, deque
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import gspread
 from google.oauth2.credentials import Credentials
+from app.config import settings
 from app.database import get_supabase_client
+from app.services.google_credentials_service import google_credentials
+from app.utils.background import BackgroundWorker, exponential_backoff
+from app.utils.metrics import metrics
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
@@ -18,6 +24,21 @@ SCOPES = [
 ]
 
 
+def build_lead_row(lead_data: Dict) -> List:
+    """Linha da planilha de leads, na ordem dos cabeçalhos."""
+    return [
+        datetime.now(timezone.utc).strftime("%d/%m/%Y %H:%M"),
+        lead_data.get("nome", ""),
+        lead_data.get("telefone", ""),
+        lead_data.get("email", ""),
+        lead_data.get("empresa", ""),
+        lead_data.get("status", "Novo"),
+        lead_data.get("score", ""),
+        lead_data.get("origem", "WhatsApp"),
+        lead_data.get("observacoes", "")
+    ]
+
+
 class GoogleSheetsService:
     
     def __init__(self):
@@ -25,38 +46,14 @@ class GoogleSheetsService:
     
     def _get_credentials(self, tenet_id: str) -> Optional[Credentials]:
         try:
-            result = self.supabase.table("tenets").select(
-                "google_tokens"
-            ).eq("id", tenet_id).execute()
-            
-            if not result.data or not result.data[0].get("google_tokens"):
-                return None
-            
-            tokens = result.data[0]["google_tokens"]
-            
-            credentials = Credentials(
-                token=tokens.get("access_token"),
-                refresh_token=tokens.get("refresh_token"),
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=os.getenv("GOOGLE_CLIENT_ID"),
-                client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-                scopes=SCOPES
-            )
-            
-            return credentials
-            
+            return google_credentials.get_credentials("sheets", tenet_id)
         except Exception as e:
             logger.error(f"Erro ao obter credenciais: {e}")
             return None
     
     def _get_client(self, tenet_id: str) -> Optional[gspread.Client]:
-        credentials = self._get_credentials(tenet_id)
-        if not credentials:
-            return None
-        
         try:
-            client = gspread.authorize(credentials)
-            return client
+            return google_credentials.get_sheets_client(tenet_id)
         except Exception as e:
             logger.error(f"Erro ao autorizar gspread: {e}")
             return None
@@ -93,6 +90,7 @@ class GoogleSheetsService:
             })
             
             worksheet.freeze(rows=1)
+            sheets_writer.invalidate(tenet_id)
             
             self.supabase.table("tenets").update({
                 "google_sheets_id": spreadsheet.id,
@@ -120,6 +118,7 @@ class GoogleSheetsService:
                 return {"error": "Google não conectado. Conecte primeiro pelo Google Calendar."}
             
             spreadsheet = client.open_by_url(spreadsheet_url)
+            sheets_writer.invalidate(tenet_id)
             
             self.supabase.table("tenets").update({
                 "google_sheets_id": spreadsheet.id,
@@ -143,6 +142,12 @@ class GoogleSheetsService:
             return {"error": str(e)}
     
     async def add_lead(self, tenet_id: str, lead_data: Dict) -> Dict:
+        # Com o writer em background ativo, a linha entra no buffer do tenant
+        # e é gravada em lote (append_rows) fora do event loop
+        if sheets_writer.running:
+            sheets_writer.enqueue(tenet_id, build_lead_row(lead_data))
+            return {"success": True, "queued": True, "message": "Lead enfileirado para a planilha"}
+        
         try:
             result = self.supabase.table("tenets").select(
                 "google_sheets_id"
@@ -161,19 +166,7 @@ class GoogleSheetsService:
             spreadsheet = client.open_by_key(spreadsheet_id)
             worksheet = spreadsheet.sheet1
             
-            row = [
-                datetime.now(timezone.utc).strftime("%d/%m/%Y %H:%M"),
-                lead_data.get("nome", ""),
-                lead_data.get("telefone", ""),
-                lead_data.get("email", ""),
-                lead_data.get("empresa", ""),
-                lead_data.get("status", "Novo"),
-                lead_data.get("score", ""),
-                lead_data.get("origem", "WhatsApp"),
-                lead_data.get("observacoes", "")
-            ]
-            
-            worksheet.append_row(row)
+            worksheet.append_row(build_lead_row(lead_data))
             
             logger.info(f"Lead adicionado à planilha do tenet {tenet_id}")
             
@@ -184,6 +177,7 @@ class GoogleSheetsService:
             return {"error": str(e)}
     
     async def disconnect(self, tenet_id: str) -> Dict:
+        sheets_writer.invalidate(tenet_id)
         try:
             self.supabase.table("tenets").update({
                 "google_sheets_id": None,
@@ -218,3 +212,128 @@ class GoogleSheetsService:
         except Exception as e:
             logger.error(f"Erro ao verificar status: {e}")
             return {"error": str(e)}
+
+
+class SheetsBufferedWriter(BackgroundWorker):
+    """
+    Buffer de linhas por tenant, gravado com um único append_rows quando
+    atinge SHEETS_BATCH_SIZE ou a cada SHEETS_FLUSH_INTERVAL segundos.
+    Mantém em cache o cliente autorizado e a worksheet de cada tenant.
+    Tenants cuja gravação falha aguardam com backoff; após
+    SHEETS_FLUSH_MAX_ATTEMPTS falhas seguidas o buffer é descartado.
+    """
+    
+    name = "sheets-writer"
+    
+    def __init__(self):
+        super().__init__(interval=settings.SHEETS_FLUSH_INTERVAL)
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, deque] = defaultdict(deque)
+        self._worksheets: Dict[str, tuple] = {}
+        self._failures: Dict[str, tuple] = {}  # tenet_id -> (falhas seguidas, próxima tentativa)
+        self._service: Optional[GoogleSheetsService] = None
+    
+    @property
+    def service(self) -> GoogleSheetsService:
+        if self._service is None:
+            self._service = GoogleSheetsService()
+        return self._service
+    
+    def enqueue(self, tenet_id: str, row: List):
+        with self._lock:
+            buffer = self._buffers[tenet_id]
+            buffer.append(row)
+            # Limita memória se a planilha ficar indisponível por muito tempo
+            while len(buffer) > settings.SHEETS_MAX_BUFFERED_ROWS:
+                buffer.popleft()
+                metrics.increment("sheets_rows_dropped")
+            full = len(buffer) >= settings.SHEETS_BATCH_SIZE
+        
+        if full:
+            self.wake()
+    
+    def invalidate(self, tenet_id: str):
+        """Descarta a worksheet em cache (planilha trocada ou desconectada)."""
+        with self._lock:
+            self._worksheets.pop(tenet_id, None)
+    
+    def _get_worksheet(self, tenet_id: str):
+        """Worksheet em cache por SHEETS_CACHE_TTL; None se o tenant não tem planilha."""
+        cached = self._worksheets.get(tenet_id)
+        if cached and time.monotonic() - cached[1] < settings.SHEETS_CACHE_TTL:
+            return cached[0]
+        
+        worksheet = None
+        result = self.service.supabase.table("tenets").select(
+            "google_sheets_id"
+        ).eq("id", tenet_id).execute()
+        
+        spreadsheet_id = result.data[0].get("google_sheets_id") if result.data else None
+        if spreadsheet_id:
+            client = self.service._get_client(tenet_id)
+            if not client:
+                raise RuntimeError("Credenciais Google inválidas")
+            worksheet = client.open_by_key(spreadsheet_id).sheet1
+        
+        self._worksheets[tenet_id] = (worksheet, time.monotonic())
+        return worksheet
+    
+    def flush_tenant(self, tenet_id: str) -> int:
+        """Grava o buffer do tenant; em caso de erro as linhas voltam para o buffer."""
+        with self._lock:
+            rows = list(self._buffers.pop(tenet_id, []))
+        if not rows:
+            return 0
+        
+        start = time.perf_counter()
+        try:
+            worksheet = self._get_worksheet(tenet_id)
+            if worksheet is None:
+                logger.debug(f"Tenet {tenet_id} não tem planilha configurada")
+                return 0
+            
+            # RAW: textos do lead (nome, observações...) nunca viram fórmulas
+            worksheet.append_rows(rows, value_input_option="RAW")
+            self._failures.pop(tenet_id, None)
+            metrics.observe("sheets_append_ms", (time.perf_counter() - start) * 1000)
+            metrics.observe("sheets_append_rows", len(rows))
+            logger.info(f"{len(rows)} lead(s) adicionados à planilha do tenet {tenet_id}")
+            return len(rows)
+        
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote na planilha do tenet {tenet_id}: {e}")
+            metrics.increment("sheets_append_errors")
+            self.invalidate(tenet_id)
+            
+            attempts = self._failures.get(tenet_id, (0, 0.0))[0] + 1
+            if attempts >= settings.SHEETS_FLUSH_MAX_ATTEMPTS:
+                logger.error(f"Planilha do tenet {tenet_id} falhou {attempts} vezes, descartando {len(rows)} linha(s)")
+                metrics.increment("sheets_rows_dropped", len(rows))
+                self._failures.pop(tenet_id, None)
+                return 0
+            
+            delay = exponential_backoff(attempts, settings.SHEETS_BACKOFF_BASE, settings.SHEETS_BACKOFF_MAX)
+            self._failures[tenet_id] = (attempts, time.monotonic() + delay)
+            with self._lock:
+                self._buffers[tenet_id].extendleft(reversed(rows))
+            return 0
+    
+    def flush_all(self, force: bool = False):
+        """Grava os buffers; sem `force`, pula tenants ainda em backoff."""
+        now = time.monotonic()
+        with self._lock:
+            tenet_ids = [t for t, buffer in self._buffers.items() if buffer]
+        for tenet_id in tenet_ids:
+            if not force and self._failures.get(tenet_id, (0, 0.0))[1] > now:
+                continue
+            self.flush_tenant(tenet_id)
+    
+    async def run_once(self):
+        self.flush_all()
+    
+    async def on_stop(self):
+        self.flush_all(force=True)
+
+
+# Singleton
+sheets_writer = SheetsBufferedWriter()
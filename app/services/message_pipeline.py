@@ -0,0 +1,648 @@
+"""
+Pipeline de processamento de mensagens recebidas (Evolution e Meta).
+
+Etapas:
+    normalize → dedup → tenant → admission (cota) + context (histórico/RAG)
+    → generate → reply → persist → side_effects (CRM, Sheets, email)
+
+Cada canal implementa um adaptador (normalização, identificação da agência
+e envio). A latência de cada etapa vai para `pipeline_stage_ms`; os efeitos
+colaterais podem rodar em background sem segurar a resposta do webhook.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.ai_service import AIService
+from app.services.conversation_service import ConversationService
+from app.services.crm_outbox_service import crm_outbox_dispatcher
+from app.services.crm_service import CRMService
+from app.services.google_sheets_service import GoogleSheetsService
+from app.services.meta_whatsapp_service import MetaWhatsAppService
+from app.services.notification_service import NotificationService
+from app.services.rag_service import rag_service
+from app.services.tenet_service import AgencyService
+from app.services.token_tracking_service import TokenTrackingService
+from app.services.whatsapp_outbox_service import whatsapp_outbox
+from app.utils.concurrency import run_in_thread, with_timeout
+from app.utils.input_sanitizer import sanitize_for_ai, input_sanitizer
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.request_context import bind_context
+
+logger = get_logger(__name__)
+
+LIMIT_MESSAGE = "Olá! No momento estamos com nossa capacidade de atendimento no limite. Por favor, tente novamente mais tarde ou entre em contato por outro canal. Obrigado pela compreensão! 🙏"
+
+EMPTY_CONVERSATION = {
+    "conversation_id": None,
+    "history": [],
+    "lead_status": "iniciada",
+    "lead_data": {},
+    "total_messages": 0,
+    "exists": False
+}
+
+
+class PipelineError(Exception):
+    """Falha que interrompe o processamento de uma mensagem."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class IncomingMessage:
+    """Mensagem normalizada, independente do canal."""
+
+    def __init__(self, channel: str, sender_id: str, sender_phone: str, text: str,
+                 message_id: Optional[str] = None, sender_name: str = ""):
+        self.channel = channel
+        self.sender_id = sender_id
+        self.sender_phone = sender_phone
+        self.text = text
+        self.message_id = message_id
+        self.sender_name = sender_name
+
+
+class PipelineContext:
+    """Estado de uma mensagem ao longo das etapas."""
+
+    def __init__(self, message: IncomingMessage, adapter: "ChannelAdapter", agency: Optional[dict] = None):
+        self.message = message
+        self.adapter = adapter
+        self.agency = agency
+        self.supabase = None
+        self.sanitized_text = ""
+        self.conversation: Dict[str, Any] = EMPTY_CONVERSATION
+        self.quota: Dict[str, Any] = {"allowed": True}
+        self.rag_context: Optional[Dict[str, Any]] = None
+        self.history_formatted = ""
+        self.ai_response = ""
+        self.extracted_data: Dict[str, Any] = {}
+        self.reply_queued = False
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def agency_id(self) -> Optional[str]:
+        return self.agency.get("id") if self.agency else None
+
+    @property
+    def known_lead_data(self) -> Dict[str, Any]:
+        return self.conversation.get("lead_data") or {}
+
+
+# ============================================
+# ADAPTADORES DE CANAL
+# ============================================
+
+class ChannelAdapter:
+    """Normalização, identificação da agência e envio de um canal."""
+
+    channel = ""
+
+    def normalize(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Retorna {"messages": [IncomingMessage], "statuses": [...], "ignored": motivo|None}."""
+        raise NotImplementedError
+
+    async def resolve_tenet(self, agency_service: AgencyService, sender_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def send(self, ctx: PipelineContext, text: str) -> Dict[str, Any]:
+        """Enfileira a resposta; a fila aplica cadência e digitação por remetente."""
+        return await whatsapp_outbox.enqueue(
+            tenet_id=ctx.agency_id,
+            channel=self.channel,
+            sender_id=ctx.message.sender_id,
+            recipient=ctx.message.sender_phone,
+            message=text
+        )
+
+
+def extract_phone_number(remote_jid: str) -> str:
+    """
+    Extrai o número de telefone do remoteJid.
+
+    Args:
+        remote_jid: ID no formato '5515998332211@s.whatsapp.net'
+
+    Returns:
+        Número limpo: '5515998332211'
+    """
+    return remote_jid.split('@')[0] if '@' in remote_jid else remote_jid
+
+
+def extract_message_text(data: dict) -> Optional[str]:
+    """
+    Extrai o texto da mensagem do payload do webhook.
+
+    Args:
+        data: Dados do webhook
+
+    Returns:
+        Texto da mensagem ou None
+    """
+    message = data.get("message", {})
+
+    # Mensagem de texto simples
+    if "conversation" in message:
+        return message["conversation"]
+
+    # Mensagem de texto estendida
+    if "extendedTextMessage" in message:
+        return message["extendedTextMessage"].get("text")
+
+    # Outros tipos de mensagem (ignorar por enquanto)
+    return None
+
+
+class EvolutionAdapter(ChannelAdapter):
+    """Evolution API (envio via WhatsAppService na fila de saída)."""
+
+    channel = "evolution"
+
+    def normalize(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        event = payload.get("event")
+
+        # Status de entrega das mensagens enviadas
+        if event == "messages.update":
+            updates = payload.get("data") or []
+            statuses = [{
+                "message_id": update.get("keyId") or (update.get("key") or {}).get("id"),
+                "status": update.get("status") or (update.get("update") or {}).get("status")
+            } for update in (updates if isinstance(updates, list) else [updates])]
+            return {"messages": [], "statuses": statuses, "ignored": None}
+
+        if event != "messages.upsert":
+            return {"messages": [], "statuses": [], "ignored": f"event type: {event}"}
+
+        data = payload.get("data", {})
+        key = data.get("key", {})
+
+        # Ignorar mensagens enviadas pelo próprio bot
+        if key.get("fromMe", False):
+            return {"messages": [], "statuses": [], "ignored": "own message"}
+
+        text = extract_message_text(data)
+        if not text:
+            return {"messages": [], "statuses": [], "ignored": "no text content"}
+
+        return {"messages": [IncomingMessage(
+            channel=self.channel,
+            sender_id=payload.get("instance", "agencia-teste"),
+            sender_phone=extract_phone_number(key.get("remoteJid", "")),
+            text=text,
+            message_id=key.get("id"),
+            sender_name=data.get("pushName", "Cliente")
+        )], "statuses": [], "ignored": None}
+
+    async def resolve_tenet(self, agency_service: AgencyService, sender_id: str) -> Optional[dict]:
+        # Tentar identificar agência pelo instance_name (multi-agência)
+        agency = await agency_service.get_tenet_by_instance(sender_id)
+        if agency:
+            logger.info(f"Agência identificada por instance_name '{sender_id}': {agency.get('nome')} (ID: {agency.get('id')})")
+            return agency
+
+        # Fallback: usar DEFAULT_AGENCY_ID se instance não encontrada
+        agency_id = os.getenv("DEFAULT_AGENCY_ID") or settings.DEFAULT_AGENCY_ID
+        if not agency_id:
+            logger.error(f"Agência não encontrada para instance '{sender_id}' e DEFAULT_AGENCY_ID não configurado")
+            raise PipelineError(404, f"Agência não encontrada para instance: {sender_id}")
+
+        logger.warning(f"Instance '{sender_id}' não encontrada, usando fallback DEFAULT_AGENCY_ID: {agency_id}")
+        agency = await agency_service.get_tenet_by_id(agency_id)
+        if not agency:
+            logger.error(f"Agência fallback não encontrada: {agency_id}")
+            raise PipelineError(404, "Agência não encontrada")
+        return agency
+
+
+class MetaAdapter(ChannelAdapter):
+    """Meta Cloud API (envio via MetaWhatsAppService na fila de saída)."""
+
+    channel = "meta"
+
+    def normalize(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if payload.get("object") != "whatsapp_business_account":
+            return {"messages": [], "statuses": [], "ignored": "not whatsapp"}
+
+        # Todas as mensagens e status do lote (vários entries/changes)
+        events = MetaWhatsAppService.parse_webhook_events(payload)
+        messages = [IncomingMessage(
+            channel=self.channel,
+            sender_id=m["phone_number_id"],
+            sender_phone=m["from"],
+            text=m["text"],
+            message_id=m.get("message_id"),
+            sender_name=m.get("contact_name", "")
+        ) for m in events["messages"] if m.get("text") and m.get("from")]
+        return {"messages": messages, "statuses": events["statuses"], "ignored": None}
+
+    async def resolve_tenet(self, agency_service: AgencyService, sender_id: str) -> Optional[dict]:
+        agency = await agency_service.get_tenet_by_meta_phone_number_id(sender_id)
+        if not agency:
+            logger.error(f"Agência não encontrada para phone_number_id '{sender_id}'")
+            raise PipelineError(404, f"Agência não encontrada para phone_number_id: {sender_id}")
+        logger.info(f"Agência identificada por phone_number_id '{sender_id}': {agency.get('nome')} (ID: {agency.get('id')})")
+        return agency
+
+
+# ============================================
+# DEDUPLICAÇÃO
+# ============================================
+
+class _RecentMessages:
+    """IDs de mensagens recentes (provedores reenviam webhooks em caso de falha)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: Dict[str, float] = {}
+
+    def claim(self, key: str) -> bool:
+        """Registra o ID; False se já foi visto dentro do TTL."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._seen) > settings.PIPELINE_DEDUP_MAX_ENTRIES:
+                ttl = settings.PIPELINE_DEDUP_TTL
+                self._seen = {k: t for k, t in self._seen.items() if now - t < ttl}
+            seen_at = self._seen.get(key)
+            if seen_at is not None and now - seen_at < settings.PIPELINE_DEDUP_TTL:
+                return False
+            self._seen[key] = now
+            return True
+
+    def release(self, key: str):
+        """Libera o ID para que a reentrega do provedor seja processada."""
+        with self._lock:
+            self._seen.pop(key, None)
+
+
+# ============================================
+# PIPELINE
+# ============================================
+
+class MessagePipeline:
+    """Executa as etapas para cada mensagem recebida."""
+
+    def __init__(self):
+        self._recent = _RecentMessages()
+        self._side_effect_tasks: set = set()
+
+    @contextmanager
+    def _stage(self, ctx: PipelineContext, name: str):
+        start = time.perf_counter()
+        try:
+            with bind_context(stage=name):
+                yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            ctx.timings[name] = elapsed
+            metrics.observe("pipeline_stage_ms", elapsed, stage=name, channel=ctx.message.channel)
+
+    async def handle(self, adapter: ChannelAdapter, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Normaliza o payload e processa todas as mensagens: mesmo lead em
+        ordem, leads diferentes em paralelo, agência resolvida uma vez por remetente.
+        """
+        start = time.perf_counter()
+        normalized = adapter.normalize(payload)
+        metrics.observe("pipeline_stage_ms", (time.perf_counter() - start) * 1000,
+                        stage="normalize", channel=adapter.channel)
+
+        for status in normalized["statuses"]:
+            whatsapp_outbox.update_delivery_status(status.get("message_id"), status.get("status"))
+
+        batch = {"ignored": normalized["ignored"], "statuses": len(normalized["statuses"]),
+                 "messages": len(normalized["messages"]), "results": [],
+                 "message_id": normalized["messages"][0].message_id if normalized["messages"] else None}
+
+        messages = [m for m in normalized["messages"] if self._dedup(m)]
+        if len(messages) < len(normalized["messages"]):
+            batch["duplicates"] = len(normalized["messages"]) - len(messages)
+        if not messages:
+            return batch
+
+        agency_service = AgencyService(get_supabase_client())
+        agencies: Dict[str, Any] = {}
+        for sender_id in {m.sender_id for m in messages}:
+            try:
+                agencies[sender_id] = await adapter.resolve_tenet(agency_service, sender_id)
+            except PipelineError as e:
+                agencies[sender_id] = e
+            except Exception as e:
+                agencies[sender_id] = PipelineError(500, str(e))
+
+        by_lead: Dict[tuple, List[IncomingMessage]] = {}
+        for message in messages:
+            by_lead.setdefault((message.sender_id, message.sender_phone), []).append(message)
+
+        async def process_lead(lead_messages: List[IncomingMessage]) -> List[Dict[str, Any]]:
+            results = []
+            for message in lead_messages:
+                agency = agencies[message.sender_id]
+                ctx = None
+                try:
+                    if isinstance(agency, PipelineError):
+                        raise agency
+                    ctx = PipelineContext(message, adapter, agency)
+                    # Logs, métricas e efeitos colaterais da mensagem levam o tenant
+                    with bind_context(tenet_id=agency.get("id")):
+                        results.append(await self.process(ctx))
+                except Exception as e:
+                    if ctx is not None and ctx.reply_queued:
+                        # O lead já recebeu a resposta: uma reentrega do webhook
+                        # não pode gerar outra, então o claim é mantido
+                        metrics.increment("pipeline_persist_failures", channel=message.channel)
+                        logger.error(f"Falha após responder a mensagem {message.message_id or ''} "
+                                     f"({message.channel}), histórico não salvo: {e}")
+                    else:
+                        if message.message_id:
+                            self._recent.release(f"{message.channel}:{message.message_id}")
+                        logger.error(f"Erro ao processar mensagem {message.message_id or ''} ({message.channel}): {e}")
+                    status_code = e.status_code if isinstance(e, PipelineError) else 500
+                    results.append({"status": "error", "status_code": status_code, "detail": str(e)})
+            return results
+
+        for results in await asyncio.gather(*[process_lead(m) for m in by_lead.values()]):
+            batch["results"].extend(results)
+        return batch
+
+    def _dedup(self, message: IncomingMessage) -> bool:
+        if not message.message_id:
+            return True
+        if self._recent.claim(f"{message.channel}:{message.message_id}"):
+            return True
+        metrics.increment("pipeline_duplicates", channel=message.channel)
+        logger.info(f"Mensagem duplicada ignorada: {message.message_id}")
+        return False
+
+    async def process(self, ctx: PipelineContext) -> Dict[str, Any]:
+        """Processa uma mensagem já normalizada e deduplicada."""
+        message = ctx.message
+        logger.info(f"Mensagem recebida de {message.sender_phone[-4:]}*** via {message.sender_id}")
+        ctx.supabase = get_supabase_client()
+
+        with self._stage(ctx, "tenant"):
+            await self._resolve_tenant(ctx)
+
+        with self._stage(ctx, "admission_context"):
+            await self._admit_and_fetch_context(ctx)
+
+        if not ctx.quota.get("allowed", True):
+            logger.warning(f"Tenet {ctx.agency_id} sem tokens disponíveis")
+            # Enviar mensagem informando que acabou o limite
+            await ctx.adapter.send(ctx, LIMIT_MESSAGE)
+            ctx.reply_queued = True
+            return {"status": "limit_reached"}
+
+        with self._stage(ctx, "generate"):
+            await self._generate(ctx)
+
+        with self._stage(ctx, "reply"):
+            await ctx.adapter.send(ctx, ctx.ai_response)
+            ctx.reply_queued = True
+
+        with self._stage(ctx, "persist"):
+            # Atualizar histórico e dados do lead
+            await ConversationService(ctx.supabase).update_conversation_history(
+                tenet_id=ctx.agency_id,
+                lead_phone=message.sender_phone,
+                user_message=message.text,
+                assistant_message=ctx.ai_response,
+                lead_data=ctx.extracted_data or None
+            )
+
+        await self._schedule_side_effects(ctx)
+
+        return {
+            "status": "success",
+            "message": "Mensagem processada",
+            "lead_phone": message.sender_phone,
+            "conversation_exists": ctx.conversation.get("exists"),
+            "data_extracted": bool(ctx.extracted_data)
+        }
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+
+    async def _resolve_tenant(self, ctx: PipelineContext):
+        agency_service = AgencyService(ctx.supabase)
+        if ctx.agency is None:
+            ctx.agency = await ctx.adapter.resolve_tenet(agency_service, ctx.message.sender_id)
+
+        logger.info(f"Agência ativa: {ctx.agency.get('nome')} (ID: {ctx.agency_id})")
+
+        # Descriptografar tokens da agência
+        if not await agency_service.decrypt_tenet_keys(ctx.agency_id):
+            logger.error("Falha ao descriptografar tokens da agência")
+            raise PipelineError(500, "Erro nos tokens da agência")
+
+        # Detectar tentativa de injection (uma varredura, reaproveitada na sanitização)
+        scan = input_sanitizer.scan(ctx.message.text)
+        if scan.is_suspicious:
+            logger.warning(f"Possível prompt injection de {ctx.message.sender_phone[:6]}***: {scan.reason}")
+        ctx.sanitized_text, _ = sanitize_for_ai(ctx.message.text, scan=scan)
+
+    async def _admit_and_fetch_context(self, ctx: PipelineContext):
+        """Cota, histórico e Base de Conhecimento em paralelo, cada um com timeout próprio."""
+        agency = ctx.agency
+        # Cada etapa usa seu próprio cliente Supabase e roda em thread própria
+        conversation_service = ConversationService(ctx.supabase)
+        tracking_service = TokenTrackingService(get_supabase_client())
+
+        if agency.get("rag_enabled"):
+            rag_stage = with_timeout(
+                run_in_thread(
+                    rag_service.build_context,
+                    ctx.agency_id,
+                    ctx.message.text,
+                    token_budget=agency.get("rag_token_budget"),
+                    embedding_model=agency.get("embedding_model") or settings.EMBEDDING_MODEL
+                ),
+                settings.WEBHOOK_RAG_TIMEOUT,
+                default=None,
+                stage="rag"
+            )
+        else:
+            rag_stage = asyncio.sleep(0, result=None)
+
+        ctx.conversation, ctx.quota, ctx.rag_context = await asyncio.gather(
+            with_timeout(
+                run_in_thread(
+                    conversation_service.get_conversation_history,
+                    tenet_id=ctx.agency_id,
+                    lead_phone=ctx.message.sender_phone,
+                    limit_messages=10
+                ),
+                settings.WEBHOOK_HISTORY_TIMEOUT,
+                default=EMPTY_CONVERSATION,
+                stage="history"
+            ),
+            with_timeout(
+                run_in_thread(tracking_service.check_can_use, ctx.agency_id),
+                settings.WEBHOOK_QUOTA_TIMEOUT,
+                default={"allowed": True, "reason": "timeout_checking"},
+                stage="quota"
+            ),
+            rag_stage
+        )
+
+        # Formatar histórico para o prompt
+        ctx.history_formatted = conversation_service.format_history_for_prompt(
+            ctx.conversation.get("history", [])
+        )
+
+        if ctx.conversation.get("exists"):
+            logger.info(f"Histórico carregado: {ctx.conversation.get('total_messages', 0)} mensagens")
+        else:
+            logger.info("Nova conversa iniciada")
+
+    async def _generate(self, ctx: PipelineContext):
+        agency = ctx.agency
+        # Montar configurações do agente
+        agent_config = {
+            "tenet_id": ctx.agency_id,
+            "agent_name": agency.get("agent_name", "Assistente"),
+            "personality": agency.get("personality", "profissional e amigável"),
+            "welcome_message": agency.get("welcome_message"),
+            "qualification_questions": agency.get("qualification_questions", []),
+            "qualification_criteria": agency.get("qualification_criteria"),
+            "closing_message": agency.get("closing_message")
+        }
+
+        ai_result = await AIService().generate_response(
+            message=ctx.sanitized_text,
+            agency_name=agency.get("nome", ""),
+            agency_prompt=agency.get("prompt_config"),
+            conversation_history=ctx.history_formatted,
+            lead_data=ctx.known_lead_data,
+            agent_config=agent_config,
+            knowledge_context=ctx.rag_context["text"] if ctx.rag_context else None
+        )
+
+        ctx.ai_response = ai_result.get("response", "")
+        ctx.extracted_data = ai_result.get("extracted_data", {}) or {}
+
+    # ------------------------------------------------------------------
+    # Efeitos colaterais (CRM / Google Sheets / email)
+    # ------------------------------------------------------------------
+
+    async def _schedule_side_effects(self, ctx: PipelineContext):
+        """Em background (padrão) ou em linha, conforme PIPELINE_ASYNC_SIDE_EFFECTS."""
+        if not settings.PIPELINE_ASYNC_SIDE_EFFECTS:
+            await self._side_effects(ctx)
+            return
+        task = asyncio.create_task(self._side_effects(ctx))
+        self._side_effect_tasks.add(task)
+        task.add_done_callback(self._side_effect_tasks.discard)
+
+    async def drain(self, timeout: float = 10.0):
+        """Aguarda efeitos colaterais pendentes (chamado no shutdown)."""
+        if self._side_effect_tasks:
+            await asyncio.wait(list(self._side_effect_tasks), timeout=timeout)
+
+    async def _side_effects(self, ctx: PipelineContext):
+        with self._stage(ctx, "side_effects"):
+            await asyncio.gather(
+                self._sync_lead(ctx),
+                self._notify(ctx),
+                return_exceptions=True
+            )
+
+    async def _sync_lead(self, ctx: PipelineContext):
+        extracted_data, known_lead_data = ctx.extracted_data, ctx.known_lead_data
+        sender_phone = ctx.message.sender_phone
+
+        # Verificar se temos dados suficientes para enviar ao CRM
+        if not (known_lead_data.get("nome") or extracted_data.get("nome")):
+            return
+
+        try:
+            # Preparar dados do lead para CRM
+            crm_lead_data = {
+                "phone": sender_phone,
+                "nome": extracted_data.get("nome") or known_lead_data.get("nome"),
+                "email": extracted_data.get("email") or known_lead_data.get("email"),
+                "empresa": extracted_data.get("empresa") or known_lead_data.get("empresa"),
+                "cargo": extracted_data.get("cargo") or known_lead_data.get("cargo"),
+                "interesse": extracted_data.get("desafio") or known_lead_data.get("desafio"),
+                "orcamento": extracted_data.get("orcamento") or known_lead_data.get("orcamento")
+            }
+
+            crm_service = CRMService(ctx.supabase)
+            conversa_id = str(ctx.conversation.get("conversation_id") or "")
+
+            if settings.CRM_OUTBOX_ENABLED:
+                # Registra no outbox; o dispatcher entrega com retentativas
+                queued = await crm_service.enqueue_lead(
+                    tenet_id=ctx.agency_id,
+                    conversa_id=conversa_id,
+                    lead_data=crm_lead_data
+                )
+                if queued:
+                    crm_outbox_dispatcher.wake()
+                    logger.info(f"Lead enfileirado para {queued} CRM(s)")
+            else:
+                # Enviar para CRMs ativos
+                crm_result = await crm_service.send_lead_to_crms(
+                    tenet_id=ctx.agency_id,
+                    conversa_id=conversa_id,
+                    lead_data=crm_lead_data
+                )
+                if crm_result.get("sent", 0) > 0:
+                    logger.info(f"Lead enviado para {crm_result.get('sent')} CRM(s)")
+
+        except Exception as crm_error:
+            logger.error(f"Erro ao enviar para CRMs: {crm_error}")
+
+        # Enviar para Google Sheets
+        try:
+            await GoogleSheetsService().add_lead(ctx.agency_id, {
+                "nome": extracted_data.get("nome", ""),
+                "telefone": sender_phone,
+                "email": extracted_data.get("email", ""),
+                "empresa": extracted_data.get("empresa", ""),
+                "status": "Qualificado" if extracted_data.get("qualificado") else "Novo",
+                "score": str(extracted_data.get("score", "")),
+                "origem": "WhatsApp",
+                "observacoes": extracted_data.get("interesse", "")
+            })
+        except Exception as sheets_error:
+            logger.warning(f"Erro ao enviar para Sheets: {sheets_error}")
+
+    async def _notify(self, ctx: PipelineContext):
+        extracted_data, known_lead_data = ctx.extracted_data, ctx.known_lead_data
+
+        # Verificar se lead foi qualificado para enviar notificação
+        current_status = ctx.conversation.get("lead_status", "em_andamento")
+        if not (current_status == "qualificado" or (extracted_data.get("nome") and known_lead_data.get("nome") is None)):
+            return
+
+        try:
+            await NotificationService(ctx.supabase).send_lead_notification(
+                tenet_id=ctx.agency_id,
+                lead_data={
+                    "phone": ctx.message.sender_phone,
+                    "nome": extracted_data.get("nome") or known_lead_data.get("nome"),
+                    "email": extracted_data.get("email") or known_lead_data.get("email"),
+                    "empresa": extracted_data.get("empresa") or known_lead_data.get("empresa"),
+                    "cargo": extracted_data.get("cargo") or known_lead_data.get("cargo"),
+                    "interesse": extracted_data.get("desafio") or known_lead_data.get("desafio")
+                },
+                notification_type="qualificado"
+            )
+            logger.info("Notificação de lead qualificado enviada")
+        except Exception as notif_error:
+            logger.error(f"Erro ao enviar notificação: {notif_error}")
+
+
+# Singleton
+message_pipeline = MessagePipeline()
+evolution_adapter = EvolutionAdapter()
+meta_adapter = MetaAdapter()
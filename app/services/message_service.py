@@ -3,7 +3,6 @@ from typing import List, Optional, Dict, Any
 from uuid import UUID
 from datetime import datetime
 from supabase import Client
-import logging
 
 from app.database import get_supabase_client
 from app.models.mensagem import (
@@ -12,8 +11,9 @@ from app.models.mensagem import (
     MensagemList,
     MessageRole
 )
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class MessageService:
@@ -2,8 +2,9 @@
 """Serviço para integração com Meta Cloud API (WhatsApp Business)"""
 
 import httpx
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from app.config import settings
+from app.utils.http_client import get_http_client
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -47,6 +48,43 @@ class MetaWhatsAppService:
             logger.error(f"Erro ao enviar mensagem Meta API: {e}")
             return None
     
+    async def send_text(self, to: str, message: str) -> Dict[str, Any]:
+        """Envia texto e retorna success, message_id, retryable, uncertain e error"""
+        url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
+        
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": self._format_phone(to),
+            "type": "text",
+            "text": {"body": message}
+        }
+        
+        try:
+            client = get_http_client(self.BASE_URL)
+            response = await client.post(url, json=payload, headers=self.headers)
+            if response.status_code >= 400:
+                logger.error(f"Erro Meta API HTTP: {response.status_code} - {response.text}")
+                # Só 429 garante que a mensagem foi recusada
+                return {
+                    "success": False,
+                    "retryable": response.status_code == 429,
+                    "uncertain": response.status_code >= 500,
+                    "error": f"HTTP {response.status_code}: {response.text[:500]}"
+                }
+            messages = response.json().get("messages") or [{}]
+            return {"success": True, "message_id": messages[0].get("id")}
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            logger.error(f"Erro ao enviar mensagem Meta API: {e}")
+            return {"success": False, "retryable": True, "error": str(e)}
+        except httpx.TransportError as e:
+            # Timeout de leitura / conexão perdida depois do envio
+            logger.error(f"Erro ao enviar mensagem Meta API: {e}")
+            return {"success": False, "retryable": False, "uncertain": True, "error": f"{e.__class__.__name__}: {e}"}
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem Meta API: {e}")
+            return {"success": False, "retryable": False, "error": str(e)}
+    
     async def send_template_message(self, to: str, template_name: str, 
                                      language: str = "pt_BR", 
                                      components: list = None) -> Optional[Dict[str, Any]]:
@@ -96,30 +134,70 @@ class MetaWhatsAppService:
         """Remove caracteres especiais do telefone"""
         return ''.join(filter(str.isdigit, phone))
     
+    @staticmethod
+    def _message_text(msg: Dict[str, Any]) -> str:
+        """Texto de mensagens de texto, botões e respostas interativas"""
+        msg_type = msg.get("type")
+        if msg_type == "text":
+            return msg.get("text", {}).get("body", "")
+        if msg_type == "button":
+            return msg.get("button", {}).get("text", "")
+        if msg_type == "interactive":
+            interactive = msg.get("interactive", {})
+            reply = interactive.get("button_reply") or interactive.get("list_reply") or {}
+            return reply.get("title", "")
+        return ""
+    
+    @staticmethod
+    def parse_webhook_events(payload: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Extrai todas as mensagens e status de entrega do payload.
+        A Meta agrupa vários entries/changes/messages/statuses em um único POST.
+        """
+        messages: List[Dict[str, Any]] = []
+        statuses: List[Dict[str, Any]] = []
+        
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+                phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
+                names = {
+                    contact.get("wa_id"): contact.get("profile", {}).get("name", "")
+                    for contact in value.get("contacts") or []
+                }
+                default_name = next(iter(names.values()), "")
+                
+                for msg in value.get("messages") or []:
+                    try:
+                        messages.append({
+                            "message_id": msg.get("id"),
+                            "from": msg.get("from"),
+                            "timestamp": msg.get("timestamp"),
+                            "type": msg.get("type"),
+                            "text": MetaWhatsAppService._message_text(msg),
+                            "contact_name": names.get(msg.get("from"), default_name),
+                            "phone_number_id": phone_number_id
+                        })
+                    except Exception as e:
+                        logger.error(f"Erro ao parsear mensagem Meta: {e}")
+                
+                for status in value.get("statuses") or []:
+                    statuses.append({
+                        "message_id": status.get("id"),
+                        "status": status.get("status"),
+                        "recipient": status.get("recipient_id"),
+                        "timestamp": status.get("timestamp"),
+                        "phone_number_id": phone_number_id
+                    })
+        
+        return {"messages": messages, "statuses": statuses}
+    
     @staticmethod
     def parse_webhook_message(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Extrai dados da mensagem do payload do webhook Meta"""
+        """Extrai a primeira mensagem do payload do webhook Meta"""
         try:
-            entry = payload.get("entry", [{}])[0]
-            changes = entry.get("changes", [{}])[0]
-            value = changes.get("value", {})
-            
-            messages = value.get("messages", [])
-            if not messages:
-                return None
-            
-            msg = messages[0]
-            contact = value.get("contacts", [{}])[0]
-            
-            return {
-                "message_id": msg.get("id"),
-                "from": msg.get("from"),
-                "timestamp": msg.get("timestamp"),
-                "type": msg.get("type"),
-                "text": msg.get("text", {}).get("body", ""),
-                "contact_name": contact.get("profile", {}).get("name", ""),
-                "phone_number_id": value.get("metadata", {}).get("phone_number_id")
-            }
+            messages = MetaWhatsAppService.parse_webhook_events(payload)["messages"]
+            return messages[0] if messages else None
         except Exception as e:
             logger.error(f"Erro ao parsear webhook Meta: {e}")
             return None
@@ -0,0 +1,151 @@
+"""
+Resumo periódico de notificações.
+Agências com `notificar_resumo_diario` recebem um único email por período
+(hora ou dia) com todos os leads do intervalo, em vez de um email por evento.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.notification_service import NotificationService, notification_dispatcher
+from app.utils.background import BackgroundWorker
+from app.utils.email_templates import render_email
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+PERIODS = {
+    "horario": timedelta(hours=1),
+    "diario": timedelta(days=1),
+}
+
+TYPE_LABELS = {
+    "qualificado": "Qualificado",
+    "agendado": "Agendado",
+}
+
+
+def render_digest(events: List[Dict[str, Any]], frequencia: str,
+                  branding: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str]:
+    """Assunto, HTML e texto do resumo para uma lista de eventos."""
+    counts: Dict[str, int] = defaultdict(int)
+    rows = []
+    for event in events:
+        counts[event["tipo"]] += 1
+        lead = event.get("lead_data") or {}
+        rows.append({
+            "tipo": TYPE_LABELS.get(event["tipo"], event["tipo"]),
+            "nome": lead.get("nome") or "Não informado",
+            "phone": lead.get("phone") or event.get("lead_phone") or "",
+            "empresa": lead.get("empresa") or "-",
+            "interesse": lead.get("interesse") or "-",
+        })
+
+    periodo = "da última hora" if frequencia == "horario" else "do dia"
+    resumo = ", ".join(
+        f"{total} {TYPE_LABELS.get(tipo, tipo).lower()}{'s' if total > 1 else ''}"
+        for tipo, total in sorted(counts.items())
+    )
+    html, text = render_email("digest", {"periodo": periodo, "resumo": resumo, "rows": rows}, branding)
+    return f"📊 Resumo {periodo}: {resumo}", html, text
+
+
+def digest_due(config: Dict[str, Any], now: datetime) -> bool:
+    """True se o período do resumo da agência já passou desde o último envio."""
+    last = config.get("resumo_enviado_em")
+    if not last:
+        return True
+    period = PERIODS.get(config.get("frequencia_resumo") or "diario", PERIODS["diario"])
+    last_sent = datetime.fromisoformat(str(last).replace("Z", "+00:00"))
+    return now - last_sent >= period
+
+
+class NotificationDigestScheduler(BackgroundWorker):
+    """Agrupa eventos de lead por agência e envia os resumos vencidos."""
+
+    name = "notification-digest"
+
+    def __init__(self):
+        super().__init__(interval=settings.NOTIFICATION_DIGEST_CHECK_INTERVAL)
+        self._service: Optional[NotificationService] = None
+
+    @property
+    def service(self) -> NotificationService:
+        if self._service is None:
+            self._service = NotificationService(get_supabase_client())
+        return self._service
+
+    async def run_once(self):
+        now = datetime.now(timezone.utc)
+        supabase = self.service.supabase
+
+        configs = supabase.table("notificacoes_config").select("*")\
+            .eq("email_ativo", True).eq("notificar_resumo_diario", True).execute().data or []
+        due = {c["tenet_id"]: c for c in configs if digest_due(c, now)}
+        if not due:
+            return
+
+        # Um select por agência: com um limite global, as agências que ficassem
+        # fora da página seriam tratadas como ociosas e perderiam o resumo
+        idle = []
+        for tenet_id, config in due.items():
+            events = supabase.table("notificacoes_eventos").select("*")\
+                .eq("tenet_id", tenet_id).is_("resumido_em", "null")\
+                .lte("created_at", now.isoformat()).order("created_at")\
+                .limit(settings.NOTIFICATION_DIGEST_MAX_EVENTS).execute().data or []
+            if events:
+                await self.send_digest(config, events, now)
+            else:
+                idle.append(tenet_id)
+
+        # Agências sem eventos no período recomeçam a contagem
+        if idle:
+            supabase.table("notificacoes_config").update({"resumo_enviado_em": now.isoformat()})\
+                .in_("tenet_id", idle).execute()
+
+    async def send_digest(self, config: Dict[str, Any], events: List[Dict[str, Any]], now: datetime):
+        """Envia o resumo de uma agência e marca os eventos como resumidos."""
+        tenet_id = config["tenet_id"]
+        destinatarios = config.get("emails_destinatarios") or []
+        supabase = self.service.supabase
+
+        if destinatarios:
+            subject, body, text = render_digest(
+                events, config.get("frequencia_resumo") or "diario", config.get("branding")
+            )
+            emails = [{
+                "tenet_id": tenet_id,
+                "tipo": "resumo",
+                "destinatario": email,
+                "assunto": subject,
+                "corpo_html": body,
+                "corpo_texto": text
+            } for email in destinatarios]
+
+            if notification_dispatcher.running:
+                await self.service.enqueue_emails(emails)
+            else:
+                results = [
+                    await self.service._send_email(config, email["destinatario"], subject, body, text)
+                    for email in emails
+                ]
+                await self.service._log_notifications([
+                    {**{k: v for k, v in email.items() if not k.startswith("corpo_")},
+                     "status": "success" if ok else "error"}
+                    for email, ok in zip(emails, results)
+                ])
+
+        supabase.table("notificacoes_eventos").update({"resumido_em": now.isoformat()})\
+            .in_("id", [event["id"] for event in events]).execute()
+        supabase.table("notificacoes_config").update({"resumo_enviado_em": now.isoformat()})\
+            .eq("tenet_id", tenet_id).execute()
+
+        metrics.increment("notification_digests_sent")
+        metrics.observe("notification_digest_events", len(events))
+        logger.info(f"Resumo com {len(events)} eventos enviado para agência {tenet_id}")
+
+
+# Singleton
+notification_digest = NotificationDigestScheduler()
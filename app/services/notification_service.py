@@ -2,15 +2,23 @@
 """
 Serviço de notificações por email.
 """
-import logging
+import asyncio
 import smtplib
+from collections import defaultdict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timezone, timedelta
+from app.config import settings
+from app.database import get_supabase_client
+from app.utils.background import BackgroundWorker, exponential_backoff
+from app.utils.email_templates import render_email
+from app.utils.metrics import metrics
 from app.utils.security import EncryptionService
+from app.utils.smtp_pool import smtp_pool
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class NotificationService:
@@ -45,6 +53,8 @@ class NotificationService:
                 "notificar_lead_qualificado": config.get("notificar_lead_qualificado", True),
                 "notificar_lead_agendado": config.get("notificar_lead_agendado", True),
                 "notificar_resumo_diario": config.get("notificar_resumo_diario", False),
+                "frequencia_resumo": config.get("frequencia_resumo", "diario"),
+                "branding": {k: v for k, v in (config.get("branding") or {}).items() if v},
                 "smtp_host": config.get("smtp_host"),
                 "smtp_port": config.get("smtp_port", 587),
                 "smtp_user": config.get("smtp_user"),
@@ -71,9 +81,15 @@ class NotificationService:
         self,
         tenet_id: str,
         lead_data: Dict[str, Any],
-        notification_type: str = "qualificado"
+        notification_type: str = "qualificado",
+        immediate: bool = False
     ) -> bool:
-        """Envia notificação de lead qualificado/agendado."""
+        """
+        Envia notificação de lead qualificado/agendado.
+        Com o dispatcher ativo os emails vão para o outbox e o retorno é imediato;
+        com o resumo ativo o evento só é registrado para o próximo resumo;
+        `immediate=True` envia na hora (ex.: email de teste).
+        """
         
         # Buscar configuração
         config = await self.get_notification_config(tenet_id)
@@ -88,6 +104,9 @@ class NotificationService:
         if notification_type == "agendado" and not config.get("notificar_lead_agendado"):
             return False
         
+        if not immediate and config.get("notificar_resumo_diario"):
+            return await self._record_digest_event(tenet_id, lead_data, notification_type)
+        
         # Obter destinatários
         destinatarios = config.get("emails_destinatarios", [])
         if not destinatarios:
@@ -96,24 +115,63 @@ class NotificationService:
         
         # Montar email
         subject = self._build_subject(lead_data, notification_type)
-        body = self._build_body(lead_data, notification_type)
+        body, text = self._build_body(lead_data, notification_type, config.get("branding"))
         
-        # Enviar para cada destinatário
-        success = True
-        for email in destinatarios:
-            result = await self._send_email(config, email, subject, body)
-            await self._log_notification(
-                tenet_id=tenet_id,
-                tipo=notification_type,
-                destinatario=email,
-                assunto=subject,
-                status="success" if result else "error",
-                lead_phone=lead_data.get("phone")
-            )
-            if not result:
-                success = False
+        if not immediate and notification_dispatcher.running:
+            await self.enqueue_emails([{
+                "tenet_id": tenet_id,
+                "tipo": notification_type,
+                "destinatario": email,
+                "assunto": subject,
+                "corpo_html": body,
+                "corpo_texto": text,
+                "lead_phone": lead_data.get("phone")
+            } for email in destinatarios])
+            return True
         
-        return success
+        # Enviar para os destinatários em paralelo (sessão SMTP reaproveitada)
+        results = await asyncio.gather(*[
+            self._send_email(config, email, subject, body, text) for email in destinatarios
+        ])
+        
+        await self._log_notifications([{
+            "tenet_id": tenet_id,
+            "tipo": notification_type,
+            "destinatario": email,
+            "assunto": subject,
+            "status": "success" if result else "error",
+            "lead_phone": lead_data.get("phone")
+        } for email, result in zip(destinatarios, results)])
+        
+        return all(results)
+    
+    async def enqueue_emails(self, emails: List[Dict[str, Any]]):
+        """Registra emails no outbox e acorda o dispatcher."""
+        if not emails:
+            return
+        self.supabase.table("notificacoes_outbox").insert(emails).execute()
+        metrics.increment("notification_outbox_enqueued", len(emails))
+        notification_dispatcher.wake()
+    
+    async def _record_digest_event(
+        self,
+        tenet_id: str,
+        lead_data: Dict[str, Any],
+        notification_type: str
+    ) -> bool:
+        """Guarda o evento para o resumo periódico (NotificationDigestScheduler)."""
+        try:
+            self.supabase.table("notificacoes_eventos").insert({
+                "tenet_id": tenet_id,
+                "tipo": notification_type,
+                "lead_phone": lead_data.get("phone"),
+                "lead_data": {k: lead_data.get(k) for k in ("nome", "phone", "empresa", "cargo", "interesse")}
+            }).execute()
+            metrics.increment("notification_digest_events")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao registrar evento para resumo: {e}")
+            return False
     
     def _build_subject(self, lead_data: Dict[str, Any], notification_type: str) -> str:
         """Constrói assunto do email."""
@@ -124,104 +182,87 @@ class NotificationService:
             return f"📅 Reunião Agendada: {nome}"
         return f"📣 Atualização de Lead: {nome}"
     
-    def _build_body(self, lead_data: Dict[str, Any], notification_type: str) -> str:
-        """Constrói corpo do email em HTML."""
-        nome = lead_data.get("nome", "Não informado")
-        phone = lead_data.get("phone", "Não informado")
-        empresa = lead_data.get("empresa", "Não informado")
-        cargo = lead_data.get("cargo", "Não informado")
-        interesse = lead_data.get("interesse", "Não informado")
+    def _build_body(
+        self,
+        lead_data: Dict[str, Any],
+        notification_type: str,
+        branding: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """Renderiza o corpo do email. Retorna (html, texto)."""
+        fields = [
+            ("Nome", lead_data.get("nome") or "Não informado"),
+            ("Telefone (WhatsApp)", lead_data.get("phone") or "Não informado"),
+            ("Empresa", lead_data.get("empresa") or "Não informado"),
+            ("Cargo", lead_data.get("cargo") or "Não informado"),
+            ("Interesse / Necessidade", lead_data.get("interesse") or "Não informado"),
+        ]
+        return render_email("lead_notification", {
+            "emoji": "🎯" if notification_type == "qualificado" else "📅",
+            "tipo_label": "Qualificado" if notification_type == "qualificado" else "Agendado",
+            "fields": fields
+        }, branding)
+    
+    def _build_message(
+        self,
+        config: Dict[str, Any],
+        to_email: str,
+        subject: str,
+        body: str,
+        text: Optional[str] = None
+    ) -> MIMEMultipart:
+        """Monta a mensagem MIME (texto + HTML)."""
+        from_email = config.get("smtp_from_email") or config.get("smtp_user")
+        from_name = config.get("smtp_from_name") or "SDR Agent"
         
-        tipo_label = "Qualificado" if notification_type == "qualificado" else "Agendado"
-        emoji = "🎯" if notification_type == "qualificado" else "📅"
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = f"{from_name} <{from_email}>"
+        msg["To"] = to_email
         
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #3B82F6, #8B5CF6); color: white; padding: 20px; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 20px; border: 1px solid #e5e7eb; }}
-                .field {{ margin-bottom: 15px; }}
-                .label {{ font-weight: bold; color: #6b7280; font-size: 12px; text-transform: uppercase; }}
-                .value {{ font-size: 16px; color: #111827; margin-top: 4px; }}
-                .footer {{ background: #f3f4f6; padding: 15px; text-align: center; border-radius: 0 0 10px 10px; font-size: 12px; color: #6b7280; }}
-                .badge {{ display: inline-block; background: #10B981; color: white; padding: 4px 12px; border-radius: 20px; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1 style="margin: 0;">{emoji} Lead {tipo_label}</h1>
-                    <p style="margin: 10px 0 0 0; opacity: 0.9;">Um novo lead está pronto para contato!</p>
-                </div>
-                <div class="content">
-                    <div class="field">
-                        <div class="label">Nome</div>
-                        <div class="value">{nome}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">Telefone (WhatsApp)</div>
-                        <div class="value">{phone}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">Empresa</div>
-                        <div class="value">{empresa}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">Cargo</div>
-                        <div class="value">{cargo}</div>
-                    </div>
-                    <div class="field">
-                        <div class="label">Interesse / Necessidade</div>
-                        <div class="value">{interesse}</div>
-                    </div>
-                </div>
-                <div class="footer">
-                    <p>Enviado automaticamente pelo SDR Agent</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # A última parte é a preferida pelos clientes de email
+        if text:
+            msg.attach(MIMEText(text, "plain", "utf-8"))
+        msg.attach(MIMEText(body, "html", "utf-8"))
+        return msg
+    
+    def _deliver(
+        self,
+        config: Dict[str, Any],
+        to_email: str,
+        subject: str,
+        body: str,
+        text: Optional[str] = None
+    ):
+        """Envio SMTP bloqueante usando sessão do pool. Levanta exceção em caso de erro."""
+        smtp_host = config.get("smtp_host")
+        smtp_port = config.get("smtp_port") or 587
+        smtp_user = config.get("smtp_user")
+        smtp_password = self.encryption.decrypt(config.get("smtp_password_encrypted", ""))
+        
+        if not all([smtp_host, smtp_user, smtp_password]):
+            raise ValueError("Configuração SMTP incompleta")
+        
+        msg = self._build_message(config, to_email, subject, body, text)
+        
+        try:
+            with smtp_pool.connection(smtp_host, smtp_port, smtp_user, smtp_password) as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Sessão reaproveitada fechada pelo servidor: tenta uma vez com nova conexão
+            with smtp_pool.connection(smtp_host, smtp_port, smtp_user, smtp_password) as server:
+                server.send_message(msg)
     
     async def _send_email(
         self,
         config: Dict[str, Any],
         to_email: str,
         subject: str,
-        body: str
+        body: str,
+        text: Optional[str] = None
     ) -> bool:
-        """Envia email via SMTP."""
+        """Envia email via SMTP sem bloquear o event loop."""
         try:
-            smtp_host = config.get("smtp_host")
-            smtp_port = config.get("smtp_port", 587)
-            smtp_user = config.get("smtp_user")
-            smtp_password = self.encryption.decrypt(config.get("smtp_password_encrypted", ""))
-            from_email = config.get("smtp_from_email") or smtp_user
-            from_name = config.get("smtp_from_name", "SDR Agent")
-            
-            if not all([smtp_host, smtp_user, smtp_password]):
-                logger.error("Configuração SMTP incompleta")
-                return False
-            
-            # Criar mensagem
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = f"{from_name} <{from_email}>"
-            msg["To"] = to_email
-            
-            # Adicionar corpo HTML
-            msg.attach(MIMEText(body, "html"))
-            
-            # Conectar e enviar
-            with smtplib.SMTP(smtp_host, smtp_port) as server:
-                server.starttls()
-                server.login(smtp_user, smtp_password)
-                server.send_message(msg)
-            
+            await asyncio.to_thread(self._deliver, config, to_email, subject, body, text)
             logger.info(f"Email enviado para {to_email}")
             return True
             
@@ -254,6 +295,18 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Erro ao registrar log de notificação: {e}")
     
+    async def _log_notifications(self, rows: List[Dict[str, Any]]):
+        """Registra vários logs de notificação em um único insert."""
+        if not rows:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            self.supabase.table("notificacoes_log").insert([
+                {"erro": None, "created_at": now, **row} for row in rows
+            ]).execute()
+        except Exception as e:
+            logger.error(f"Erro ao registrar logs de notificação: {e}")
+    
     async def test_smtp_connection(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Testa conexão SMTP."""
         try:
@@ -269,3 +322,95 @@ class NotificationService:
             return {"success": True, "message": "Conexão SMTP estabelecida com sucesso"}
         except Exception as e:
             return {"success": False, "message": f"Erro na conexão: {str(e)}"}
+
+
+class NotificationDispatcher(BackgroundWorker):
+    """Envia em background os emails do outbox, com retentativas."""
+    
+    name = "notification-outbox"
+    
+    def __init__(self):
+        super().__init__(interval=settings.NOTIFICATION_OUTBOX_POLL_INTERVAL)
+        self._service: Optional[NotificationService] = None
+    
+    @property
+    def service(self) -> NotificationService:
+        if self._service is None:
+            self._service = NotificationService(get_supabase_client())
+        return self._service
+    
+    async def run_once(self):
+        response = self.service.supabase.rpc("claim_notificacoes_outbox", {
+            "p_limit": settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+        }).execute()
+        if response.data:
+            await self.process(response.data)
+    
+    async def process(self, items: List[Dict[str, Any]]):
+        """Envia os itens reservados; o limite por host fica no pool SMTP."""
+        by_tenet: Dict[str, List[Dict]] = defaultdict(list)
+        for item in items:
+            by_tenet[item["tenet_id"]].append(item)
+        
+        configs = {tenet_id: await self.service.get_notification_config(tenet_id) for tenet_id in by_tenet}
+        
+        async def send(item: Dict[str, Any]) -> Optional[str]:
+            config = configs.get(item["tenet_id"])
+            if not config or not config.get("email_ativo"):
+                return "Notificações desativadas"
+            try:
+                await asyncio.to_thread(self.service._deliver, config, item["destinatario"],
+                                        item["assunto"], item["corpo_html"], item.get("corpo_texto"))
+                return None
+            except Exception as e:
+                return str(e) or e.__class__.__name__
+        
+        errors = await asyncio.gather(*[send(item) for item in items])
+        
+        logs = []
+        for item, error in zip(items, errors):
+            if error is None:
+                self._mark_sent(item)
+            else:
+                self._schedule_retry(item, error)
+            logs.append({
+                "tenet_id": item["tenet_id"],
+                "tipo": item["tipo"],
+                "destinatario": item["destinatario"],
+                "assunto": item["assunto"],
+                "status": "success" if error is None else "error",
+                "lead_phone": item.get("lead_phone"),
+                "erro": error
+            })
+        
+        await self.service._log_notifications(logs)
+        metrics.increment("notification_outbox_sent", len([e for e in errors if e is None]))
+    
+    def _mark_sent(self, item: Dict[str, Any]):
+        self.service.supabase.table("notificacoes_outbox").update({
+            "status": "sent",
+            "attempts": (item.get("attempts") or 0) + 1,
+            "last_error": None,
+            "sent_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", item["id"]).execute()
+    
+    def _schedule_retry(self, item: Dict[str, Any], error: str):
+        attempts = (item.get("attempts") or 0) + 1
+        data = {"attempts": attempts, "last_error": error[:1000]}
+        
+        if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            data["status"] = "failed"
+            metrics.increment("notification_outbox_dead")
+        else:
+            delay = exponential_backoff(attempts, settings.NOTIFICATION_BACKOFF_BASE, settings.NOTIFICATION_BACKOFF_MAX)
+            data["status"] = "pending"
+            data["next_attempt_at"] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+        
+        self.service.supabase.table("notificacoes_outbox").update(data).eq("id", item["id"]).execute()
+    
+    async def on_stop(self):
+        smtp_pool.close_all()
+
+
+# Singleton
+notification_dispatcher = NotificationDispatcher()
@@ -1,14 +1,92 @@
 
 """Serviço RAG (Retrieval-Augmented Generation) para Tenet AI"""
 
+import re
 from typing import List, Optional, Dict, Any
 from uuid import UUID
+from app.config import settings
 from app.database import get_supabase_client
 from app.services.embedding_service import embedding_service
 from app.utils.logger import get_logger
+from app.utils.metrics import metrics
 
 logger = get_logger(__name__)
 
+# Trechos com sobreposição acima deste limite são considerados duplicados
+DUPLICATE_OVERLAP_THRESHOLD = 0.8
+
+# Sobra mínima de orçamento para valer a pena truncar um trecho
+MIN_TRIM_TOKENS = 40
+
+CONTEXT_HEADER = "[Base de Conhecimento]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa de tokens (~4 caracteres por token, mesma regra do AIService)"""
+    return len(text) // 4 if text else 0
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    """Conjunto de n-gramas de palavras normalizadas, usado na deduplicação"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Divide o conteúdo em trechos por parágrafo, respeitando o limite de tokens"""
+    max_chars = max_tokens * 4
+    chunks: List[str] = []
+    current = ""
+
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        # Parágrafos muito longos são quebrados por frases
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces, piece = [], ""
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                while len(sentence) > max_chars:
+                    if piece:
+                        pieces.append(piece)
+                        piece = ""
+                    pieces.append(sentence[:max_chars])
+                    sentence = sentence[max_chars:]
+                if piece and len(piece) + len(sentence) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = sentence
+                else:
+                    piece = f"{piece} {sentence}".strip()
+            if piece:
+                pieces.append(piece)
+
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Corta o texto no limite de tokens, preferindo fronteira de palavra"""
+    max_chars = max_tokens * 4 - 1
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip() + "…"
+
+
 class RAGService:
     """Serviço de busca e recuperação de conhecimento"""
     
@@ -19,8 +97,12 @@ class RAGService:
                            categoria: str = "geral", metadata: dict = None) -> Optional[Dict]:
         """Adiciona documento à base de conhecimento com embedding"""
         try:
+            # Usa o modelo ativo do tenant para manter a busca consistente
+            embedding_model = self.get_tenant_embedding_model(tenet_id)
+            
             # Gera embedding do conteúdo
-            embedding = await embedding_service.generate_embedding(f"{titulo}\n\n{conteudo}")
+            embedding = await embedding_service.generate_embedding(f"{titulo}\n\n{conteudo}",
+                                                                   model=embedding_model)
             
             if not embedding:
                 logger.error("Falha ao gerar embedding")
@@ -32,6 +114,7 @@ class RAGService:
                 "conteudo": conteudo,
                 "categoria": categoria,
                 "embedding": embedding,
+                "embedding_model": embedding_model,
                 "metadata": metadata or {}
             }
             
@@ -46,12 +129,27 @@ class RAGService:
             logger.error(f"Erro ao adicionar documento: {e}")
             return None
     
+    def get_tenant_embedding_model(self, tenet_id: UUID) -> str:
+        """Retorna o modelo de embedding ativo do tenant (ou o padrão)"""
+        try:
+            result = self.supabase.table("tenets").select("embedding_model")\
+                .eq("id", str(tenet_id)).execute()
+            if result.data and result.data[0].get("embedding_model"):
+                return result.data[0]["embedding_model"]
+        except Exception as e:
+            logger.warning(f"Erro ao buscar modelo de embedding do tenant: {e}")
+        return settings.EMBEDDING_MODEL
+    
     async def search(self, tenet_id: UUID, query: str, 
-                     limit: int = 5, categoria: str = None) -> List[Dict]:
+                     limit: int = 5, categoria: str = None,
+                     embedding_model: Optional[str] = None) -> List[Dict]:
         """Busca documentos relevantes por similaridade semântica"""
         try:
-            # Gera embedding da query
-            query_embedding = await embedding_service.generate_query_embedding(query)
+            embedding_model = embedding_model or self.get_tenant_embedding_model(tenet_id)
+            
+            # Gera embedding da query com o mesmo modelo dos documentos
+            query_embedding = await embedding_service.generate_query_embedding(query,
+                                                                               model=embedding_model)
             
             if not query_embedding:
                 return []
@@ -63,7 +161,8 @@ class RAGService:
                     "p_tenet_id": str(tenet_id),
                     "p_query_embedding": query_embedding,
                     "p_limit": limit,
-                    "p_categoria": categoria
+                    "p_categoria": categoria,
+                    "p_embedding_model": embedding_model
                 }
             ).execute()
             
@@ -73,19 +172,111 @@ class RAGService:
             logger.error(f"Erro na busca RAG: {e}")
             return []
     
+    def assemble_context(self, docs: List[Dict], query: str,
+                         token_budget: int) -> Dict[str, Any]:
+        """
+        Monta o contexto a partir dos documentos encontrados respeitando o orçamento
+        de tokens: divide em trechos, prioriza os mais relevantes, descarta trechos
+        sobrepostos e trunca o último trecho se necessário.
+        """
+        empty = {"text": "", "tokens": 0, "documents": 0, "chunks_used": 0,
+                 "duplicates_skipped": 0, "truncated": False}
+        if not docs or token_budget <= 0:
+            return empty
+
+        query_terms = set(re.findall(r"\w+", (query or "").lower()))
+
+        # Candidatos: (score, ordem do doc, ordem do trecho, texto)
+        candidates = []
+        for doc_index, doc in enumerate(docs):
+            similarity = doc.get("similarity") or 0
+            for chunk_index, chunk in enumerate(split_into_chunks(doc.get("conteudo", ""),
+                                                                  settings.RAG_CHUNK_TOKENS)):
+                overlap = 0.0
+                if query_terms:
+                    chunk_terms = set(re.findall(r"\w+", chunk.lower()))
+                    overlap = len(query_terms & chunk_terms) / len(query_terms)
+                candidates.append((similarity + 0.1 * overlap, doc_index, chunk_index, chunk))
+
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+        remaining = token_budget - estimate_tokens(CONTEXT_HEADER)
+        selected: Dict[int, List[tuple]] = {}
+        seen_shingles: set = set()
+        duplicates = 0
+        truncated = False
+
+        for _, doc_index, chunk_index, chunk in candidates:
+            shingles = _shingles(chunk)
+            if shingles and len(shingles & seen_shingles) / len(shingles) >= DUPLICATE_OVERLAP_THRESHOLD:
+                duplicates += 1
+                continue
+
+            # Cabeçalho do documento só é pago no primeiro trecho dele
+            header_cost = 0 if doc_index in selected else estimate_tokens(f"\n### {docs[doc_index].get('titulo', '')}\n")
+            cost = header_cost + estimate_tokens(chunk) + 1
+
+            if cost > remaining:
+                available = remaining - header_cost - 1
+                if available < MIN_TRIM_TOKENS:
+                    continue
+                chunk = _trim_to_tokens(chunk, available)
+                cost = header_cost + estimate_tokens(chunk) + 1
+                truncated = True
+
+            selected.setdefault(doc_index, []).append((chunk_index, chunk))
+            seen_shingles |= shingles
+            remaining -= cost
+
+            if remaining < MIN_TRIM_TOKENS:
+                break
+
+        if not selected:
+            return {**empty, "duplicates_skipped": duplicates}
+
+        # Mantém a ordem original de documentos e trechos para leitura natural
+        context_parts = [CONTEXT_HEADER]
+        for doc_index in sorted(selected):
+            chunks = [chunk for _, chunk in sorted(selected[doc_index])]
+            context_parts.append(f"\n### {docs[doc_index].get('titulo', '')}\n" + "\n".join(chunks))
+
+        text = "\n".join(context_parts)
+        return {
+            "text": text,
+            "tokens": estimate_tokens(text),
+            "documents": len(selected),
+            "chunks_used": sum(len(c) for c in selected.values()),
+            "duplicates_skipped": duplicates,
+            "truncated": truncated
+        }
+
+    async def build_context(self, tenet_id: UUID, query: str, max_docs: int = 3,
+                            token_budget: Optional[int] = None,
+                            embedding_model: Optional[str] = None) -> Dict[str, Any]:
+        """Busca documentos e monta o contexto RAG dentro do orçamento de tokens do tenant"""
+        budget = token_budget or settings.RAG_CONTEXT_TOKEN_BUDGET
+        docs = await self.search(tenet_id, query, limit=max_docs, embedding_model=embedding_model)
+        context = self.assemble_context(docs, query, budget)
+
+        # Registra quanto o RAG contribuiu para o prompt nesta chamada
+        metrics.observe("rag_context_tokens", context["tokens"], tenet_id=str(tenet_id))
+        metrics.increment("rag_context_duplicates_skipped", context["duplicates_skipped"],
+                          tenet_id=str(tenet_id))
+        if context["tokens"]:
+            logger.info(
+                f"Contexto RAG: {context['tokens']}/{budget} tokens, "
+                f"{context['chunks_used']} trechos de {context['documents']} documentos"
+            )
+
+        return context
+
     async def get_context_for_ai(self, tenet_id: UUID, query: str, 
-                                  max_docs: int = 3) -> str:
+                                  max_docs: int = 3,
+                                  token_budget: Optional[int] = None) -> str:
         """Retorna contexto formatado para injetar no prompt da IA"""
-        docs = await self.search(tenet_id, query, limit=max_docs)
-        
-        if not docs:
-            return ""
-        
-        context_parts = ["[Base de Conhecimento]"]
-        for doc in docs:
-            context_parts.append(f"\n### {doc['titulo']}\n{doc['conteudo']}")
-        
-        return "\n".join(context_parts)
+        context = await self.build_context(tenet_id, query, max_docs=max_docs,
+                                           token_budget=token_budget)
+        return context["text"]
     
     async def list_documents(self, tenet_id: UUID, categoria: str = None) -> List[Dict]:
         """Lista documentos da base de conhecimento"""
@@ -33,6 +33,17 @@ class TenetService:
             print(f"Error fetching tenet by instance: {e}")
             return None
 
+    async def get_tenet_by_meta_phone_number_id(self, phone_number_id: str) -> Optional[Dict]:
+        """Retrieve tenet by Meta Cloud API phone_number_id."""
+        try:
+            result = self.client.table('tenets').select('*').eq('meta_phone_number_id', phone_number_id).execute()
+            if result.data and len(result.data) > 0:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error fetching tenet by phone_number_id: {e}")
+            return None
+
     async def decrypt_tenet_keys(self, tenet_id: str) -> Optional[Dict]:
         """Decrypt sensitive tenet keys."""
         tenet = await self.get_tenet_by_id(tenet_id)
@@ -2,12 +2,12 @@
 """
 Serviço de tracking de uso de tokens.
 """
-import logging
 from datetime import datetime, date, timedelta, timezone
 from typing import Dict
 from supabase import Client
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class TokenTrackingService:
@@ -0,0 +1,278 @@
+"""
+Fila de envio de mensagens WhatsApp.
+As respostas são enfileiradas por remetente (instância Evolution ou
+phone_number_id Meta) e enviadas em background com:
+- Cadência máxima por remetente (token bucket, app.utils.throttle)
+- Simulação de digitação proporcional ao tamanho da mensagem
+- Retentativas com backoff quando a mensagem comprovadamente não foi
+  enviada (falha de conexão ou HTTP 429)
+- Acompanhamento do status de entrega (sent/delivered/read)
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.meta_whatsapp_service import MetaWhatsAppService
+from app.services.whatsapp_service import WhatsAppService
+from app.utils.background import BackgroundWorker, exponential_backoff
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.request_context import bind_context
+from app.utils.security import EncryptionService
+from app.utils.throttle import Throttle
+
+logger = get_logger(__name__)
+
+# Status dos provedores -> status no outbox
+DELIVERY_STATUS = {
+    "SERVER_ACK": "sent",
+    "DELIVERY_ACK": "delivered",
+    "READ": "read",
+    "PLAYED": "read",
+    "ERROR": "failed",
+    "sent": "sent",
+    "delivered": "delivered",
+    "read": "read",
+    "failed": "failed",
+}
+
+# Status que podem evoluir para cada status de entrega (webhooks chegam fora de ordem)
+PREVIOUS_STATUS = {
+    "sent": ["processing", "sent"],
+    "delivered": ["processing", "sent"],
+    "read": ["processing", "sent", "delivered"],
+    "failed": ["processing", "sent"],
+}
+
+whatsapp_throttle = Throttle()
+
+
+def typing_delay(message: str) -> float:
+    """Tempo de "digitando..." para a mensagem (segundos), limitado."""
+    if settings.WHATSAPP_TYPING_CHARS_PER_SECOND <= 0:
+        return 0.0
+    return min(len(message) / settings.WHATSAPP_TYPING_CHARS_PER_SECOND, settings.WHATSAPP_TYPING_MAX_DELAY)
+
+
+def claim_lease_seconds() -> int:
+    """
+    Reserva suficiente para um remetente enviar todas as suas mensagens do
+    ciclo: espera da cadência, digitação e timeout do envio, por mensagem.
+    """
+    rate = settings.WHATSAPP_MESSAGES_PER_SECOND
+    shaping = min(1 / rate, settings.WHATSAPP_SHAPING_MAX_WAIT) if rate > 0 else settings.WHATSAPP_SHAPING_MAX_WAIT
+    per_message = shaping + settings.WHATSAPP_TYPING_MAX_DELAY + settings.EVOLUTION_TIMEOUT
+    return int(settings.WHATSAPP_OUTBOX_MAX_PER_SENDER * per_message) + 60
+
+
+class WhatsAppOutbox(BackgroundWorker):
+    """Worker que envia as mensagens do whatsapp_outbox."""
+
+    name = "whatsapp-outbox"
+
+    def __init__(self, supabase_client=None):
+        super().__init__(interval=settings.WHATSAPP_OUTBOX_POLL_INTERVAL)
+        self._supabase = supabase_client
+        self.encryption = EncryptionService()
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    # ------------------------------------------------------------------
+    # Enfileiramento
+    # ------------------------------------------------------------------
+
+    async def enqueue(
+        self,
+        tenet_id: Optional[str],
+        channel: str,
+        sender_id: str,
+        recipient: str,
+        message: str
+    ) -> Dict[str, Any]:
+        """
+        Enfileira uma mensagem. Com o worker parado (ex.: fila desativada)
+        envia na hora, sem cadência, como antes da fila.
+        """
+        item = {
+            "tenet_id": tenet_id,
+            "channel": channel,
+            "sender_id": sender_id,
+            "recipient": recipient,
+            "message": message
+        }
+
+        if not self.running:
+            return await self.send(item, simulate_typing=False)
+
+        try:
+            self.supabase.table("whatsapp_outbox").insert(item).execute()
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar mensagem WhatsApp, enviando direto: {e}")
+            return await self.send(item, simulate_typing=False)
+
+        metrics.increment("whatsapp_outbox_enqueued", channel=channel)
+        self.wake()
+        return {"success": True, "queued": True}
+
+    # ------------------------------------------------------------------
+    # Envio
+    # ------------------------------------------------------------------
+
+    async def run_once(self):
+        response = self.supabase.rpc("claim_whatsapp_outbox", {
+            "p_limit": settings.WHATSAPP_OUTBOX_BATCH_SIZE,
+            "p_lease_seconds": claim_lease_seconds(),
+            "p_per_sender": settings.WHATSAPP_OUTBOX_MAX_PER_SENDER
+        }).execute()
+
+        if response.data:
+            await self.process(response.data)
+
+    async def process(self, items: List[Dict[str, Any]]):
+        """Envia os itens reservados: remetentes em paralelo, cada um em ordem."""
+        groups: Dict[tuple, List[Dict]] = defaultdict(list)
+        for item in sorted(items, key=lambda i: i.get("created_at") or ""):
+            groups[(item["channel"], item["sender_id"])].append(item)
+
+        await asyncio.gather(*[
+            self._drain_sender(channel, sender_id, entries)
+            for (channel, sender_id), entries in groups.items()
+        ])
+
+    async def _drain_sender(self, channel: str, sender_id: str, entries: List[Dict[str, Any]]):
+        key = f"{channel}:{sender_id}:whatsapp"
+        for index, entry in enumerate(entries):
+            retry_after = await whatsapp_throttle.acquire(
+                key,
+                rate=settings.WHATSAPP_MESSAGES_PER_SECOND,
+                burst=settings.WHATSAPP_BURST,
+                max_wait=settings.WHATSAPP_SHAPING_MAX_WAIT
+            )
+            if retry_after is not None:
+                # Mantém a ordem: o restante do lote também aguarda
+                for pending in entries[index:]:
+                    self._defer(pending, retry_after)
+                return
+
+            with bind_context(tenet_id=entry.get("tenet_id")):
+                result = await self.send(entry)
+                if result.get("success"):
+                    self._mark_sent(entry, result.get("message_id"))
+                elif result.get("retryable"):
+                    self._schedule_retry(entry, result.get("error") or "Falha no envio")
+                elif result.get("uncertain"):
+                    # A mensagem pode ter chegado: repetir arriscaria duplicá-la
+                    metrics.increment("whatsapp_outbox_uncertain", channel=channel)
+                    self._mark_failed(entry, f"Entrega incerta: {result.get('error') or 'Falha no envio'}")
+                else:
+                    self._mark_failed(entry, result.get("error") or "Falha no envio")
+
+    async def send(self, item: Dict[str, Any], simulate_typing: bool = True) -> Dict[str, Any]:
+        """Envia uma mensagem pelo canal do item."""
+        delay = typing_delay(item["message"]) if simulate_typing else 0.0
+
+        if item["channel"] == "meta":
+            service = self._get_meta_service(item.get("tenet_id"), item["sender_id"])
+            if not service:
+                return {"success": False, "retryable": False, "error": "Credenciais Meta não configuradas"}
+            # Cloud API não tem indicador de digitação: apenas aguarda
+            if delay:
+                await asyncio.sleep(delay)
+            return await service.send_text(item["recipient"], item["message"])
+
+        service = WhatsAppService(
+            evolution_api_url=settings.EVOLUTION_API_URL,
+            evolution_api_key=settings.EVOLUTION_API_KEY
+        )
+        return await service.send_text(
+            item["recipient"], item["message"], item["sender_id"], delay_ms=int(delay * 1000)
+        )
+
+    def _get_meta_service(self, tenet_id: Optional[str], phone_number_id: str) -> Optional[MetaWhatsAppService]:
+        query = self.supabase.table("tenets").select("meta_access_token_encrypted")
+        query = query.eq("id", tenet_id) if tenet_id else query.eq("meta_phone_number_id", phone_number_id)
+        result = query.execute()
+        if not result.data or not result.data[0].get("meta_access_token_encrypted"):
+            return None
+        token = self.encryption.decrypt(result.data[0]["meta_access_token_encrypted"])
+        return MetaWhatsAppService(phone_number_id, token)
+
+    # ------------------------------------------------------------------
+    # Estado dos itens
+    # ------------------------------------------------------------------
+
+    def _mark_sent(self, item: Dict[str, Any], provider_message_id: Optional[str]):
+        self.supabase.table("whatsapp_outbox").update({
+            "status": "sent",
+            "attempts": (item.get("attempts") or 0) + 1,
+            "provider_message_id": provider_message_id,
+            "last_error": None,
+            "sent_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", item["id"]).execute()
+        metrics.increment("whatsapp_outbox_sent", channel=item["channel"])
+        if item.get("created_at"):
+            created_at = datetime.fromisoformat(str(item["created_at"]).replace("Z", "+00:00"))
+            metrics.observe("whatsapp_outbox_latency_ms",
+                            (datetime.now(timezone.utc) - created_at).total_seconds() * 1000,
+                            channel=item["channel"])
+
+    def _mark_failed(self, item: Dict[str, Any], error: str):
+        self.supabase.table("whatsapp_outbox").update({
+            "status": "failed",
+            "attempts": (item.get("attempts") or 0) + 1,
+            "last_error": error[:1000]
+        }).eq("id", item["id"]).execute()
+        metrics.increment("whatsapp_outbox_dead", channel=item["channel"])
+        logger.error(f"Mensagem {item['id']} via {item['channel']} descartada: {error}")
+
+    def _schedule_retry(self, item: Dict[str, Any], error: str):
+        attempts = (item.get("attempts") or 0) + 1
+        if attempts >= settings.WHATSAPP_OUTBOX_MAX_ATTEMPTS:
+            self._mark_failed({**item, "attempts": attempts - 1}, error)
+            return
+
+        delay = exponential_backoff(attempts, settings.WHATSAPP_OUTBOX_BACKOFF_BASE, settings.WHATSAPP_OUTBOX_BACKOFF_MAX)
+        self.supabase.table("whatsapp_outbox").update({
+            "status": "pending",
+            "attempts": attempts,
+            "last_error": error[:1000],
+            "next_attempt_at": (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+        }).eq("id", item["id"]).execute()
+        metrics.increment("whatsapp_outbox_retries", channel=item["channel"])
+
+    def _defer(self, item: Dict[str, Any], retry_after: float):
+        """Reagenda sem consumir tentativa (cadência do remetente)."""
+        self.supabase.table("whatsapp_outbox").update({
+            "status": "pending",
+            "next_attempt_at": (datetime.now(timezone.utc) + timedelta(seconds=retry_after)).isoformat()
+        }).eq("id", item["id"]).execute()
+
+    def update_delivery_status(self, provider_message_id: str, provider_status: str) -> bool:
+        """Aplica o status de entrega informado pelo webhook do provedor."""
+        status = DELIVERY_STATUS.get(provider_status)
+        if not provider_message_id or not status:
+            return False
+
+        data: Dict[str, Any] = {"status": status}
+        now = datetime.now(timezone.utc).isoformat()
+        if status == "delivered":
+            data["delivered_at"] = now
+        elif status == "read":
+            data["read_at"] = now
+
+        # Só avança o status (ex.: 'delivered' atrasado não sobrescreve 'read')
+        self.supabase.table("whatsapp_outbox").update(data)\
+            .eq("provider_message_id", provider_message_id)\
+            .in_("status", PREVIOUS_STATUS[status]).execute()
+        metrics.increment("whatsapp_delivery_status", status=status)
+        return True
+
+
+# Singleton
+whatsapp_outbox = WhatsAppOutbox()
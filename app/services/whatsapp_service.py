@@ -2,12 +2,13 @@
 """
 Serviço de WhatsApp para envio de mensagens usando Evolution API.
 """
-import logging
-from typing import Optional
+from typing import Any, Dict, Optional
 import httpx
+from app.config import settings
+from app.services.evolution_client import EvolutionAPIClient
+from app.utils.logger import get_logger
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+logger = get_logger(__name__)
 
 
 class WhatsAppService:
@@ -33,7 +34,8 @@ class WhatsAppService:
             
         self.evolution_api_url = evolution_api_url.rstrip('/')
         self.evolution_api_key = evolution_api_key
-        logging.info("WhatsAppService inicializado com sucesso")
+        self.client = EvolutionAPIClient(self.evolution_api_url, evolution_api_key)
+        logger.info("WhatsAppService inicializado com sucesso")
     
     async def send_text_message(self, phone_number: str, message: str, instance_name: str = "agencia-teste") -> bool:
         """
@@ -47,14 +49,31 @@ class WhatsAppService:
         Returns:
             bool: True se a mensagem foi enviada com sucesso, False caso contrário
         """
-        try:
-            logging.info(f"Enviando mensagem para {phone_number}")
+        result = await self.send_text(phone_number, message, instance_name)
+        return result["success"]
+    
+    async def send_text(
+        self,
+        phone_number: str,
+        message: str,
+        instance_name: str = "agencia-teste",
+        delay_ms: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Envia uma mensagem de texto e retorna o resultado detalhado.
+        
+        Args:
+            phone_number: Número de telefone do destinatário (com código do país)
+            message: Texto da mensagem a ser enviada
+            instance_name: Nome da instância Evolution API
+            delay_ms: Tempo "digitando..." exibido antes do envio (milissegundos)
             
-            # Preparar headers para autenticação
-            headers = {
-                "apikey": self.evolution_api_key,
-                "Content-Type": "application/json"
-            }
+        Returns:
+            Dict com success, message_id, retryable (seguro repetir),
+            uncertain (a mensagem pode ter sido enviada) e error
+        """
+        try:
+            logger.info(f"Enviando mensagem para {phone_number}")
             
             # Preparar corpo da requisição
             payload = {
@@ -63,33 +82,46 @@ class WhatsAppService:
                     "text": message
                 }
             }
+            if delay_ms:
+                payload["options"] = {"delay": int(delay_ms), "presence": "composing"}
             
-            # Montar URL completa para envio de mensagem de texto
-            url = f"{self.evolution_api_url}/message/sendText/{instance_name}"
+            # Envio não é idempotente: só há nova tentativa se a conexão falhar
+            response = await self.client.request(
+                "POST",
+                f"/message/sendText/{instance_name}",
+                operation="send_text",
+                instance_name=instance_name,
+                timeout=settings.EVOLUTION_TIMEOUT + delay_ms / 1000,
+                json=payload
+            )
             
-            # Fazer requisição POST para a Evolution API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                # Verificar se a resposta indica sucesso (status 2xx)
-                if 200 <= response.status_code < 300:
-                    logging.info("Mensagem enviada com sucesso")
-                    return True
-                else:
-                    logging.error(f"Erro ao enviar mensagem: Status {response.status_code} - {response.text}")
-                    return False
+            # Verificar se a resposta indica sucesso (status 2xx)
+            if 200 <= response.status_code < 300:
+                logger.info("Mensagem enviada com sucesso")
+                data = response.json() if response.content else {}
+                return {
+                    "success": True,
+                    "message_id": (data.get("key") or {}).get("id") if isinstance(data, dict) else None
+                }
+            else:
+                logger.error(f"Erro ao enviar mensagem: Status {response.status_code} - {response.text}")
+                # Só 429 garante que a mensagem foi recusada; após um 5xx ela
+                # pode ter sido enviada e repetir arriscaria duplicá-la
+                return {
+                    "success": False,
+                    "retryable": response.status_code == 429,
+                    "uncertain": response.status_code >= 500,
+                    "error": f"HTTP {response.status_code}: {response.text[:500]}"
+                }
                     
-        except httpx.TimeoutException as e:
-            logging.error(f"Erro ao enviar mensagem: Timeout - {str(e)}")
-            return False
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # A requisição não chegou ao servidor: seguro repetir
+            logger.error(f"Erro ao enviar mensagem: Falha de conexão - {str(e)}")
+            return {"success": False, "retryable": True, "error": str(e)}
         except httpx.RequestError as e:
-            logging.error(f"Erro ao enviar mensagem: Erro de requisição - {str(e)}")
-            return False
+            # Timeout de leitura / conexão perdida depois do envio
+            logger.error(f"Erro ao enviar mensagem: Erro de requisição - {e.__class__.__name__}: {str(e)}")
+            return {"success": False, "retryable": False, "uncertain": True, "error": f"{e.__class__.__name__}: {e}"}
         except Exception as e:
-            logging.error(f"Erro ao enviar mensagem: {str(e)}")
-            return False
+            logger.error(f"Erro ao enviar mensagem: {str(e)}")
+            return {"success": False, "retryable": False, "error": str(e)}
@@ -0,0 +1,107 @@
+"""
+Workers de background.
+Cada worker roda em thread própria com um event loop de longa duração,
+assim o cliente Supabase síncrono não bloqueia o loop da API e os clientes
+HTTP em pool (app.utils.http_client) são reaproveitados entre ciclos.
+"""
+import asyncio
+import random
+import threading
+from typing import Iterable, Optional
+from app.utils.http_client import close_http_clients
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+def exponential_backoff(attempts: int, base: float, maximum: float) -> float:
+    """
+    Atraso até a próxima tentativa: exponencial limitado com jitter
+    (metade fixa + metade aleatória), evitando rajadas sincronizadas.
+    """
+    ceiling = min(maximum, base * (2 ** max(attempts - 1, 0)))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class BackgroundWorker:
+    """Executa `run_once` periodicamente até `stop` ser chamado."""
+
+    name = "worker"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Inicia o worker (idempotente)."""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._thread_main, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"Worker '{self.name}' iniciado")
+
+    def request_stop(self):
+        """Sinaliza parada sem aguardar."""
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def stop(self, timeout: float = 10.0):
+        """Sinaliza parada, aguarda o ciclo atual e o `on_stop` terminarem."""
+        if not self.running:
+            return
+        self.request_stop()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Worker '{self.name}' não terminou em {timeout:.1f}s")
+        else:
+            logger.info(f"Worker '{self.name}' parado")
+
+    def wake(self):
+        """Antecipa o próximo ciclo (ex.: logo após enfileirar trabalho)."""
+        self._wake_event.set()
+
+    async def run_once(self):
+        """Um ciclo de trabalho. Implementado pelas subclasses."""
+        raise NotImplementedError
+
+    async def on_stop(self):
+        """Chamado uma vez no encerramento (ex.: flush de buffers)."""
+
+    def _thread_main(self):
+        asyncio.run(self._loop())
+
+    async def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no worker '{self.name}': {e}")
+                metrics.increment("background_worker_errors", worker=self.name)
+
+            await asyncio.to_thread(self._wake_event.wait, self.interval)
+            self._wake_event.clear()
+
+        try:
+            await self.on_stop()
+        except Exception as e:
+            logger.error(f"Erro ao encerrar worker '{self.name}': {e}")
+        await close_http_clients()
+
+
+async def stop_workers(workers: Iterable[BackgroundWorker], timeout: float):
+    """
+    Para os workers em paralelo, fora do event loop: todos são sinalizados
+    antes de aguardar, então o encerramento leva no máximo `timeout`.
+    """
+    running = [worker for worker in workers if worker.running]
+    for worker in running:
+        worker.request_stop()
+    await asyncio.gather(*[asyncio.to_thread(worker.stop, timeout) for worker in running])
@@ -0,0 +1,53 @@
+"""
+Utilitários de concorrência para o caminho crítico dos webhooks.
+Os serviços usam o cliente Supabase síncrono dentro de métodos async,
+então precisam rodar em thread própria para de fato executarem em paralelo.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+_thread_loops = threading.local()
+
+
+def _run_on_thread_loop(coro_fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    # Um loop por thread do executor, mantido entre chamadas: os clientes HTTP
+    # em pool (app.utils.http_client) ficam atrelados a ele e são reaproveitados
+    loop = getattr(_thread_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_loops.loop = loop
+    return loop.run_until_complete(coro_fn(*args, **kwargs))
+
+
+async def run_in_thread(coro_fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """
+    Executa uma coroutine que faz I/O bloqueante em uma thread com event loop próprio,
+    liberando o loop principal.
+    """
+    return await asyncio.to_thread(_run_on_thread_loop, coro_fn, *args, **kwargs)
+
+
+async def with_timeout(awaitable: Awaitable[Any], timeout: float, default: Any, stage: str) -> Any:
+    """
+    Aguarda uma etapa com timeout próprio, retornando `default` em caso de timeout
+    ou erro (degradação graciosa). Registra a latência da etapa.
+    """
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Etapa '{stage}' excedeu {timeout}s, seguindo com valor padrão")
+        metrics.increment("webhook_stage_timeouts", stage=stage)
+        return default
+    except Exception as e:
+        logger.error(f"Erro na etapa '{stage}', seguindo com valor padrão: {e}")
+        metrics.increment("webhook_stage_errors", stage=stage)
+        return default
+    finally:
+        metrics.observe("webhook_stage_latency_ms", (time.perf_counter() - start) * 1000, stage=stage)
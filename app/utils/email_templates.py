@@ -0,0 +1,54 @@
+"""
+Templates de email (Jinja2).
+Os templates ficam em app/templates/email, são compilados uma vez e
+reaproveitados; HTML tem autoescape e cada email tem também a versão texto.
+"""
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+DEFAULT_BRANDING = {
+    "name": "SDR Agent",
+    "primary_color": "#3B82F6",
+    "secondary_color": "#8B5CF6",
+    "logo_url": None,
+    "footer_text": "Enviado automaticamente pelo SDR Agent",
+}
+
+_COLOR_RE = re.compile(r"^#(?:[0-9a-fA-F]{3}){1,2}$")
+
+_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATES_DIR)),
+    autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=True),
+    auto_reload=False,
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+)
+
+
+def resolve_branding(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Branding padrão com as personalizações da agência (cores validadas)."""
+    branding = dict(DEFAULT_BRANDING)
+    for key, value in (overrides or {}).items():
+        if key not in branding or value in (None, ""):
+            continue
+        if key.endswith("_color") and not _COLOR_RE.match(str(value)):
+            continue
+        if key == "logo_url" and not str(value).startswith("https://"):
+            continue
+        branding[key] = str(value)
+    return branding
+
+
+def render_email(name: str, context: Dict[str, Any],
+                 branding: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    """Renderiza `<name>.html` e `<name>.txt`. Retorna (html, texto)."""
+    context = {**context, "brand": resolve_branding(branding)}
+    html = _env.get_template(f"{name}.html").render(context)
+    text = _env.get_template(f"{name}.txt").render(context)
+    return html, text
@@ -0,0 +1,124 @@
+"""
+Fila justa ponderada (weighted fair queueing) para recursos com
+concorrência limitada, como a geração de respostas com IA.
+
+Cada chave (ex.: tenant) recebe uma fatia das vagas proporcional ao seu
+peso: quando há fila, a próxima vaga vai para o pedido com menor tag de
+início virtual (start-time fair queueing). Sem disputa, qualquer chave pode
+usar todas as vagas.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from app.utils.metrics import metrics
+
+
+class QueueTimeout(Exception):
+    """O pedido esperou mais que o tempo máximo na fila."""
+
+
+class FairQueue:
+    """Vagas compartilhadas entre chaves, distribuídas por peso."""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._active = 0
+        self._virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        self._waiting: List[Tuple[float, int, str, asyncio.Future]] = []
+        self._depth: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+
+    async def acquire(self, key: str, weight: float = 1.0, timeout: Optional[float] = None) -> float:
+        """
+        Aguarda uma vaga para `key`. Retorna os segundos de espera; levanta
+        QueueTimeout se a vaga não sair em `timeout` segundos.
+        Cada acquire bem-sucedido exige um release.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+
+        previous = self._finish.get(key)
+        start_tag = max(self._virtual_time, previous or 0.0)
+        finish_tag = start_tag + 1.0 / max(weight, 0.01)
+        self._finish[key] = finish_tag
+
+        if self._active < self.capacity and not self._waiting:
+            self._active += 1
+            self._advance(start_tag)
+            metrics.observe("fair_queue_wait_ms", 0.0, queue=self.name, tenet_id=key)
+            return 0.0
+
+        started = time.perf_counter()
+        future = loop.create_future()
+        heapq.heappush(self._waiting, (start_tag, next(self._seq), key, future))
+        self._set_depth(key, 1)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._rollback(key, previous, finish_tag)
+            metrics.increment("fair_queue_timeouts", queue=self.name, tenet_id=key)
+            raise QueueTimeout(f"{self.name}: {key} aguardou mais de {timeout}s")
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Cancelado depois de receber a vaga: devolve para o próximo
+                self.release()
+            else:
+                self._rollback(key, previous, finish_tag)
+            raise
+        finally:
+            self._set_depth(key, -1)
+
+        waited = time.perf_counter() - started
+        metrics.observe("fair_queue_wait_ms", waited * 1000, queue=self.name, tenet_id=key)
+        return waited
+
+    def release(self):
+        """Libera a vaga, passando-a ao próximo pedido da fila (menor tag)."""
+        while self._waiting:
+            start_tag, _, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue  # desistiu por timeout ou cancelamento
+            self._advance(start_tag)
+            future.set_result(None)
+            return
+        self._active = max(0, self._active - 1)
+        if not self._active:
+            # Fila ociosa: as tags anteriores não influenciam mais ninguém
+            self._virtual_time = 0.0
+            self._finish.clear()
+
+    def _advance(self, virtual_time: float):
+        """Avança o tempo virtual e esquece chaves que ficaram para trás."""
+        self._virtual_time = virtual_time
+        stale = [key for key, tag in self._finish.items()
+                 if tag <= virtual_time and not self._depth.get(key)]
+        for key in stale:
+            del self._finish[key]
+
+    def _rollback(self, key: str, previous: Optional[float], finish_tag: float):
+        """
+        Pedido que desistiu sem receber vaga não consome a fatia da chave
+        (quando nenhum pedido posterior da mesma chave já partiu dessa tag).
+        """
+        if self._finish.get(key) != finish_tag:
+            return
+        if previous is None or previous <= self._virtual_time:
+            self._finish.pop(key, None)
+        else:
+            self._finish[key] = previous
+
+    def _set_depth(self, key: str, delta: int):
+        self._depth[key] += delta
+        metrics.set_gauge("fair_queue_depth", self._depth[key], queue=self.name, tenet_id=key)
+        if not self._depth[key]:
+            self._depth.pop(key, None)
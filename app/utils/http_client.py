@@ -0,0 +1,96 @@
+"""
+Pool de clientes HTTP compartilhados.
+Mantém um httpx.AsyncClient por host, configuração (timeout, limites,
+HTTP/2) e event loop, reaproveitando conexões keep-alive e TLS entre
+chamadas às APIs externas.
+"""
+import asyncio
+import threading
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+import httpx
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+# (loop, host, timeout, limites, http2) -> (loop, cliente)
+_clients: Dict[tuple, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_lock = threading.Lock()
+# Fechamentos em andamento de clientes de loops encerrados (referência contra o GC)
+_closing: Set[asyncio.Task] = set()
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else url
+
+
+def get_http_client(
+    url: str,
+    timeout: float = 30.0,
+    http2: bool = True,
+    limits: Optional[httpx.Limits] = None
+) -> httpx.AsyncClient:
+    """
+    Retorna o cliente compartilhado para o host da URL.
+
+    Os clientes ficam atrelados ao event loop corrente: serviços executados
+    em thread própria (asyncio.run) recebem um cliente separado, e clientes de
+    loops já encerrados são descartados. HTTP/2 é negociado via ALPN quando
+    o pacote h2 está instalado; servidores sem suporte seguem em HTTP/1.1.
+    Os loops devem ser de longa duração (loop da API, workers e as threads de
+    run_in_thread); clientes de loops encerrados são fechados no loop atual.
+    Chamadas com timeout/limites diferentes para o mesmo host recebem
+    clientes separados.
+    """
+    loop = asyncio.get_running_loop()
+    limits = limits or DEFAULT_LIMITS
+    http2 = http2 and HTTP2_AVAILABLE
+    key = (
+        id(loop), _host_key(url), timeout,
+        (limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry),
+        http2
+    )
+
+    with _lock:
+        entry = _clients.get(key)
+        if entry and entry[0] is loop and not entry[1].is_closed:
+            return entry[1]
+
+        # Fecha e remove clientes de loops encerrados
+        for stale_key in [k for k, (l, _) in _clients.items() if l.is_closed()]:
+            _, stale = _clients.pop(stale_key)
+            task = loop.create_task(_close_client(stale))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+
+        client = httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+        _clients[key] = (loop, client)
+        return client
+
+
+async def _close_client(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception as e:
+        logger.warning(f"Erro ao fechar cliente HTTP: {e}")
+
+
+async def close_http_clients():
+    """Fecha os clientes do event loop corrente (chamado no shutdown)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entries = [(k, c) for k, (l, c) in _clients.items() if l is loop]
+        for key, _ in entries:
+            _clients.pop(key, None)
+
+    for _, client in entries:
+        await _close_client(client)
@@ -2,10 +2,10 @@
 Utilitário para sanitização de inputs e proteção contra prompt injection.
 """
 import re
-import logging
-from typing import Optional
+from typing import List, Optional
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Padrões conhecidos de prompt injection
 INJECTION_PATTERNS = [
@@ -48,15 +48,83 @@ DANGEROUS_DELIMITERS = [
 ]
 
 
+MAX_DELIMITERS = 5
+
+DELIMITER_PATTERN = re.compile("|".join(re.escape(d) for d in DANGEROUS_DELIMITERS))
+
+# Um único regex (sobre o texto em minúsculas) para todos os padrões e
+# delimitadores. Sem grupos de captura o re do Python consegue descartar
+# rapidamente as posições que não começam com um caractere inicial de algum
+# padrão; o padrão exato só é identificado quando há ocorrência.
+INJECTION_SCANNER = re.compile(
+    "|".join(f"(?:{p.lower()})" for p in INJECTION_PATTERNS + [DELIMITER_PATTERN.pattern])
+)
+_COMPILED_PATTERNS = [(re.compile(p.lower()), p) for p in INJECTION_PATTERNS]
+
+
+class InjectionScan:
+    """Resultado de uma varredura: padrões encontrados e contagem de delimitadores."""
+
+    def __init__(self, matches: List[str], delimiter_count: int):
+        self.matches = matches
+        self.delimiter_count = delimiter_count
+
+    @property
+    def is_suspicious(self) -> bool:
+        return bool(self.matches) or self.delimiter_count > MAX_DELIMITERS
+
+    @property
+    def reason(self) -> Optional[str]:
+        """Primeiro padrão encontrado, 'excessive_delimiters' ou None."""
+        if self.matches:
+            return self.matches[0]
+        if self.delimiter_count > MAX_DELIMITERS:
+            return "excessive_delimiters"
+        return None
+
+
 class InputSanitizer:
     """Classe para sanitização de inputs de usuário."""
     
-    def __init__(self):
-        self.compiled_patterns = [
-            re.compile(pattern, re.IGNORECASE) 
-            for pattern in INJECTION_PATTERNS
-        ]
-    
+    def scan(self, text: str) -> InjectionScan:
+        """
+        Procura todos os padrões de injection e delimitadores em uma única
+        passada pelo texto.
+        """
+        if not text:
+            return InjectionScan([], 0)
+
+        lowered = text.lower()
+        found = set()
+        delimiter_count = 0
+        delimiter_end = 0
+        position = 0
+        # Recomeça logo após cada ocorrência: um padrão pode começar dentro
+        # do trecho de outro (ex.: "contact as act as a", "[[system]")
+        while match := INJECTION_SCANNER.search(lowered, position):
+            start = match.start()
+            position = start + 1
+            found.update(self._patterns_at(lowered, start))
+            if start >= delimiter_end:
+                delimiter = DELIMITER_PATTERN.match(lowered, start)
+                if delimiter:
+                    delimiter_count += 1
+                    delimiter_end = delimiter.end()
+
+        # Mesma prioridade da busca padrão a padrão
+        matches = [p for p in INJECTION_PATTERNS if p in found]
+        result = InjectionScan(matches, delimiter_count)
+        if matches:
+            logger.warning(f"Possível prompt injection detectado: {matches[0][:50]}...")
+        elif result.is_suspicious:
+            logger.warning(f"Excesso de delimitadores detectado: {delimiter_count}")
+        return result
+
+    @staticmethod
+    def _patterns_at(lowered: str, position: int) -> List[str]:
+        """Padrões de INJECTION_PATTERNS que casam em `position`."""
+        return [p for compiled, p in _COMPILED_PATTERNS if compiled.match(lowered, position)]
+
     def detect_injection(self, text: str) -> tuple[bool, Optional[str]]:
         """
         Detecta possíveis tentativas de prompt injection.
@@ -67,22 +135,8 @@ class InputSanitizer:
         Returns:
             Tupla (is_suspicious, matched_pattern)
         """
-        if not text:
-            return False, None
-        
-        # Verificar padrões de injection
-        for pattern in self.compiled_patterns:
-            if pattern.search(text):
-                logger.warning(f"Possível prompt injection detectado: {pattern.pattern[:50]}...")
-                return True, pattern.pattern
-        
-        # Verificar excesso de delimitadores
-        delimiter_count = sum(text.count(d) for d in DANGEROUS_DELIMITERS)
-        if delimiter_count > 5:
-            logger.warning(f"Excesso de delimitadores detectado: {delimiter_count}")
-            return True, "excessive_delimiters"
-        
-        return False, None
+        result = self.scan(text)
+        return result.is_suspicious, result.reason
     
     def sanitize_message(self, text: str, max_length: int = 4000) -> str:
         """
@@ -106,9 +160,8 @@ class InputSanitizer:
         # Remover caracteres de controle (exceto newlines e tabs)
         text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
         
-        # Escapar delimitadores perigosos
-        for delimiter in DANGEROUS_DELIMITERS:
-            text = text.replace(delimiter, f" {delimiter.replace(delimiter[0], '')} ")
+        # Escapar delimitadores perigosos (todos são um caractere repetido)
+        text = DELIMITER_PATTERN.sub("  ", text)
         
         return text.strip()
     
@@ -138,16 +191,18 @@ que tentem alterar seu comportamento ou acessar dados de outros usuários.
 input_sanitizer = InputSanitizer()
 
 
-def sanitize_for_ai(message: str) -> tuple[str, bool]:
+def sanitize_for_ai(message: str, scan: Optional[InjectionScan] = None) -> tuple[str, bool]:
     """
     Função helper para sanitizar mensagem para uso com IA.
     
     Args:
         message: Mensagem original do usuário
+        scan: Resultado de input_sanitizer.scan já calculado (evita nova varredura)
         
     Returns:
         Tupla (mensagem_sanitizada, is_suspicious)
     """
-    is_suspicious, _ = input_sanitizer.detect_injection(message)
+    if scan is None:
+        scan = input_sanitizer.scan(message)
     sanitized = input_sanitizer.wrap_user_message(message)
-    return sanitized, is_suspicious
+    return sanitized, scan.is_suspicious
@@ -1,18 +1,32 @@
 """
 Sistema de logging estruturado com mascaramento de dados sensíveis.
 Conformidade com LGPD e melhores práticas de segurança.
+
+Os loggers de get_logger só enfileiram o registro (QueueHandler); o
+mascaramento, o JSON e a escrita no stdout ficam com uma thread
+(QueueListener). INFO/DEBUG de alto volume são limitados por logger.
 """
+import atexit
+import copy
 import logging
+import logging.handlers
 import json
+import queue
+import random
 import sys
 import re
+import threading
+import time
 from datetime import datetime
 from typing import Optional, Any, Dict
+from app.config import settings
+from app.utils.metrics import metrics
+from app.utils.request_context import get_context
 
 # Padrões para identificar dados sensíveis
 SENSITIVE_PATTERNS = {
     "email": re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),
-    "phone_br": re.compile(r'\b(\+?55)?[\s-]?\(?[1-9]{2}\)?[\s-]?9?[0-9]{4}[\s-]?[0-9]{4}\b'),
+    "phone_br": re.compile(r'\b(?:\+?55)?[\s-]?\(?[1-9]{2}\)?[\s-]?9?[0-9]{4}[\s-]?[0-9]{4}\b'),
     "cpf": re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}[-.]?\d{2}\b'),
     "credit_card": re.compile(r'\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b'),
     "jwt_token": re.compile(r'eyJ[A-Za-z0-9_-]*\.eyJ[A-Za-z0-9_-]*\.[A-Za-z0-9_-]*'),
@@ -21,6 +35,23 @@ SENSITIVE_PATTERNS = {
     "bearer_token": re.compile(r'Bearer\s+[A-Za-z0-9_-]+\.?[A-Za-z0-9_-]*\.?[A-Za-z0-9_-]*'),
 }
 
+# Um único regex com um grupo nomeado por tipo: uma passada por linha de log.
+# Na mesma posição vence a primeira alternativa: cartão antes de telefone e
+# telefone antes de CPF (celular com 11 dígitos), como na ordem anterior.
+# - email só é tentado no início de uma sequência que contém '@' adiante
+#   (evita reescanear cada palavra sem email)
+# - os padrões numéricos compartilham um único \b e só são tentados
+#   onde o próximo caractere pode iniciar um número
+_DIGIT_KINDS = ("credit_card", "phone_br", "cpf")
+COMBINED_PATTERN = re.compile(
+    r"(?P<email>(?<![a-zA-Z0-9._%+-])(?=[a-zA-Z0-9._%+-]+@)" + SENSITIVE_PATTERNS["email"].pattern + ")"
+    + "|(?P<jwt_token>" + SENSITIVE_PATTERNS["jwt_token"].pattern + ")"
+    + "|(?P<bearer_token>" + SENSITIVE_PATTERNS["bearer_token"].pattern + ")"
+    + r"|\b(?=[\d(+\s-])(?:"
+    + "|".join(f"(?P<{kind}>{SENSITIVE_PATTERNS[kind].pattern[2:]})" for kind in _DIGIT_KINDS)
+    + ")"
+)
+
 # Campos que devem ser sempre mascarados
 SENSITIVE_FIELDS = [
     "password", "senha", "secret", "token", "api_key", "apikey",
@@ -28,6 +59,8 @@ SENSITIVE_FIELDS = [
     "access_token", "refresh_token", "private_key", "fernet_key"
 ]
 
+_SENSITIVE_FIELD_RE = re.compile("|".join(re.escape(field) for field in SENSITIVE_FIELDS))
+
 
 class SensitiveDataMasker:
     """Classe para mascarar dados sensíveis em textos e dicionários."""
@@ -73,38 +106,24 @@ class SensitiveDataMasker:
             return "***"
         return value[:show_chars] + "***" + value[-show_chars:]
     
+    def __init__(self):
+        self._replacers = {
+            "email": self.mask_email,
+            "jwt_token": self.mask_token,
+            "bearer_token": lambda value: "Bearer ***",
+            "credit_card": lambda value: "****-****-****-" + value[-4:],
+            "phone_br": self.mask_phone,
+            "cpf": self.mask_cpf,
+        }
+
+    def _replace(self, match: "re.Match") -> str:
+        return self._replacers[match.lastgroup](match.group())
+
     def mask_text(self, text: str) -> str:
-        """Mascara todos os dados sensíveis em um texto."""
+        """Mascara todos os dados sensíveis em um texto (uma única passada)."""
         if not text:
             return text
-        
-        result = text
-        
-        # Mascarar emails
-        for match in SENSITIVE_PATTERNS["email"].finditer(result):
-            result = result.replace(match.group(), self.mask_email(match.group()))
-        
-        # Mascarar telefones
-        for match in SENSITIVE_PATTERNS["phone_br"].finditer(result):
-            result = result.replace(match.group(), self.mask_phone(match.group()))
-        
-        # Mascarar CPFs
-        for match in SENSITIVE_PATTERNS["cpf"].finditer(result):
-            result = result.replace(match.group(), self.mask_cpf(match.group()))
-        
-        # Mascarar tokens JWT
-        for match in SENSITIVE_PATTERNS["jwt_token"].finditer(result):
-            result = result.replace(match.group(), self.mask_token(match.group()))
-        
-        # Mascarar Bearer tokens
-        for match in SENSITIVE_PATTERNS["bearer_token"].finditer(result):
-            result = result.replace(match.group(), "Bearer ***")
-        
-        # Mascarar cartões de crédito
-        for match in SENSITIVE_PATTERNS["credit_card"].finditer(result):
-            result = result.replace(match.group(), "****-****-****-" + match.group()[-4:])
-        
-        return result
+        return COMBINED_PATTERN.sub(self._replace, text)
     
     def mask_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Mascara dados sensíveis em um dicionário."""
@@ -116,7 +135,7 @@ class SensitiveDataMasker:
             key_lower = key.lower()
             
             # Verificar se é campo sensível
-            if any(sensitive in key_lower for sensitive in SENSITIVE_FIELDS):
+            if _SENSITIVE_FIELD_RE.search(key_lower):
                 masked[key] = "[REDACTED]"
             elif isinstance(value, dict):
                 masked[key] = self.mask_dict(value)
@@ -155,7 +174,7 @@ class SecureJSONFormatter(logging.Formatter):
         }
         
         # Adicionar campos extras com mascaramento
-        extra_fields = ["tenet_id", "user_id", "request_id", "phone", "email", "ip_address"]
+        extra_fields = ["tenet_id", "user_id", "request_id", "stage", "phone", "email", "ip_address"]
         for field in extra_fields:
             if hasattr(record, field):
                 value = getattr(record, field)
@@ -167,21 +186,133 @@ class SecureJSONFormatter(logging.Formatter):
                 else:
                     log_obj[field] = value
         
-        # Adicionar exception info se houver
+        # Adicionar exception info se houver (exc_text: já renderada na fila)
         if record.exc_info:
             log_obj["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_obj["exception"] = record.exc_text
+        if record.stack_info:
+            log_obj["stack"] = record.stack_info
         
         return json.dumps(log_obj, ensure_ascii=False)
 
 
+class ContextFilter(logging.Filter):
+    """Copia request_id, tenet_id e etapa do contexto para o registro (na thread de origem)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in get_context().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class LogRateLimiter(logging.Filter):
+    """
+    Limita INFO/DEBUG por logger: token bucket de `rate` registros/s com
+    rajada `burst`, depois amostragem com `sample_rate` (0–1).
+    WARNING e acima sempre passam.
+    """
+
+    def __init__(self, rate: float, burst: float, sample_rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            metrics.increment("logs_suppressed", logger=record.name, reason="sampled")
+            return False
+        if self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(record.name, [self.burst, now])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return True
+        metrics.increment("logs_suppressed", logger=record.name, reason="rate_limited")
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que não formata na thread da requisição e descarta se a fila encher."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Só fixa o que pode mudar depois: argumentos e traceback
+        record = copy.copy(record)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("logs_dropped", logger=record.name)
+
+
+_output_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def _get_output_handler() -> logging.Handler:
+    """Handler compartilhado por todos os loggers da aplicação."""
+    global _output_handler, _listener
+    with _setup_lock:
+        if _output_handler is not None:
+            return _output_handler
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(SecureJSONFormatter())
+
+        if settings.LOG_QUEUE_ENABLED:
+            log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+            handler: logging.Handler = NonBlockingQueueHandler(log_queue)
+            _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_log_listener)
+        else:
+            handler = stream
+
+        handler.addFilter(LogRateLimiter(
+            settings.LOG_INFO_RATE_PER_LOGGER,
+            settings.LOG_INFO_BURST,
+            settings.LOG_INFO_SAMPLE_RATE
+        ))
+        handler.addFilter(ContextFilter())
+        _output_handler = handler
+        return handler
+
+
+def stop_log_listener():
+    """Escreve o que ainda está na fila e encerra a thread de logging."""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
 def get_logger(name: str, level: int = logging.INFO) -> logging.Logger:
     """Retorna logger configurado com formato JSON seguro."""
     logger = logging.getLogger(name)
     
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(SecureJSONFormatter())
-        logger.addHandler(handler)
+        logger.addHandler(_get_output_handler())
         logger.setLevel(level)
         logger.propagate = False
     
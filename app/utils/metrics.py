@@ -0,0 +1,88 @@
+"""
+Registro de métricas em memória do processo.
+Contadores, gauges e resumos (count/sum/min/max) com labels simples.
+"""
+import threading
+from typing import Dict, Any, Tuple
+from app.utils.request_context import metric_labels
+
+
+def _labels_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Normaliza labels em uma chave ordenada e hashable. tenet_id e stage do
+    contexto da requisição entram quando não informados explicitamente.
+    """
+    context = metric_labels()
+    if context:
+        labels = {**context, **labels}
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class MetricsRegistry:
+    """Registro thread-safe de métricas da aplicação."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._summaries: Dict[str, Dict[tuple, Dict[str, float]]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Incrementa um contador."""
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Define o valor atual de um gauge."""
+        key = _labels_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra uma observação (latência, tamanho, etc.) em um resumo."""
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                series[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Retorna cópia serializável de todas as métricas."""
+        def _series(data: Dict[tuple, Any]) -> list:
+            return [{"labels": dict(key), "value": value} for key, value in data.items()]
+
+        with self._lock:
+            return {
+                "counters": {name: _series(s) for name, s in self._counters.items()},
+                "gauges": {name: _series(s) for name, s in self._gauges.items()},
+                "summaries": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            **summary,
+                            "avg": summary["sum"] / summary["count"] if summary["count"] else 0
+                        }
+                        for key, summary in s.items()
+                    ]
+                    for name, s in self._summaries.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Limpa todas as métricas (uso em testes)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# Instância global
+metrics = MetricsRegistry()
@@ -1,14 +1,21 @@
 """
 Rate limiting robusto com múltiplas estratégias.
 Protege contra ataques de força bruta e DDoS.
+
+Os contadores ficam no Redis (RATE_LIMIT_STORAGE_URI ou REDIS_URL),
+compartilhados entre workers e réplicas; sem Redis, em memória. Se o
+storage não responder, o limiter segue em memória até ele voltar.
 """
-import logging
+import asyncio
 from typing import Optional, Callable
 from fastapi import Request
+from limits.storage import storage_from_string
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from app.config import settings
+from app.utils.logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 def get_client_identifier(request: Request) -> str:
@@ -59,11 +66,72 @@ def get_identifier_for_login(request: Request) -> str:
     return f"login:{ip}"
 
 
+def get_webhook_tenant_key(request: Request) -> str:
+    """
+    Identificador do webhook Evolution: a instância (agência) do payload,
+    preenchida pelo WebhookTenantMiddleware só quando pertence a uma agência
+    cadastrada, junto com a origem. Todo o tráfego da Evolution vem do mesmo
+    IP, então limitar só por IP somaria todas as agências; a origem na chave
+    impede que outro remetente esgote a cota de uma agência usando o nome
+    da instância dela.
+    """
+    client = get_client_identifier(request)
+    instance = getattr(request.state, "webhook_instance", None)
+    if instance:
+        return f"tenant:{instance}:{client}"
+    return client
+
+
+def get_webhook_ip_key(request: Request) -> str:
+    """Teto por origem do webhook Evolution, qualquer que seja a instância."""
+    return f"webhook:{get_client_identifier(request)}"
+
+
+def get_storage_uri() -> str:
+    """Storage compartilhado se configurado; senão memória."""
+    return settings.RATE_LIMIT_STORAGE_URI or settings.REDIS_URL or "memory://"
+
+
+def get_storage_options(uri: str) -> dict:
+    """Timeouts curtos no Redis: storage fora do ar não pode travar requisições."""
+    if not uri.startswith(("redis://", "rediss://")):
+        return {}
+    return {
+        "socket_connect_timeout": settings.RATE_LIMIT_STORAGE_TIMEOUT,
+        "socket_timeout": settings.RATE_LIMIT_STORAGE_TIMEOUT,
+    }
+
+
+async def check_rate_limit_storage() -> bool:
+    """
+    Verifica o storage dos contadores (na inicialização, fora do import),
+    com timeout. Falhas só são registradas: o limiter já recorre à memória.
+    """
+    uri = get_storage_uri()
+    try:
+        storage = storage_from_string(uri, **get_storage_options(uri))
+        healthy = await asyncio.wait_for(asyncio.to_thread(storage.check),
+                                         timeout=settings.RATE_LIMIT_STORAGE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Storage de rate limit indisponível, usando memória até ele voltar: {e}")
+        return False
+    if not healthy:
+        logger.warning("Storage de rate limit não respondeu, usando memória até ele voltar")
+    return bool(healthy)
+
+
+_storage_uri = get_storage_uri()
+
 # Limiter principal
 limiter = Limiter(
     key_func=get_client_identifier,
     default_limits=["200/minute", "1000/hour"],  # Limites globais
-    storage_uri="memory://",  # Em produção, usar Redis
+    storage_uri=_storage_uri,
+    storage_options=get_storage_options(_storage_uri),
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    key_prefix="ratelimit",
+    # Se o Redis cair em produção, continua limitando em memória
+    in_memory_fallback_enabled=True,
 )
 
 # Limites específicos por tipo de endpoint
@@ -73,6 +141,8 @@ RATE_LIMITS = {
     "api_read": "60/minute",      # Leitura de dados
     "api_write": "30/minute",     # Escrita de dados
     "webhook": "100/minute",      # Webhooks externos
+    "webhook_tenant": settings.WEBHOOK_TENANT_RATE_LIMIT,  # Webhook Evolution por agência
+    "webhook_ip": settings.WEBHOOK_IP_RATE_LIMIT,  # Webhook Evolution por origem (todas as agências)
     "ai_generation": "20/minute", # Geração de IA (custoso)
     "export": "5/minute",         # Exportações
 }
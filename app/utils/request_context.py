@@ -0,0 +1,52 @@
+"""
+Contexto da requisição (request_id, tenet_id, etapa do pipeline) em
+contextvars. Logs e métricas leem daqui automaticamente; tasks criadas com
+asyncio.create_task e threads de asyncio.to_thread herdam o contexto.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+tenet_id_var: ContextVar[Optional[str]] = ContextVar("tenet_id", default=None)
+stage_var: ContextVar[Optional[str]] = ContextVar("stage", default=None)
+
+_VARS = {
+    "request_id": request_id_var,
+    "tenet_id": tenet_id_var,
+    "stage": stage_var,
+}
+
+# request_id fica fora das métricas (um valor por requisição)
+METRIC_LABELS = ("tenet_id", "stage")
+
+
+def get_context() -> Dict[str, str]:
+    """Valores definidos no contexto atual."""
+    values = {}
+    for name, var in _VARS.items():
+        value = var.get()
+        if value is not None:
+            values[name] = value
+    return values
+
+
+def metric_labels() -> Dict[str, str]:
+    """Labels de métrica vindos do contexto atual."""
+    values = {}
+    for name in METRIC_LABELS:
+        value = _VARS[name].get()
+        if value is not None:
+            values[name] = value
+    return values
+
+
+@contextmanager
+def bind_context(**values: Optional[str]):
+    """Define valores de contexto durante o bloco (restaurados ao sair)."""
+    tokens = [(_VARS[name], _VARS[name].set(value)) for name, value in values.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
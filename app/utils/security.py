@@ -2,13 +2,13 @@
 """
 Serviço de criptografia para dados sensíveis.
 """
-import logging
 from cryptography.fernet import Fernet
 from typing import Optional
 from app.config import settings
+from app.utils.logger import get_logger
 
 # Configurar logging
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class EncryptionService:
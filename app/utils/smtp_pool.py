@@ -0,0 +1,124 @@
+"""
+Pool de conexões SMTP.
+Reaproveita sessões autenticadas por configuração (host, porta, usuário e
+senha) e limita conexões simultâneas por host.
+"""
+import hashlib
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# (host, porta, usuário, hash da senha): sessões só são reaproveitadas com as
+# mesmas credenciais com que foram abertas
+PoolKey = Tuple[str, int, str, str]
+
+
+class SMTPPool:
+    """Sessões SMTP ociosas por configuração, com limite por host."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: Dict[PoolKey, List[Tuple[smtplib.SMTP, float]]] = {}
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _host_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(settings.SMTP_MAX_CONNECTIONS_PER_HOST)
+            return self._host_limits[host]
+
+    def _connect(self, host: str, port: int, user: Optional[str], password: Optional[str]) -> smtplib.SMTP:
+        start = time.perf_counter()
+        if port == 465:
+            server = smtplib.SMTP_SSL(host, port, timeout=settings.SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(host, port, timeout=settings.SMTP_TIMEOUT)
+            try:
+                server.ehlo()
+                if settings.SMTP_ALLOW_PLAINTEXT and not server.has_extn("starttls"):
+                    logger.warning(f"Servidor SMTP {host}:{port} sem STARTTLS; seguindo sem TLS (SMTP_ALLOW_PLAINTEXT)")
+                else:
+                    # Sem a extensão starttls() levanta SMTPNotSupportedError
+                    # antes de qualquer credencial ser enviada
+                    server.starttls()
+                    server.ehlo()
+            except Exception:
+                self._close(server)
+                raise
+
+        if user and password:
+            server.login(user, password)
+
+        metrics.observe("smtp_connect_ms", (time.perf_counter() - start) * 1000, host=host)
+        return server
+
+    def _take_idle(self, key: PoolKey) -> Optional[smtplib.SMTP]:
+        """Sessão ociosa ainda válida, descartando as expiradas."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key) or []
+                if not idle:
+                    return None
+                server, released_at = idle.pop()
+
+            if time.monotonic() - released_at < settings.SMTP_IDLE_TIMEOUT:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except Exception:
+                    pass
+            self._close(server)
+
+    def _close(self, server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self, host: str, port: int, user: Optional[str] = None, password: Optional[str] = None):
+        """
+        Empresta uma sessão SMTP (reaproveitada ou nova). Em caso de erro a
+        sessão é descartada; caso contrário volta ao pool.
+        """
+        key = (host, int(port), user or "", hashlib.sha256((password or "").encode()).hexdigest())
+        semaphore = self._host_semaphore(host)
+        semaphore.acquire()
+        server = None
+        try:
+            server = self._take_idle(key)
+            if server is not None:
+                metrics.increment("smtp_connection_reused", host=host)
+            else:
+                server = self._connect(host, int(port), user, password)
+
+            yield server
+
+            with self._lock:
+                self._idle.setdefault(key, []).append((server, time.monotonic()))
+            server = None
+        finally:
+            if server is not None:
+                self._close(server)
+            semaphore.release()
+
+    def close_all(self):
+        with self._lock:
+            idle = [server for servers in self._idle.values() for server, _ in servers]
+            self._idle.clear()
+        for server in idle:
+            self._close(server)
+
+
+# Singleton
+smtp_pool = SMTPPool()
@@ -0,0 +1,168 @@
+"""
+Token bucket e circuit breaker para chamadas a APIs externas.
+
+O estado fica em um backend plugável:
+- MemoryThrottleBackend: padrão, por processo
+- RedisThrottleBackend: compartilhado entre workers (REDIS_URL configurada);
+  o cliente é síncrono, então as chamadas rodam fora do event loop
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from app.config import settings
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+class MemoryThrottleBackend:
+    """Estado em memória (um processo). Seguro entre threads."""
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._circuits: Dict[str, Dict[str, float]] = {}
+
+    def reserve(self, key: str, rate: float, burst: float, cost: float, max_wait: float) -> float:
+        """
+        Reserva `cost` tokens. Retorna 0 se há tokens, ou a espera necessária
+        (já reservada) se <= max_wait. Acima de max_wait nada é reservado.
+        """
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key, {"tokens": burst, "ts": now})
+            tokens = min(burst, bucket["tokens"] + (now - bucket["ts"]) * rate) - cost
+            wait = max(0.0, -tokens / rate)
+            if wait <= max_wait:
+                self._buckets[key] = {"tokens": tokens, "ts": now}
+            return wait
+
+    def circuit_open_for(self, key: str) -> float:
+        """Segundos restantes com o circuito aberto (0 = fechado ou meio-aberto)."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if not circuit:
+                return 0.0
+            return max(0.0, circuit.get("open_until", 0.0) - time.time())
+
+    def record_success(self, key: str):
+        with self._lock:
+            self._circuits.pop(key, None)
+
+    def record_failure(self, key: str, threshold: int, cooldown: float) -> bool:
+        """Conta a falha; abre o circuito ao atingir o limite. Retorna True se abriu."""
+        with self._lock:
+            circuit = self._circuits.setdefault(key, {"failures": 0, "open_until": 0.0})
+            circuit["failures"] += 1
+            if circuit["failures"] >= threshold:
+                circuit["open_until"] = time.time() + cooldown
+                return True
+            return False
+
+
+class RedisThrottleBackend:
+    """Estado no Redis, compartilhado entre workers e instâncias da API."""
+
+    blocking = True
+
+    RESERVE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local max_wait = tonumber(ARGV[4])
+    local now = tonumber(ARGV[5])
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate) - cost
+    local wait = 0
+    if tokens < 0 then wait = -tokens / rate end
+    if wait <= max_wait then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.Redis.from_url(url, socket_timeout=1.0)
+        self._reserve = self.redis.register_script(self.RESERVE_SCRIPT)
+
+    def reserve(self, key: str, rate: float, burst: float, cost: float, max_wait: float) -> float:
+        return float(self._reserve(keys=[f"throttle:{key}"], args=[rate, burst, cost, max_wait, time.time()]))
+
+    def circuit_open_for(self, key: str) -> float:
+        ttl = self.redis.pttl(f"circuit:open:{key}")
+        return ttl / 1000 if ttl and ttl > 0 else 0.0
+
+    def record_success(self, key: str):
+        self.redis.delete(f"circuit:failures:{key}", f"circuit:open:{key}")
+
+    def record_failure(self, key: str, threshold: int, cooldown: float) -> bool:
+        failures_key = f"circuit:failures:{key}"
+        failures = self.redis.incr(failures_key)
+        self.redis.expire(failures_key, int(cooldown * 10))
+        if failures >= threshold:
+            self.redis.set(f"circuit:open:{key}", 1, px=int(cooldown * 1000))
+            return True
+        return False
+
+
+def create_throttle_backend():
+    """Redis se REDIS_URL estiver configurada e disponível; senão memória."""
+    if settings.REDIS_URL:
+        try:
+            backend = RedisThrottleBackend(settings.REDIS_URL)
+            backend.redis.ping()
+            return backend
+        except Exception as e:
+            logger.warning(f"Redis indisponível para throttling, usando memória: {e}")
+    return MemoryThrottleBackend()
+
+
+class Throttle:
+    """Aplica token bucket e circuit breaker por chave (ex.: tenant + provedor)."""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    async def _call(self, method: str, *args):
+        """Chama o backend; I/O de rede (Redis) vai para uma thread."""
+        if self._backend is None:
+            self._backend = await asyncio.to_thread(create_throttle_backend)
+        fn = getattr(self._backend, method)
+        if self._backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def acquire(self, key: str, rate: float, burst: float = 1.0,
+                      cost: float = 1.0, max_wait: float = 5.0) -> Optional[float]:
+        """
+        Aguarda a vez na fila do token bucket. Retorna None quando liberado,
+        ou os segundos sugeridos para tentar de novo quando a espera
+        excederia `max_wait` (o chamador reagenda em vez de falhar).
+        """
+        wait = await self._call("reserve", key, rate, max(burst, cost), cost, max_wait)
+        if wait > max_wait:
+            metrics.increment("throttle_deferred", provider=key.split(":")[-1])
+            return wait
+        if wait > 0:
+            metrics.observe("throttle_wait_ms", wait * 1000, provider=key.split(":")[-1])
+            await asyncio.sleep(wait)
+        return None
+
+    async def circuit_open_for(self, key: str) -> float:
+        return await self._call("circuit_open_for", key)
+
+    async def record_success(self, key: str):
+        await self._call("record_success", key)
+
+    async def record_failure(self, key: str, threshold: int, cooldown: float):
+        if await self._call("record_failure", key, threshold, cooldown):
+            logger.warning(f"Circuito aberto para {key} por {cooldown}s")
+            metrics.increment("circuit_opened", provider=key.split(":")[-1])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de renderização dos templates de email.
+Execute com: python scripts/bench_email_templates.py [--n 5000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Adiciona path do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.notification_digest_service import render_digest
+from app.utils.email_templates import render_email
+
+LEAD = {
+    "nome": "Maria <Silva>",
+    "phone": "5511999999999",
+    "empresa": "Empresa & Cia",
+    "cargo": "Diretora",
+    "interesse": "Automação de atendimento",
+}
+
+BRANDING = {"name": "Agência X", "primary_color": "#111111", "logo_url": "https://example.com/logo.png"}
+
+
+def bench(label: str, fn, n: int):
+    fn()  # aquece (compilação do template)
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {n / elapsed:>10.0f} renders/s  ({elapsed / n * 1e6:.1f} µs cada)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos templates de email")
+    parser.add_argument("--n", type=int, default=5000, help="Renderizações por caso")
+    args = parser.parse_args()
+
+    fields = [(k.title(), v) for k, v in LEAD.items()]
+    events = [{"tipo": "qualificado", "lead_data": LEAD}] * 50
+
+    print(f"📊 Renderizando {args.n}x cada template...")
+    bench("lead (html + texto)", lambda: render_email(
+        "lead_notification", {"emoji": "🎯", "tipo_label": "Qualificado", "fields": fields}), args.n)
+    bench("lead com branding", lambda: render_email(
+        "lead_notification", {"emoji": "🎯", "tipo_label": "Qualificado", "fields": fields}, BRANDING), args.n)
+    bench("resumo (50 eventos)", lambda: render_digest(events, "diario"), max(args.n // 10, 1))
+
+
+if __name__ == "__main__":
+    main()
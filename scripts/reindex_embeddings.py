@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script para re-embedar a Base de Conhecimento com um novo modelo de embedding.
+Pode ser interrompido e executado novamente: retoma do último checkpoint.
+Execute com: python scripts/reindex_embeddings.py --model models/text-embedding-004 [--tenet ID]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+
+# Adiciona path do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.embedding_reindex_service import embedding_reindex_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-index de embeddings da Base de Conhecimento")
+    parser.add_argument("--model", required=True, help="Modelo de embedding alvo")
+    parser.add_argument("--tenet", action="append", help="ID do tenant (pode repetir; padrão: todos)")
+    args = parser.parse_args()
+
+    print(f"🚀 Iniciando re-index para o modelo {args.model}...")
+
+    results = asyncio.run(embedding_reindex_service.run(args.model, args.tenet))
+
+    erros = 0
+    for result in results:
+        if result["status"] == "failed":
+            erros += 1
+            print(f"  ⚠️ Tenant {result['tenet_id']}: {result.get('error')}")
+        else:
+            print(f"  ✅ Tenant {result['tenet_id']}: {result['processed']} documentos ({result['status']})")
+
+    print(f"\n✅ Re-index concluído!")
+    print(f"   Tenants processados: {len(results)}")
+    print(f"   Erros: {erros}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar as políticas de retenção de dados (LGPD).
+Processa em lotes e pode ser interrompido: a próxima execução retoma do checkpoint.
+Execute com: python scripts/run_retention.py [--apply] [--policy conversas] [--max-batches 50]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+
+# Adiciona path do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.data_retention_service import RETENTION_POLICIES, data_retention_service
+
+
+async def run(policies, dry_run, max_batches):
+    return [
+        await data_retention_service.enforce_policy(policy, dry_run=dry_run, max_batches=max_batches)
+        for policy in policies
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica as políticas de retenção de dados")
+    parser.add_argument("--apply", action="store_true", help="Exclui/anonimiza de fato (padrão: apenas conta)")
+    parser.add_argument("--policy", action="append", choices=list(RETENTION_POLICIES),
+                        help="Política (pode repetir; padrão: todas)")
+    parser.add_argument("--max-batches", type=int, default=None, help="Lotes por política nesta execução (0 = todos)")
+    args = parser.parse_args()
+
+    dry_run = not args.apply
+    print(f"🚀 Iniciando retenção ({'simulação' if dry_run else 'aplicando'})...")
+
+    results = asyncio.run(run(args.policy or list(RETENTION_POLICIES), dry_run, args.max_batches))
+
+    erros = 0
+    for result in results:
+        if result.get("skipped"):
+            print(f"  ⏭️ {result['policy']}: {result['reason']}")
+        elif result["status"] == "failed":
+            erros += 1
+            print(f"  ⚠️ {result['policy']}: {result.get('error')}")
+        elif dry_run:
+            print(f"  🔎 {result['policy']}: {result['found']} linha(s) vencidas")
+        else:
+            print(f"  ✅ {result['policy']}: {result['processed']} linha(s) ({result['status']})")
+
+    print(f"\n✅ Retenção concluída!")
+    print(f"   Erros: {erros}")
+
+
+if __name__ == "__main__":
+    main()
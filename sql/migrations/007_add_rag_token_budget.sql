@@ -0,0 +1,7 @@
+-- Migration: Orçamento de tokens do contexto RAG por tenant
+-- Versão: 007
+-- Descrição: Permite limitar quantos tokens a Base de Conhecimento adiciona ao prompt
+
+ALTER TABLE tenets ADD COLUMN IF NOT EXISTS rag_token_budget INT;
+
+COMMENT ON COLUMN tenets.rag_token_budget IS 'Máximo de tokens do contexto RAG por chamada (NULL = padrão RAG_CONTEXT_TOKEN_BUDGET)';
@@ -0,0 +1,134 @@
+-- Migration: Versionamento de embeddings e re-index da Base de Conhecimento
+-- Versão: 008
+-- Descrição: Registra o modelo de cada embedding, adiciona coluna sombra para
+-- re-embedding e checkpoints do job, e troca atômica de modelo por tenant
+
+-- Modelo usado em cada vetor e coluna sombra para o novo modelo
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(100) DEFAULT 'models/embedding-001';
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS embedding_next vector(768);
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS embedding_next_model VARCHAR(100);
+
+UPDATE knowledge_base SET embedding_model = 'models/embedding-001' WHERE embedding_model IS NULL;
+
+-- Modelo ativo por tenant (usado na busca e em novos documentos)
+ALTER TABLE tenets ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(100) DEFAULT 'models/embedding-001';
+
+CREATE INDEX IF NOT EXISTS idx_kb_tenet_id_pk ON knowledge_base(tenet_id, id);
+
+-- Checkpoints do job de re-index (um registro por tenant/modelo)
+CREATE TABLE IF NOT EXISTS embedding_reindex_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID NOT NULL,
+    target_model VARCHAR(100) NOT NULL,
+    status VARCHAR(20) DEFAULT 'running' CHECK (status IN ('running', 'failed', 'switched')),
+    last_id UUID,
+    processed INT DEFAULT 0,
+    failed INT DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE,
+    UNIQUE(tenet_id, target_model)
+);
+
+-- Grava embeddings do novo modelo na coluna sombra em lote
+-- p_rows: [{"id": "...", "embedding": [..]}, ...]
+CREATE OR REPLACE FUNCTION set_knowledge_embedding_next(
+    p_model VARCHAR,
+    p_rows JSONB
+)
+RETURNS INT AS $$
+DECLARE
+    v_count INT;
+BEGIN
+    UPDATE knowledge_base kb
+    SET embedding_next = (r->>'embedding')::vector,
+        embedding_next_model = p_model
+    FROM jsonb_array_elements(p_rows) r
+    WHERE kb.id = (r->>'id')::uuid;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Troca atômica: promove a coluna sombra e muda o modelo ativo do tenant
+-- na mesma transação. Falha se algum documento ativo ainda não foi re-embedado.
+CREATE OR REPLACE FUNCTION switch_knowledge_embeddings(
+    p_tenet_id UUID,
+    p_model VARCHAR
+)
+RETURNS INT AS $$
+DECLARE
+    v_pending INT;
+    v_count INT;
+BEGIN
+    SELECT COUNT(*) INTO v_pending
+    FROM knowledge_base
+    WHERE tenet_id = p_tenet_id
+      AND ativo = true
+      AND embedding_model IS DISTINCT FROM p_model
+      AND embedding_next_model IS DISTINCT FROM p_model;
+
+    IF v_pending > 0 THEN
+        RAISE EXCEPTION '% documentos ainda sem embedding do modelo %', v_pending, p_model;
+    END IF;
+
+    UPDATE knowledge_base
+    SET embedding = embedding_next,
+        embedding_model = p_model,
+        embedding_next = NULL,
+        embedding_next_model = NULL,
+        updated_at = NOW()
+    WHERE tenet_id = p_tenet_id
+      AND embedding_next_model = p_model;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    UPDATE tenets SET embedding_model = p_model WHERE id = p_tenet_id;
+
+    UPDATE embedding_reindex_jobs
+    SET status = 'switched', finished_at = NOW(), updated_at = NOW()
+    WHERE tenet_id = p_tenet_id AND target_model = p_model;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Busca semântica filtrando pelo modelo do embedding da query
+-- (remove a assinatura anterior para evitar ambiguidade no RPC)
+DROP FUNCTION IF EXISTS search_knowledge_base(UUID, vector, INT, VARCHAR);
+
+CREATE OR REPLACE FUNCTION search_knowledge_base(
+    p_tenet_id UUID,
+    p_query_embedding vector(768),
+    p_limit INT DEFAULT 5,
+    p_categoria VARCHAR DEFAULT NULL,
+    p_embedding_model VARCHAR DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    titulo VARCHAR,
+    conteudo TEXT,
+    categoria VARCHAR,
+    similarity FLOAT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        kb.id,
+        kb.titulo,
+        kb.conteudo,
+        kb.categoria,
+        1 - (kb.embedding <=> p_query_embedding) as similarity
+    FROM knowledge_base kb
+    WHERE kb.tenet_id = p_tenet_id
+      AND kb.ativo = true
+      AND (p_categoria IS NULL OR kb.categoria = p_categoria)
+      AND (p_embedding_model IS NULL OR kb.embedding_model = p_embedding_model)
+    ORDER BY kb.embedding <=> p_query_embedding
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON COLUMN knowledge_base.embedding_next IS 'Coluna sombra preenchida pelo re-index antes da troca de modelo';
@@ -0,0 +1,51 @@
+-- Migration: Outbox de sincronização com CRMs
+-- Versão: 009
+-- Descrição: Fila durável de envios de leads para CRMs, processada por um
+-- dispatcher em background com retentativas e backoff exponencial
+
+CREATE TABLE IF NOT EXISTS crm_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID NOT NULL,
+    conversa_id VARCHAR(100),
+    crm_type VARCHAR(50) NOT NULL,
+    lead_phone VARCHAR(50),
+    lead_data JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'sent', 'failed')),
+    attempts INT DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_crm_outbox_due ON crm_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_crm_outbox_tenet ON crm_outbox(tenet_id, created_at DESC);
+
+-- Reserva um lote de envios vencidos. SKIP LOCKED permite vários
+-- dispatchers (workers) sem processar o mesmo item duas vezes.
+-- Itens presos em 'processing' (worker morto) voltam após p_lease_seconds.
+CREATE OR REPLACE FUNCTION claim_crm_outbox(
+    p_limit INT DEFAULT 50,
+    p_lease_seconds INT DEFAULT 300
+)
+RETURNS SETOF crm_outbox AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE crm_outbox o
+    SET status = 'processing',
+        updated_at = NOW(),
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM crm_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= NOW())
+           OR (status = 'processing' AND next_attempt_at <= NOW())
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE crm_outbox IS 'Fila durável de envios de leads para CRMs';
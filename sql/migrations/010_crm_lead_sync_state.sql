@@ -0,0 +1,19 @@
+-- Migration: Estado de sincronização de leads com CRMs
+-- Versão: 010
+-- Descrição: Guarda o hash dos últimos dados enviados e os IDs remotos de
+-- cada lead por CRM, para só sincronizar mudanças e atualizar o registro existente
+
+CREATE TABLE IF NOT EXISTS crm_lead_sync_state (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID NOT NULL,
+    crm_type VARCHAR(50) NOT NULL,
+    lead_phone VARCHAR(50) NOT NULL,
+    fields_hash VARCHAR(64) NOT NULL,
+    remote_ids JSONB DEFAULT '{}',
+    synced_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(tenet_id, crm_type, lead_phone)
+);
+
+CREATE INDEX IF NOT EXISTS idx_crm_sync_state_lead ON crm_lead_sync_state(tenet_id, lead_phone);
+
+COMMENT ON COLUMN crm_lead_sync_state.remote_ids IS 'IDs do registro no CRM (ex.: person_id/deal_id no Pipedrive, page_id no Notion)';
@@ -0,0 +1,10 @@
+-- Migration: Horário comercial e fuso por tenant
+-- Versão: 011
+-- Descrição: Usados pelo cálculo de disponibilidade da agenda (FreeBusy)
+
+-- Formato: {"0": [["08:00", "12:00"], ["13:00", "18:00"]], ...} (0 = segunda ... 6 = domingo)
+-- NULL = todos os dias, 08:00–18:00
+ALTER TABLE tenets ADD COLUMN IF NOT EXISTS business_hours JSONB;
+ALTER TABLE tenets ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) DEFAULT 'America/Sao_Paulo';
+
+COMMENT ON COLUMN tenets.business_hours IS 'Janelas de atendimento por dia da semana (0 = segunda)';
@@ -0,0 +1,44 @@
+-- Migration: Outbox de notificações por email
+-- Versão: 012
+-- Descrição: Fila de emails processada em background, para que o webhook
+-- não espere o envio SMTP
+
+CREATE TABLE IF NOT EXISTS notificacoes_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID NOT NULL,
+    tipo VARCHAR(50) NOT NULL,
+    destinatario VARCHAR(255) NOT NULL,
+    assunto VARCHAR(500) NOT NULL,
+    corpo_html TEXT NOT NULL,
+    lead_phone VARCHAR(50),
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'sent', 'failed')),
+    attempts INT DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_notificacoes_outbox_due ON notificacoes_outbox(status, next_attempt_at);
+
+-- Reserva um lote de emails vencidos (mesmo padrão de claim_crm_outbox)
+CREATE OR REPLACE FUNCTION claim_notificacoes_outbox(
+    p_limit INT DEFAULT 50,
+    p_lease_seconds INT DEFAULT 300
+)
+RETURNS SETOF notificacoes_outbox AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE notificacoes_outbox o
+    SET status = 'processing',
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM notificacoes_outbox
+        WHERE status IN ('pending', 'processing') AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
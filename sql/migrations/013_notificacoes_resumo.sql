@@ -0,0 +1,22 @@
+-- Migration: Resumo periódico de notificações
+-- Versão: 013
+-- Descrição: Eventos de lead acumulados para o resumo (por hora ou por dia)
+-- em vez de um email por evento
+
+ALTER TABLE notificacoes_config
+    ADD COLUMN IF NOT EXISTS frequencia_resumo VARCHAR(10) DEFAULT 'diario'
+        CHECK (frequencia_resumo IN ('horario', 'diario')),
+    ADD COLUMN IF NOT EXISTS resumo_enviado_em TIMESTAMP WITH TIME ZONE;
+
+CREATE TABLE IF NOT EXISTS notificacoes_eventos (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID NOT NULL,
+    tipo VARCHAR(50) NOT NULL,
+    lead_phone VARCHAR(50),
+    lead_data JSONB DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    resumido_em TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_notificacoes_eventos_pendentes
+    ON notificacoes_eventos(tenet_id, created_at) WHERE resumido_em IS NULL;
@@ -0,0 +1,10 @@
+-- Migration: Branding e versão texto dos emails
+-- Versão: 014
+-- Descrição: Personalização visual dos emails por agência e corpo em texto
+-- puro no outbox (multipart/alternative)
+
+ALTER TABLE notificacoes_config
+    ADD COLUMN IF NOT EXISTS branding JSONB DEFAULT '{}';
+
+ALTER TABLE notificacoes_outbox
+    ADD COLUMN IF NOT EXISTS corpo_texto TEXT;
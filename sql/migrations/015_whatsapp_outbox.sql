@@ -0,0 +1,49 @@
+-- Migration: Fila de envio de mensagens WhatsApp
+-- Versão: 015
+-- Descrição: Mensagens de saída enfileiradas por instância Evolution /
+-- phone_number_id Meta, com cadência controlada, retentativas e status de entrega
+
+CREATE TABLE IF NOT EXISTS whatsapp_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenet_id UUID,
+    channel VARCHAR(20) NOT NULL CHECK (channel IN ('evolution', 'meta')),
+    sender_id VARCHAR(255) NOT NULL,
+    recipient VARCHAR(50) NOT NULL,
+    message TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending'
+        CHECK (status IN ('pending', 'processing', 'sent', 'delivered', 'read', 'failed')),
+    attempts INT DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_error TEXT,
+    provider_message_id VARCHAR(255),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    sent_at TIMESTAMP WITH TIME ZONE,
+    delivered_at TIMESTAMP WITH TIME ZONE,
+    read_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_due ON whatsapp_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_provider_id ON whatsapp_outbox(provider_message_id);
+
+-- Reserva um lote de mensagens vencidas, na ordem de criação, para que
+-- cada remetente envie na mesma ordem em que as respostas foram geradas
+CREATE OR REPLACE FUNCTION claim_whatsapp_outbox(
+    p_limit INT DEFAULT 100,
+    p_lease_seconds INT DEFAULT 120
+)
+RETURNS SETOF whatsapp_outbox AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE whatsapp_outbox o
+    SET status = 'processing',
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM whatsapp_outbox
+        WHERE status IN ('pending', 'processing') AND next_attempt_at <= NOW()
+        ORDER BY created_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,7 @@
+-- Migration: Peso dos planos na fila de geração com IA
+-- Versão: 016
+-- Descrição: features.ai_weight define a fatia de concorrência do Gemini de cada plano (fila justa ponderada)
+
+UPDATE plans SET features = COALESCE(features, '{}'::jsonb) || '{"ai_weight": 1}'::jsonb WHERE name IN ('trial', 'starter');
+UPDATE plans SET features = COALESCE(features, '{}'::jsonb) || '{"ai_weight": 2}'::jsonb WHERE name = 'professional';
+UPDATE plans SET features = COALESCE(features, '{}'::jsonb) || '{"ai_weight": 4}'::jsonb WHERE name = 'tenet';
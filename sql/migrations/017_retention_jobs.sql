@@ -0,0 +1,27 @@
+-- Migration: Checkpoints dos jobs de retenção de dados
+-- Versão: 017
+-- Descrição: Progresso de cada política de retenção (cursor keyset), para que
+-- execuções interrompidas ou limitadas por lotes sejam retomadas
+
+CREATE TABLE IF NOT EXISTS retention_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    policy VARCHAR(50) NOT NULL UNIQUE,
+    status VARCHAR(20) DEFAULT 'running' CHECK (status IN ('running', 'failed', 'done')),
+    cutoff_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_value TEXT,
+    last_id TEXT,
+    processed INT DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Índices para a paginação keyset (coluna de data, id) de cada política
+CREATE INDEX IF NOT EXISTS idx_conversas_updated_at_id ON conversas(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_mensagens_created_at_id ON mensagens(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_leads_updated_at_id ON leads(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at_id ON audit_logs(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_lgpd_deletion_requests_requested_at_id ON lgpd_deletion_requests(requested_at, id);
+
+COMMENT ON TABLE retention_jobs IS 'Checkpoint por política do job de retenção (DataRetentionService)';
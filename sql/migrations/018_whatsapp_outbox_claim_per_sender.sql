@@ -0,0 +1,41 @@
+-- Migration: Reserva do whatsapp_outbox limitada por remetente
+-- Versão: 018
+-- Descrição: Cada remetente envia no máximo p_per_sender mensagens por ciclo,
+-- para que a reserva (p_lease_seconds) cubra o tempo real de envio com a
+-- cadência e a digitação simulada, sem que outro worker reenvie o lote
+
+DROP FUNCTION IF EXISTS claim_whatsapp_outbox(INT, INT);
+
+CREATE OR REPLACE FUNCTION claim_whatsapp_outbox(
+    p_limit INT DEFAULT 100,
+    p_lease_seconds INT DEFAULT 600,
+    p_per_sender INT DEFAULT 10
+)
+RETURNS SETOF whatsapp_outbox AS $$
+BEGIN
+    RETURN QUERY
+    WITH due AS (
+        -- Janela limitada de candidatas vencidas, na ordem de criação
+        SELECT id, channel, sender_id, created_at FROM whatsapp_outbox
+        WHERE status IN ('pending', 'processing') AND next_attempt_at <= NOW()
+        ORDER BY created_at
+        LIMIT p_limit * 5
+        FOR UPDATE SKIP LOCKED
+    ),
+    ranked AS (
+        SELECT id, created_at,
+               row_number() OVER (PARTITION BY channel, sender_id ORDER BY created_at) AS position
+        FROM due
+    )
+    UPDATE whatsapp_outbox o
+    SET status = 'processing',
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM ranked
+        WHERE position <= p_per_sender
+        ORDER BY created_at
+        LIMIT p_limit
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,98 @@
+import json
+import os
+from unittest.mock import MagicMock
+from app.config import settings
+from app.services.audit_service import AuditLogWriter
+
+
+def _writer(tmp_path, fail=False):
+    supabase = MagicMock()
+    if fail:
+        supabase.table.return_value.insert.return_value.execute.side_effect = RuntimeError("db offline")
+    return AuditLogWriter(supabase, spool_dir=str(tmp_path))
+
+
+def _reject_row(writer, details, offline=False):
+    """Banco recusa qualquer lote com a linha `details`; offline derruba também o select."""
+    def insert(rows):
+        query = MagicMock()
+        if offline or any(row["details"] == details for row in rows):
+            query.execute.side_effect = RuntimeError("violates check constraint")
+        return query
+
+    writer.supabase.table.return_value.insert.side_effect = insert
+    if offline:
+        writer.supabase.table.return_value.select.side_effect = RuntimeError("db offline")
+
+
+def _spooled_writer(tmp_path, monkeypatch, events):
+    monkeypatch.setattr(settings, "AUDIT_MAX_BUFFERED", 0)
+    monkeypatch.setattr(settings, "AUDIT_REPLAY_MAX_FAILURES", 2)
+    writer = _writer(tmp_path)
+    for i in range(events):
+        writer.enqueue({"action": "lead.export", "details": {"n": i}})
+    return writer
+
+
+def _inserted(writer):
+    return [c[0][0] for c in writer.supabase.table.return_value.insert.call_args_list]
+
+
+def test_events_are_flushed_in_bulk_inserts(tmp_path, monkeypatch):
+    """Eventos em buffer viram inserts em lote, com details serializado"""
+    monkeypatch.setattr(settings, "AUDIT_BATCH_SIZE", 2)
+    writer = _writer(tmp_path)
+
+    for i in range(3):
+        writer.enqueue({"action": "auth.login.success", "details": {"n": i}})
+    assert writer.flush() == 3
+
+    batches = _inserted(writer)
+    assert [len(b) for b in batches] == [2, 1]
+    assert batches[0][1]["details"] == '{"n": 1}'
+
+
+def test_overflow_and_failed_batches_are_spooled_and_replayed(tmp_path, monkeypatch):
+    """Acima do limite ou com o banco fora, os eventos vão para o disco e voltam depois"""
+    monkeypatch.setattr(settings, "AUDIT_MAX_BUFFERED", 2)
+    writer = _writer(tmp_path, fail=True)
+
+    for i in range(3):
+        writer.enqueue({"action": "lead.export", "details": {"n": i}})
+    assert os.path.exists(writer.spool_path)  # o terceiro excedeu o buffer
+    assert writer.flush() == 0
+
+    writer.supabase.table.return_value.insert.reset_mock()
+    writer.supabase.table.return_value.insert.return_value.execute.side_effect = None
+    assert writer.flush() == 3
+    assert sorted(row["details"] for batch in _inserted(writer) for row in batch) == \
+        ['{"n": 0}', '{"n": 1}', '{"n": 2}']
+    assert os.listdir(tmp_path) == []
+
+
+def test_rejected_row_is_isolated_in_dead_letter(tmp_path, monkeypatch):
+    """Lote recusado repetidamente é dividido: o resto é gravado e a linha ruim sai do spool"""
+    writer = _spooled_writer(tmp_path, monkeypatch, 4)
+    _reject_row(writer, '{"n": 2}')
+
+    assert writer.flush() == 0
+    assert writer.flush() == 3
+    assert writer.flush() == 0
+
+    with open(writer.dead_letter_path, encoding="utf-8") as dead_letter:
+        assert [json.loads(line)["details"] for line in dead_letter] == [{"n": 2}]
+    assert os.listdir(tmp_path) == ["dead-letter"]
+
+
+def test_outage_does_not_dead_letter_rows(tmp_path, monkeypatch):
+    """Com o banco fora do ar nenhuma linha vai para o dead-letter"""
+    writer = _spooled_writer(tmp_path, monkeypatch, 4)
+    _reject_row(writer, None, offline=True)
+
+    for _ in range(3):
+        assert writer.flush() == 0
+
+    assert not os.path.exists(writer.dead_letter_path)
+    [spool] = os.listdir(tmp_path)
+    with open(tmp_path / spool, encoding="utf-8") as pending:
+        assert len(pending.readlines()) == 4
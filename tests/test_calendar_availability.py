@@ -0,0 +1,75 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+from app.config import settings
+from app.services import google_calendar_service as calendar_module
+from app.services.google_calendar_service import (
+    GoogleCalendarService, merge_intervals, business_windows, compute_free_slots
+)
+
+TZ = ZoneInfo("America/Sao_Paulo")
+
+
+def _at(hour, minute=0, day=5):
+    return datetime(2030, 8, day, hour, minute, tzinfo=TZ)
+
+
+def test_merge_overlapping_intervals():
+    """Intervalos sobrepostos ou contíguos viram um só"""
+    merged = merge_intervals([(_at(10), _at(11)), (_at(9), _at(10)), (_at(10, 30), _at(12)), (_at(14), _at(15))])
+    assert merged == [(_at(9), _at(12)), (_at(14), _at(15))]
+
+
+def test_free_slots_skip_busy_periods():
+    """Slots de 60 min em passos de 30 min evitam horários ocupados"""
+    windows = [(_at(8), _at(12))]
+    slots = compute_free_slots(windows, [(_at(9), _at(10, 15))], duration_minutes=60)
+    assert [(s.strftime("%H:%M"), e.strftime("%H:%M")) for s, e in slots] == [
+        ("08:00", "09:00"), ("10:30", "11:30"), ("11:00", "12:00")
+    ]
+
+
+def test_business_windows_follow_tenant_hours():
+    """Janelas respeitam o horário comercial por dia da semana"""
+    hours = {"0": [["08:00", "12:00"], ["13:00", "17:00"]]}  # só segunda
+    windows = business_windows(date(2030, 8, 5), 7, hours, TZ)  # 05/08/2030 é segunda
+    assert windows == [(_at(8), _at(12)), (_at(13), _at(17))]
+
+
+@pytest.mark.asyncio
+async def test_availability_uses_single_freebusy_call_and_cache(monkeypatch):
+    """Vários dias em uma consulta FreeBusy, com cache para a repetição"""
+    service = MagicMock()
+    service.freebusy.return_value.query.return_value.execute.return_value = {
+        "calendars": {"primary": {"busy": [{"start": "2030-08-05T12:00:00Z", "end": "2030-08-05T20:00:00Z"}]}}
+    }
+    monkeypatch.setattr(calendar_module.google_credentials, "get_calendar_client", lambda tenet_id: service)
+
+    calendar = GoogleCalendarService()
+    monkeypatch.setattr(calendar, "_get_schedule_settings",
+                        lambda tenet_id: ({str(d): [["08:00", "18:00"]] for d in range(7)}, TZ))
+
+    availability = await calendar.get_availability("tenet-1", date(2030, 8, 5), days=3)
+    again = await calendar.get_availability("tenet-1", date(2030, 8, 5), days=3)
+
+    assert service.freebusy.return_value.query.call_count == 1
+    assert again is availability
+    # 12:00–20:00 UTC = 09:00–17:00 em São Paulo
+    assert [s["start"] for s in availability["2030-08-05"]] == ["08:00", "17:00"]
+    assert len(availability["2030-08-06"]) == 19
+
+
+def test_availability_cache_evicts_expired_and_oldest_entries(monkeypatch):
+    """O cache descarta entradas expiradas e respeita o tamanho máximo ao gravar"""
+    monkeypatch.setattr(settings, "AVAILABILITY_CACHE_MAX_ENTRIES", 3)
+    monkeypatch.setattr(settings, "AVAILABILITY_CACHE_TTL", 60.0)
+    calendar = GoogleCalendarService()
+
+    for i in range(5):
+        calendar._store_availability(("tenet", i), {})
+    assert list(calendar._availability_cache) == [("tenet", 2), ("tenet", 3), ("tenet", 4)]
+
+    monkeypatch.setattr(settings, "AVAILABILITY_CACHE_TTL", 0.0)
+    calendar._store_availability(("tenet", 5), {})
+    assert list(calendar._availability_cache) == []
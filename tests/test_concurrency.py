@@ -0,0 +1,114 @@
+import asyncio
+import time
+import pytest
+from app.utils.concurrency import run_in_thread, with_timeout
+from app.utils.http_client import close_http_clients, get_http_client
+
+
+async def _blocking_stage(value, delay):
+    """Simula serviço async que faz I/O bloqueante (cliente Supabase síncrono)"""
+    time.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_stages_run_concurrently():
+    """Etapas bloqueantes executam em paralelo quando rodam em threads"""
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        with_timeout(run_in_thread(_blocking_stage, "history", 0.2), 2, None, "history"),
+        with_timeout(run_in_thread(_blocking_stage, "quota", 0.2), 2, None, "quota"),
+        with_timeout(run_in_thread(_blocking_stage, "rag", 0.2), 2, None, "rag"),
+    )
+    assert results == ["history", "quota", "rag"]
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_stage_timeout_returns_default():
+    """Etapa lenta degrada para o valor padrão"""
+    result = await with_timeout(run_in_thread(_blocking_stage, "rag", 0.5), 0.05, "", "rag")
+    assert result == ""
+
+
+@pytest.mark.asyncio
+async def test_stage_error_returns_default():
+    """Erro na etapa não derruba o webhook"""
+    async def failing():
+        raise RuntimeError("falha")
+
+    result = await with_timeout(failing(), 1, {"allowed": True}, "quota")
+    assert result == {"allowed": True}
+
+
+async def _client_for_host():
+    return get_http_client("https://api.exemplo.com/v1")
+
+
+@pytest.mark.asyncio
+async def test_thread_loops_reuse_pooled_clients():
+    """run_in_thread mantém o loop da thread: o cliente em pool é reaproveitado"""
+    clients = {await run_in_thread(_client_for_host) for _ in range(20)}
+    # No máximo um cliente por thread do executor, nunca um por chamada
+    assert len(clients) < 20
+    assert not any(c.is_closed for c in clients)
+
+
+@pytest.mark.asyncio
+async def test_clients_of_closed_loops_are_closed():
+    """Cliente de um loop encerrado é fechado (não só descartado) no próximo uso"""
+    stale = await asyncio.to_thread(asyncio.run, _client_for_host())
+    get_http_client("https://api.exemplo.com/v1")
+    await asyncio.sleep(0)
+    assert stale.is_closed
+
+
+@pytest.mark.asyncio
+async def test_stop_workers_runs_in_parallel_off_the_loop():
+    """Os workers são parados juntos, sem travar o event loop"""
+    from app.utils.background import BackgroundWorker, stop_workers
+
+    class SlowStop(BackgroundWorker):
+        async def run_once(self):
+            pass
+
+        async def on_stop(self):
+            await asyncio.sleep(0.3)
+
+    workers = [SlowStop(interval=60) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    start = time.monotonic()
+    await stop_workers(workers, timeout=5)
+    elapsed = time.monotonic() - start
+    task.cancel()
+
+    assert not any(worker.running for worker in workers)
+    assert elapsed < 1.0
+    assert ticks > 5
+
+
+@pytest.mark.asyncio
+async def test_http_client_is_shared_per_configuration():
+    """Mesmo host com outro timeout ou limite não herda a configuração do primeiro"""
+    import httpx
+
+    default = get_http_client("https://api.example.com/a")
+    assert get_http_client("https://api.example.com/b") is default
+
+    slow = get_http_client("https://api.example.com/c", timeout=90.0)
+    limited = get_http_client("https://api.example.com/d", limits=httpx.Limits(max_connections=2))
+    assert slow is not default and slow.timeout.read == 90.0
+    assert limited is not default and limited is not slow
+    assert get_http_client("https://api.example.com/e", timeout=90.0) is slow
+    await close_http_clients()
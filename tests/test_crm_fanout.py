@@ -0,0 +1,61 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.config import settings
+from app.services.crm_service import CRMService, BaseCRMIntegration
+from app.utils.http_client import get_http_client
+
+
+class _SlowCRM(BaseCRMIntegration):
+    delay = 0.2
+
+    async def send_lead(self, lead_data):
+        await asyncio.sleep(self.delay)
+        return {"success": True, "response": {"ok": True}}
+
+    async def test_connection(self):
+        return True
+
+
+class _HangingCRM(_SlowCRM):
+    delay = 5
+
+
+def _service(integrations):
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.eq.return_value.execute.return_value.data = integrations
+    service = CRMService(supabase)
+    service.CRM_CLASSES = {"a": _SlowCRM, "b": _SlowCRM, "c": _SlowCRM, "hang": _HangingCRM}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_crms_are_sent_concurrently():
+    """Envio para vários CRMs ocorre em paralelo"""
+    service = _service([{"crm_type": "a"}, {"crm_type": "b"}, {"crm_type": "c"}])
+    start = time.perf_counter()
+    result = await service.send_lead_to_crms("tenet-1", "conversa-1", {"phone": "5511999999999"})
+    assert result["sent"] == 3
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_slow_crm_times_out_without_blocking_others(monkeypatch):
+    """Um CRM travado expira sem impedir o envio aos demais"""
+    monkeypatch.setattr(settings, "CRM_PROVIDER_TIMEOUT", 0.3)
+    service = _service([{"crm_type": "hang"}, {"crm_type": "a"}])
+    result = await service.send_lead_to_crms("tenet-1", "conversa-1", {"phone": "5511999999999"})
+    by_crm = {r["crm"]: r for r in result["results"]}
+    assert by_crm["a"]["success"] is True
+    assert by_crm["hang"]["success"] is False
+
+
+@pytest.mark.asyncio
+async def test_http_client_is_shared_per_host():
+    """Mesmo host reutiliza o cliente; hosts diferentes têm pools separados"""
+    first = get_http_client("https://api.pipedrive.com/v1/persons")
+    second = get_http_client("https://api.pipedrive.com/v1/deals")
+    other = get_http_client("https://api.notion.com/v1/pages")
+    assert first is second
+    assert first is not other
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from unittest.mock import MagicMock
+from app.config import settings
+from app.services.crm_service import ZohoIntegration
+from app.services.crm_outbox_service import CRMOutboxDispatcher, backoff_delay
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    """Backoff exponencial com jitter respeita o teto configurado"""
+    monkeypatch.setattr(settings, "CRM_OUTBOX_BACKOFF_BASE", 5.0)
+    monkeypatch.setattr(settings, "CRM_OUTBOX_BACKOFF_MAX", 60.0)
+    assert 2.5 <= backoff_delay(1) <= 5.0
+    assert 10.0 <= backoff_delay(3) <= 20.0
+    assert 30.0 <= backoff_delay(20) <= 60.0
+
+
+def test_retry_marks_failed_after_max_attempts(monkeypatch):
+    """Após o limite de tentativas o envio vai para 'failed'"""
+    monkeypatch.setattr(settings, "CRM_OUTBOX_MAX_ATTEMPTS", 3)
+    supabase = MagicMock()
+    dispatcher = CRMOutboxDispatcher(supabase)
+
+    dispatcher._schedule_retry({"id": "1", "crm_type": "zoho", "attempts": 0}, "HTTP 503")
+    pending = supabase.table.return_value.update.call_args[0][0]
+    assert pending["status"] == "pending"
+    assert pending["attempts"] == 1
+
+    dispatcher._schedule_retry({"id": "1", "crm_type": "zoho", "attempts": 2}, "HTTP 503")
+    failed = supabase.table.return_value.update.call_args[0][0]
+    assert failed["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_zoho_sends_leads_in_single_request(monkeypatch):
+    """Zoho recebe vários leads em uma única requisição `data: [...]`"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(201, json={"data": [
+            {"status": "success", "details": {"id": "1"}},
+            {"status": "error", "message": "INVALID_DATA"},
+        ]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    integration = ZohoIntegration({"api_token_encrypted": "", "extra_config": {}})
+    monkeypatch.setattr(integration, "get_client", lambda url: client)
+    monkeypatch.setattr(integration.encryption, "decrypt", lambda value: "token")
+
+    results = await integration.send_leads_batch([
+        {"nome": "Ana", "phone": "5511999990001"},
+        {"nome": "Bruno", "phone": "5511999990002"},
+    ])
+
+    assert len(requests) == 1
+    assert [r["success"] for r in results] == [True, False]
+    assert results[1]["error"] == "INVALID_DATA"
@@ -0,0 +1,59 @@
+import httpx
+import pytest
+from unittest.mock import MagicMock
+from app.services.crm_service import CRMService, PipedriveIntegration, lead_fields_hash
+
+LEAD = {"phone": "5511999990001", "nome": "Ana", "email": "ana@empresa.com"}
+
+
+def _supabase(tables):
+    """Cliente fake: cada tabela devolve sempre os mesmos registros"""
+    supabase = MagicMock()
+
+    def table(name):
+        query = MagicMock()
+        query.select.return_value = query
+        query.eq.return_value = query
+        query.execute.return_value.data = tables.get(name, [])
+        return query
+
+    supabase.table.side_effect = table
+    return supabase
+
+
+def test_hash_ignores_irrelevant_differences():
+    """Hash só muda quando os campos sincronizados mudam"""
+    assert lead_fields_hash(LEAD) == lead_fields_hash({**LEAD, "email": " ana@empresa.com ", "score": 9})
+    assert lead_fields_hash(LEAD) != lead_fields_hash({**LEAD, "empresa": "ACME"})
+
+
+@pytest.mark.asyncio
+async def test_unchanged_lead_is_not_enqueued():
+    """Lead sem mudanças desde o último envio não gera item no outbox"""
+    supabase = _supabase({
+        "integracoes_crm": [{"crm_type": "pipedrive"}, {"crm_type": "notion"}],
+        "crm_lead_sync_state": [{"crm_type": "pipedrive", "fields_hash": lead_fields_hash(LEAD), "remote_ids": {}}],
+    })
+    queued = await CRMService(supabase).enqueue_lead("tenet-1", "conversa-1", LEAD)
+    assert queued == 1
+
+
+@pytest.mark.asyncio
+async def test_pipedrive_updates_existing_person(monkeypatch):
+    """Com IDs remotos conhecidos o Pipedrive recebe PUT em vez de criar registros"""
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        return httpx.Response(200, json={"data": {"id": 10}})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    integration = PipedriveIntegration({"api_key_encrypted": "", "extra_config": {}})
+    monkeypatch.setattr(integration, "get_client", lambda url: client)
+    monkeypatch.setattr(integration.encryption, "decrypt", lambda value: "token")
+
+    result = await integration.upsert_lead(LEAD, {"person_id": 10, "deal_id": 20})
+
+    assert result["success"] is True
+    assert requests == [("PUT", "/v1/persons/10"), ("PUT", "/v1/deals/20")]
+    assert result["remote_ids"] == {"person_id": 10, "deal_id": 20}
@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.config import settings
+from app.services import data_retention_service as retention_module
+from app.services.data_retention_service import DataRetentionService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Serviço com checkpoints em memória e as linhas vencidas de uma lista."""
+    monkeypatch.setattr(settings, "RETENTION_BATCH_DELAY", 0.0)
+    monkeypatch.setattr(retention_module, "audit_service", MagicMock(log=AsyncMock()))
+    instance = DataRetentionService(MagicMock())
+    instance.checkpoints = {}
+    instance.rows = [{"id": f"c{i}", "updated_at": f"2020-01-0{i}T00:00:00+00:00"} for i in range(1, 6)]
+    instance.cursors = []
+
+    def fetch_page(job, cutoff, after, batch_size):
+        instance.cursors.append(after)
+        pending = [r for r in instance.rows if after is None or (r["updated_at"], r["id"]) > after]
+        return pending[:batch_size]
+
+    def save_checkpoint(policy, **fields):
+        instance.checkpoints[policy] = {**instance.checkpoints.get(policy, {}), **fields}
+
+    monkeypatch.setattr(instance, "_fetch_page", fetch_page)
+    monkeypatch.setattr(instance, "_load_checkpoint", lambda policy: instance.checkpoints.get(policy))
+    monkeypatch.setattr(instance, "_save_checkpoint", save_checkpoint)
+    return instance
+
+
+def _deleted_ids(service, table):
+    """ids de cada delete().in_() na tabela (só _apply usa o cliente no fixture)."""
+    tables = [c[0][0] for c in service.supabase.table.call_args_list]
+    deletes = service.supabase.table.return_value.delete.return_value.in_.call_args_list
+    return [c[0][1] for name, c in zip(tables, deletes) if name == table]
+
+
+@pytest.mark.asyncio
+async def test_policy_runs_in_batches_and_resumes_from_checkpoint(service):
+    """Cada lote apaga no máximo batch_size ids; a execução limitada é retomada do cursor"""
+    first = await service.enforce_policy("conversas", dry_run=False, batch_size=2, max_batches=1)
+    assert (first["status"], first["processed"]) == ("partial", 2)
+    assert service.checkpoints["conversas"]["last_id"] == "c2"
+
+    second = await service.enforce_policy("conversas", dry_run=False, batch_size=2, max_batches=0)
+    assert (second["status"], second["processed"]) == ("done", 5)
+    assert second["cutoff_date"] == first["cutoff_date"]
+    assert service.cursors[1] == ("2020-01-02T00:00:00+00:00", "c2")
+    assert _deleted_ids(service, "conversas") == [["c1", "c2"], ["c3", "c4"], ["c5"]]
+    assert _deleted_ids(service, "mensagens") == [["c1", "c2"], ["c3", "c4"], ["c5"]]
+
+
+@pytest.mark.asyncio
+async def test_policies_without_table_are_skipped_and_dry_run_only_counts(service):
+    """Política sem tabela é informada; dry run não altera dados nem checkpoints"""
+    service.supabase.table.return_value.select.return_value.lt.return_value.limit.return_value \
+        .execute.return_value.count = 42
+
+    results = {r["policy"]: r for r in await service.run_full_cleanup(dry_run=True)}
+
+    assert results["tokens_expirados"]["skipped"] is True
+    # Mensagens só saem com a conversa vencida, não por idade própria
+    assert results["mensagens"]["skipped"] is True
+    assert results["audit_logs"]["found"] == 42
+    assert service.checkpoints == {}
+    service.supabase.table.return_value.delete.assert_not_called()
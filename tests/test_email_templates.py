@@ -0,0 +1,40 @@
+from app.services.notification_service import NotificationService
+from app.utils.email_templates import resolve_branding
+
+
+def test_lead_email_escapes_data_and_has_text_part():
+    """Dados do lead são escapados no HTML e a versão texto é gerada"""
+    service = NotificationService(supabase_client=None)
+
+    html, text = service._build_body({"nome": "<img src=x onerror=alert(1)>", "phone": "5511"}, "qualificado")
+
+    assert "<img src=x" not in html
+    assert "&lt;img src=x onerror=alert(1)&gt;" in html
+    assert "Nome: <img src=x onerror=alert(1)>" in text
+    assert "Telefone (WhatsApp): 5511" in text
+
+
+def test_branding_overrides_are_validated():
+    """Cores inválidas e logos sem https são ignorados"""
+    branding = resolve_branding({
+        "primary_color": "#112233",
+        "secondary_color": "red;} body {display:none",
+        "logo_url": "javascript:alert(1)",
+        "footer_text": "Agência X"
+    })
+
+    assert branding["primary_color"] == "#112233"
+    assert branding["secondary_color"] == "#8B5CF6"
+    assert branding["logo_url"] is None
+    assert branding["footer_text"] == "Agência X"
+
+
+def test_message_is_multipart_alternative():
+    """Email tem parte texto e parte HTML"""
+    service = NotificationService(supabase_client=None)
+    html, text = service._build_body({"nome": "Ana"}, "agendado")
+
+    msg = service._build_message({"smtp_user": "a@example.com"}, "b@example.com", "Assunto", html, text)
+
+    assert msg.get_content_type() == "multipart/alternative"
+    assert [part.get_content_type() for part in msg.get_payload()] == ["text/plain", "text/html"]
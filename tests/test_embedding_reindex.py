@@ -0,0 +1,202 @@
+import pytest
+from app.config import settings
+from app.services import embedding_reindex_service as reindex_module
+from app.services import embedding_service as embedding_module
+from app.services.embedding_reindex_service import EmbeddingReindexService
+from app.services.embedding_service import EMBEDDING_DIMENSIONS, EmbeddingService
+
+TARGET = "models/text-embedding-004"
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """Subconjunto do query builder do postgrest usado pelo job, sobre listas em memória."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.limit_n = None
+        self.payload = None
+
+    def select(self, *_):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda r: r.get(column) != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r[column] > value)
+        return self
+
+    def or_(self, _expr):
+        # embedding_next_model.is.null,embedding_next_model.neq.<alvo>
+        self.filters.append(lambda r: r.get("embedding_next_model") != TARGET)
+        return self
+
+    def order(self, _column):
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def upsert(self, data, on_conflict=None):
+        self.payload = data
+        return self
+
+    def execute(self):
+        rows = self.db.tables[self.table]
+        if self.payload is not None:
+            keys = ("tenet_id", "target_model")
+            existing = next((r for r in rows if all(r[k] == self.payload[k] for k in keys)), None)
+            if existing:
+                existing.update(self.payload)
+            else:
+                rows.append(dict(self.payload))
+            return _Result([self.payload])
+        matched = sorted((r for r in rows if all(f(r) for f in self.filters)), key=lambda r: r.get("id", ""))
+        return _Result([dict(r) for r in matched[:self.limit_n]])
+
+
+class _Rpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        return _Result(self.db.call(self.name, self.params))
+
+
+class FakeSupabase:
+    def __init__(self, docs):
+        self.tables = {"knowledge_base": docs, "embedding_reindex_jobs": [], "tenets": []}
+        self.rpc_calls = []
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        self.rpc_calls.append(name)
+        return _Rpc(self, name, params)
+
+    def call(self, name, params):
+        docs = self.tables["knowledge_base"]
+        if name == "set_knowledge_embedding_next":
+            by_id = {d["id"]: d for d in docs}
+            for row in params["p_rows"]:
+                by_id[row["id"]]["embedding_next_model"] = params["p_model"]
+            return len(params["p_rows"])
+        # switch_knowledge_embeddings: falha se houver documento sem o novo vetor
+        pending = [d for d in docs if d["embedding_model"] != params["p_model"]
+                   and d.get("embedding_next_model") != params["p_model"]]
+        if pending:
+            raise RuntimeError(f"{len(pending)} documentos ainda sem embedding do modelo")
+        for d in docs:
+            d["embedding_model"] = params["p_model"]
+        return len(docs)
+
+
+def _docs(n):
+    return [{"id": f"d{i:02d}", "tenet_id": "t1", "ativo": True, "titulo": f"Doc {i}",
+             "conteudo": "texto", "embedding_model": "models/embedding-001"} for i in range(n)]
+
+
+@pytest.fixture
+def embed(monkeypatch):
+    """Substitui o Gemini: registra os lotes e permite injetar falhas."""
+    monkeypatch.setattr(settings, "EMBEDDING_REINDEX_REQUESTS_PER_MINUTE", 10 ** 9)
+    calls = {"batches": [], "fail_on": set(), "empty_on": set(), "on_call": None}
+
+    async def generate(texts, model=None):
+        calls["batches"].append(len(texts))
+        if calls["on_call"]:
+            calls["on_call"](len(calls["batches"]))
+        if len(calls["batches"]) in calls["fail_on"]:
+            raise RuntimeError("quota exceeded")
+        if len(calls["batches"]) in calls["empty_on"]:
+            return None
+        return [[0.0] * EMBEDDING_DIMENSIONS for _ in texts]
+
+    monkeypatch.setattr(reindex_module.embedding_service, "generate_embeddings_batch", generate)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_failed_run_resumes_from_checkpoint(embed):
+    """Falha no meio salva o checkpoint; a nova execução continua da última página"""
+    db = FakeSupabase(_docs(6))
+    service = EmbeddingReindexService(db)
+    embed["fail_on"] = {3}
+
+    failed = await service.reindex_tenant("t1", TARGET, page_size=2, batch_size=1)
+    checkpoint = db.tables["embedding_reindex_jobs"][0]
+    assert failed["status"] == "failed"
+    assert (checkpoint["status"], checkpoint["last_id"], checkpoint["processed"]) == ("failed", "d01", 2)
+
+    embed["fail_on"] = set()
+    done = await service.reindex_tenant("t1", TARGET, page_size=2, batch_size=1)
+    assert (done["status"], done["processed"]) == ("switched", 6)
+    assert sum(embed["batches"]) == 7  # só o documento do lote que falhou foi repetido
+
+
+@pytest.mark.asyncio
+async def test_catch_up_pass_covers_rows_written_during_run(embed):
+    """Documento criado atrás do cursor durante o job entra na segunda passada"""
+    docs = _docs(4)
+    db = FakeSupabase(docs)
+
+    def add_doc(call):
+        if call == 2:
+            docs.append({**_docs(1)[0], "id": "d00a"})
+
+    embed["on_call"] = add_doc
+    result = await EmbeddingReindexService(db).reindex_tenant("t1", TARGET, page_size=2, batch_size=2)
+
+    assert result["status"] == "switched"
+    assert all(d["embedding_model"] == TARGET for d in docs)
+
+
+@pytest.mark.asyncio
+async def test_switch_only_after_full_coverage(embed):
+    """Lote sem vetores impede a troca de modelo; sem switch o job fica 'ready'"""
+    db = FakeSupabase(_docs(3))
+    embed["empty_on"] = set(range(2, 100))  # só o primeiro documento recebe vetor
+    failed = await EmbeddingReindexService(db).reindex_tenant("t1", TARGET, page_size=10, batch_size=1)
+    assert failed["status"] == "failed"
+    assert "switch_knowledge_embeddings" not in db.rpc_calls
+    assert {d["embedding_model"] for d in db.tables["knowledge_base"]} == {"models/embedding-001"}
+
+    embed["empty_on"] = set()
+    db = FakeSupabase(_docs(3))
+    ready = await EmbeddingReindexService(db).reindex_tenant("t1", TARGET, page_size=10, batch_size=2, switch=False)
+    assert (ready["status"], ready["processed"]) == ("ready", 3)
+    assert "switch_knowledge_embeddings" not in db.rpc_calls
+
+
+@pytest.mark.asyncio
+async def test_generate_embeddings_batch_truncates_and_handles_errors(monkeypatch):
+    """Textos longos são cortados em 8000 caracteres; erro da API retorna None"""
+    sent = {}
+
+    def embed_content(model, content, task_type):
+        sent["content"] = content
+        if len(content) > 2:
+            raise RuntimeError("too many requests")
+        return {"embedding": [[0.1] * EMBEDDING_DIMENSIONS for _ in content]}
+
+    monkeypatch.setattr(embedding_module.genai, "embed_content", embed_content)
+    service = EmbeddingService()
+
+    vectors = await service.generate_embeddings_batch(["a" * 9000, "b"], model=TARGET)
+    assert len(vectors) == 2
+    assert [len(t) for t in sent["content"]] == [8000, 1]
+    assert await service.generate_embeddings_batch(["a", "b", "c"]) is None
@@ -0,0 +1,86 @@
+import asyncio
+import httpx
+import pytest
+from app.config import settings
+from app.services.evolution_client import EvolutionAPIClient
+
+
+def _client(monkeypatch, handler):
+    monkeypatch.setattr(settings, "EVOLUTION_RETRY_BACKOFF_BASE", 0.0)
+    client = EvolutionAPIClient("http://evolution.local", "key")
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(client, "get_client", lambda: http)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_idempotent_request_is_retried(monkeypatch):
+    """GET com 503 é repetido até a resposta de sucesso"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 2 else 200, json={})
+
+    client = _client(monkeypatch, handler)
+    response = await client.request("GET", "/instance/connectionState/x", operation="status", instance_name="x")
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert calls[0].headers["apikey"] == "key"
+
+
+@pytest.mark.asyncio
+async def test_send_is_not_retried_after_server_response(monkeypatch):
+    """POST de envio não é repetido quando o servidor já respondeu"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = _client(monkeypatch, handler)
+    response = await client.request("POST", "/message/sendText/x", operation="send_text", instance_name="x", json={})
+
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_connection_failure_is_retried_for_send(monkeypatch):
+    """Falha de conexão é segura para repetir mesmo em POST"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("recusada", request=request)
+        return httpx.Response(201)
+
+    client = _client(monkeypatch, handler)
+    response = await client.request("POST", "/message/sendText/x", operation="send_text", instance_name="x", json={})
+
+    assert response.status_code == 201
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_per_instance(monkeypatch):
+    """Requisições simultâneas por instância respeitam o limite configurado"""
+    monkeypatch.setattr(settings, "EVOLUTION_MAX_CONCURRENCY_PER_INSTANCE", 2)
+    active, peak = 0, 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200)
+
+    client = _client(monkeypatch, handler)
+    await asyncio.gather(*[
+        client.request("GET", "/x", operation="status", instance_name="limitada") for _ in range(6)
+    ])
+
+    assert peak == 2
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from app.utils.fair_queue import FairQueue, QueueTimeout
+
+
+async def _hold(queue, key, weight, order, release):
+    await queue.acquire(key, weight)
+    order.append(key)
+    await release.wait()
+    queue.release()
+
+
+@pytest.mark.asyncio
+async def test_waiting_slots_follow_weights():
+    """Com fila, a vaga alterna entre tenants na proporção dos pesos"""
+    queue = FairQueue("test", capacity=1)
+    await queue.acquire("ocupado")
+
+    order = []
+    release = asyncio.Event()
+    release.set()
+    # Campanha do tenant "a" chega antes, mas "b" (peso 2) não espera a fila inteira
+    tasks = [asyncio.create_task(_hold(queue, "a", 1.0, order, release)) for _ in range(6)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(_hold(queue, "b", 2.0, order, release)) for _ in range(4)]
+    await asyncio.sleep(0)
+
+    queue.release()
+    await asyncio.gather(*tasks)
+
+    assert order[:6].count("b") >= 3
+    assert sorted(order) == ["a"] * 6 + ["b"] * 4
+
+
+@pytest.mark.asyncio
+async def test_idle_queue_uses_all_slots_and_timeout_frees_position():
+    """Sem disputa não há espera; quem excede o tempo máximo sai da fila"""
+    queue = FairQueue("test", capacity=2)
+    assert await queue.acquire("a") == 0.0
+    assert await queue.acquire("a") == 0.0
+
+    with pytest.raises(QueueTimeout):
+        await queue.acquire("b", timeout=0.01)
+
+    waiter = asyncio.create_task(queue.acquire("c", timeout=1.0))
+    await asyncio.sleep(0)
+    queue.release()
+    assert await waiter >= 0.0
+
+
+@pytest.mark.asyncio
+async def test_timeout_does_not_push_key_back_and_idle_queue_forgets_keys():
+    """Quem desiste não perde a vez nos pedidos seguintes; fila ociosa não acumula chaves"""
+    queue = FairQueue("test", capacity=1)
+    await queue.acquire("ocupado")
+    for _ in range(5):
+        with pytest.raises(QueueTimeout):
+            await queue.acquire("b", timeout=0.01)
+
+    order = []
+    release = asyncio.Event()
+    release.set()
+    tasks = [asyncio.create_task(_hold(queue, "b", 1.0, order, release))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(_hold(queue, "a", 1.0, order, release)))
+    await asyncio.sleep(0)
+    queue.release()
+    await asyncio.gather(*tasks)
+    assert order == ["b", "a"]
+
+    for i in range(100):
+        await queue.acquire(f"tenant-{i}")
+        queue.release()
+    assert queue._finish == {}
@@ -0,0 +1,99 @@
+import pytest
+from datetime import datetime, timedelta
+from google.oauth2.credentials import Credentials
+from app.services import google_credentials_service
+from app.services.google_credentials_service import GoogleCredentialsCache, _Entry, build_api_client
+
+
+class _FakeCredentials:
+    def __init__(self, expires_in):
+        self.token = "old"
+        self.refresh_token = "refresh"
+        self.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
+        self.refreshes = 0
+
+    @property
+    def expired(self):
+        return self.expiry <= datetime.utcnow()
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = "new"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def _cache_with(credentials, loads):
+    cache = GoogleCredentialsCache()
+    persisted = []
+
+    def loader(tenet_id):
+        loads.append(tenet_id)
+        return _Entry(credentials, persisted.append)
+
+    cache._load_calendar = loader
+    return cache, persisted
+
+
+def test_credentials_are_cached_per_tenant():
+    """Credenciais são lidas do banco uma vez e reaproveitadas"""
+    loads = []
+    cache, _ = _cache_with(_FakeCredentials(expires_in=3600), loads)
+    assert cache.get_credentials("calendar", "tenet-1") is cache.get_credentials("calendar", "tenet-1")
+    assert loads == ["tenet-1"]
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_renews_tokens_near_expiry():
+    """Token perto de expirar é renovado e persistido antes do uso"""
+    credentials = _FakeCredentials(expires_in=60)
+    cache, persisted = _cache_with(credentials, [])
+    cache.get_credentials("calendar", "tenet-1")
+
+    await cache.run_once()
+
+    assert credentials.refreshes == 1
+    assert credentials.token == "new"
+    assert persisted == [credentials]
+
+
+def test_discovery_document_is_loaded_once(monkeypatch):
+    """build_api_client reaproveita o documento de discovery já carregado"""
+    calls = []
+    original = google_credentials_service.discovery_cache.get_static_doc
+
+    def counting(name, version):
+        calls.append((name, version))
+        return original(name, version)
+
+    monkeypatch.setattr(google_credentials_service.discovery_cache, "get_static_doc", counting)
+    monkeypatch.setattr(google_credentials_service, "_discovery_docs", {})
+
+    credentials = Credentials(token="token")
+    first = build_api_client("calendar", "v3", credentials)
+    build_api_client("calendar", "v3", credentials)
+
+    assert calls == [("calendar", "v3")]
+    assert hasattr(first, "events")
+
+
+def test_calendar_client_is_built_per_call():
+    """Cada chamada recebe seu próprio Resource (httplib2 não é thread-safe)"""
+    cache, _ = _cache_with(Credentials(token="token"), [])
+    first = cache.get_calendar_client("tenet-1")
+    second = cache.get_calendar_client("tenet-1")
+    assert first is not second
+    assert first._http is not second._http
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_evicted_instead_of_refreshed(monkeypatch):
+    """Tenant sem uso além do TTL sai do cache e não é mais renovado"""
+    credentials = _FakeCredentials(expires_in=60)
+    cache, _ = _cache_with(credentials, [])
+    cache.get_credentials("calendar", "tenet-1")
+    monkeypatch.setattr(google_credentials_service.settings, "GOOGLE_CREDENTIALS_CACHE_TTL", 0.0)
+
+    await cache.run_once()
+
+    assert credentials.refreshes == 0
+    assert cache._entries == {}
@@ -0,0 +1,189 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.config import settings
+from app.services import message_pipeline as pipeline_module
+from app.services.message_pipeline import (
+    ChannelAdapter,
+    EvolutionAdapter,
+    IncomingMessage,
+    MessagePipeline,
+    MetaAdapter,
+    PipelineError,
+)
+
+
+class FakeAdapter(ChannelAdapter):
+    channel = "fake"
+
+    def __init__(self, messages, agency=None):
+        self.messages = messages
+        self.agency = agency or {"id": "t1", "nome": "Agência"}
+        self.sent = []
+
+    def normalize(self, payload):
+        return {"messages": self.messages, "statuses": [], "ignored": None}
+
+    async def resolve_tenet(self, agency_service, sender_id):
+        if self.agency == "missing":
+            raise PipelineError(404, "Agência não encontrada")
+        return self.agency
+
+    async def send(self, ctx, text):
+        self.sent.append((ctx.message.sender_phone, text))
+        return {"success": True}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Pipeline com as etapas externas (Supabase, IA, histórico) substituídas."""
+    monkeypatch.setattr(pipeline_module, "get_supabase_client", MagicMock())
+    monkeypatch.setattr(pipeline_module, "AgencyService", MagicMock())
+    conversation_service = MagicMock()
+    conversation_service.return_value.update_conversation_history = AsyncMock()
+    monkeypatch.setattr(pipeline_module, "ConversationService", conversation_service)
+
+    instance = MessagePipeline()
+
+    async def resolve(ctx):
+        if ctx.agency is None:
+            ctx.agency = await ctx.adapter.resolve_tenet(None, ctx.message.sender_id)
+
+    async def admit(ctx):
+        pass
+
+    async def generate(ctx):
+        if ctx.message.text == "boom":
+            raise RuntimeError("falha na IA")
+        ctx.ai_response = f"resposta: {ctx.message.text}"
+
+    async def side_effects(ctx):
+        pass
+
+    monkeypatch.setattr(instance, "_resolve_tenant", resolve)
+    monkeypatch.setattr(instance, "_admit_and_fetch_context", admit)
+    monkeypatch.setattr(instance, "_generate", generate)
+    monkeypatch.setattr(instance, "_side_effects", side_effects)
+    return instance
+
+
+def _message(text, message_id=None, phone="5511999999999"):
+    return IncomingMessage("fake", "sender-1", phone, text, message_id=message_id)
+
+
+def test_evolution_adapter_normalizes_messages_and_ignored_events():
+    """Evolution: mensagem de texto vira IncomingMessage; demais eventos têm motivo"""
+    adapter = EvolutionAdapter()
+    payload = {
+        "event": "messages.upsert",
+        "instance": "agencia-x",
+        "data": {
+            "key": {"remoteJid": "5511999999999@s.whatsapp.net", "id": "ABC"},
+            "pushName": "Ana",
+            "message": {"extendedTextMessage": {"text": "Oi"}}
+        }
+    }
+
+    result = adapter.normalize(payload)
+    message = result["messages"][0]
+    assert (message.sender_id, message.sender_phone, message.text, message.message_id) == \
+        ("agencia-x", "5511999999999", "Oi", "ABC")
+
+    own = {**payload, "data": {**payload["data"], "key": {"fromMe": True}}}
+    assert adapter.normalize(own)["ignored"] == "own message"
+    assert adapter.normalize({"event": "connection.update"})["ignored"] == "event type: connection.update"
+    assert adapter.normalize({"event": "messages.update", "data": [{"keyId": "X", "status": "READ"}]})["statuses"] == \
+        [{"message_id": "X", "status": "READ"}]
+
+
+def test_meta_adapter_normalizes_batch():
+    """Meta: todas as mensagens do lote, com phone_number_id como remetente"""
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {
+            "metadata": {"phone_number_id": "111"},
+            "messages": [
+                {"id": "m1", "from": "5511000000001", "type": "text", "text": {"body": "Oi"}},
+                {"id": "m2", "from": "5511000000002", "type": "text", "text": {"body": "Olá"}},
+            ]
+        }}]}]
+    }
+
+    result = MetaAdapter().normalize(payload)
+
+    assert [(m.sender_id, m.message_id, m.text) for m in result["messages"]] == \
+        [("111", "m1", "Oi"), ("111", "m2", "Olá")]
+    assert MetaAdapter().normalize({})["ignored"] == "not whatsapp"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_times_stages_and_runs_side_effects_in_background(pipeline, monkeypatch):
+    """Cada etapa é cronometrada e os efeitos colaterais não bloqueiam a resposta"""
+    monkeypatch.setattr(settings, "PIPELINE_ASYNC_SIDE_EFFECTS", True)
+    adapter = FakeAdapter([_message("Oi", "m1")])
+    release = asyncio.Event()
+    background = []
+
+    async def slow_side_effects(ctx):
+        await release.wait()
+        background.append(ctx.message.text)
+
+    monkeypatch.setattr(pipeline, "_side_effects", slow_side_effects)
+    observed = []
+    monkeypatch.setattr(pipeline_module.metrics, "observe",
+                        lambda name, value, **labels: observed.append(labels.get("stage")))
+
+    batch = await pipeline.handle(adapter, {})
+
+    assert batch["results"][0]["status"] == "success"
+    assert adapter.sent == [("5511999999999", "resposta: Oi")]
+    assert background == []
+    release.set()
+    await pipeline.drain()
+    assert background == ["Oi"]
+    assert {"normalize", "tenant", "admission_context", "generate", "reply", "persist"} <= set(observed)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_skips_duplicates_and_releases_failed_messages(pipeline, monkeypatch):
+    """Reentrega do mesmo message_id é ignorada, exceto se o processamento falhou"""
+    monkeypatch.setattr(settings, "PIPELINE_ASYNC_SIDE_EFFECTS", False)
+
+    first = await pipeline.handle(FakeAdapter([_message("Oi", "m1")]), {})
+    again = await pipeline.handle(FakeAdapter([_message("Oi", "m1")]), {})
+    assert first["results"][0]["status"] == "success"
+    assert again["results"] == [] and again["duplicates"] == 1
+
+    failed = await pipeline.handle(FakeAdapter([_message("boom", "m2")]), {})
+    assert failed["results"][0]["status"] == "error"
+    retried = await pipeline.handle(FakeAdapter([_message("boom", "m2")]), {})
+    assert retried["results"][0]["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_keeps_claim_when_failure_follows_reply(pipeline, monkeypatch):
+    """Falha ao salvar o histórico depois da resposta não libera a reentrega"""
+    monkeypatch.setattr(settings, "PIPELINE_ASYNC_SIDE_EFFECTS", False)
+    history = pipeline_module.ConversationService.return_value.update_conversation_history
+    history.side_effect = RuntimeError("banco indisponível")
+    adapter = FakeAdapter([_message("Oi", "m3")])
+
+    failed = await pipeline.handle(adapter, {})
+    again = await pipeline.handle(adapter, {})
+
+    assert failed["results"][0]["status"] == "error"
+    assert again["results"] == [] and again["duplicates"] == 1
+    assert adapter.sent == [("5511999999999", "resposta: Oi")]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_keeps_order_per_lead_and_reports_unknown_tenant(pipeline, monkeypatch):
+    """Mensagens do mesmo lead em ordem; agência não encontrada vira erro 404"""
+    monkeypatch.setattr(settings, "PIPELINE_ASYNC_SIDE_EFFECTS", False)
+    adapter = FakeAdapter([_message("1"), _message("a", phone="5511000000002"), _message("2")])
+
+    await pipeline.handle(adapter, {})
+    assert [text for phone, text in adapter.sent if phone == "5511999999999"] == ["resposta: 1", "resposta: 2"]
+
+    missing = await pipeline.handle(FakeAdapter([_message("Oi")], agency="missing"), {})
+    assert missing["results"][0]["status_code"] == 404
@@ -1,5 +1,9 @@
 
+import hashlib
+import hmac
+import json
 import pytest
+from app.config import settings
 
 @pytest.mark.asyncio
 async def test_meta_webhook_verification(client):
@@ -58,3 +62,54 @@ async def test_meta_webhook_post_message(client):
     response = await client.post("/webhooks/meta", json=payload)
     assert response.status_code == 200
     assert response.json()["status"] == "received"
+
+
+def test_meta_parser_reads_every_message_and_status():
+    """Parser percorre todos os entries/changes/messages/statuses do lote"""
+    from app.services.meta_whatsapp_service import MetaWhatsAppService
+
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"changes": [{"value": {
+                "metadata": {"phone_number_id": "111"},
+                "contacts": [{"wa_id": "5511000000001", "profile": {"name": "Ana"}},
+                             {"wa_id": "5511000000002", "profile": {"name": "Bruno"}}],
+                "messages": [
+                    {"id": "m1", "from": "5511000000001", "type": "text", "text": {"body": "Oi"}},
+                    {"id": "m2", "from": "5511000000002", "type": "interactive",
+                     "interactive": {"button_reply": {"title": "Quero agendar"}}},
+                ]
+            }}]},
+            {"changes": [{"value": {
+                "metadata": {"phone_number_id": "222"},
+                "statuses": [{"id": "wamid.1", "status": "delivered", "recipient_id": "5511000000003"}]
+            }}]},
+        ]
+    }
+
+    events = MetaWhatsAppService.parse_webhook_events(payload)
+
+    assert [m["text"] for m in events["messages"]] == ["Oi", "Quero agendar"]
+    assert [m["contact_name"] for m in events["messages"]] == ["Ana", "Bruno"]
+    assert events["statuses"][0]["status"] == "delivered"
+    assert events["statuses"][0]["phone_number_id"] == "222"
+
+
+@pytest.mark.asyncio
+async def test_meta_webhook_requires_valid_signature(client, monkeypatch):
+    """Com META_APP_SECRET o corpo precisa do X-Hub-Signature-256 correto"""
+    monkeypatch.setattr(settings, "META_APP_SECRET", "segredo")
+    body = json.dumps({"object": "whatsapp_business_account", "entry": []}).encode()
+    signature = "sha256=" + hmac.new(b"segredo", body, hashlib.sha256).hexdigest()
+    headers = {"Content-Type": "application/json"}
+
+    missing = await client.post("/webhooks/meta", content=body, headers=headers)
+    wrong = await client.post("/webhooks/meta", content=body,
+                              headers={**headers, "X-Hub-Signature-256": "sha256=" + "0" * 64})
+    valid = await client.post("/webhooks/meta", content=body,
+                              headers={**headers, "X-Hub-Signature-256": signature})
+
+    assert missing.status_code == 403
+    assert wrong.status_code == 403
+    assert valid.status_code == 200
@@ -0,0 +1,112 @@
+from datetime import datetime, timezone, timedelta
+import pytest
+from app.config import settings
+from app.services.notification_digest_service import (
+    NotificationDigestScheduler, digest_due, render_digest
+)
+
+
+class _Query:
+    """Consulta encadeável mínima sobre listas em memória."""
+
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.filters, self.limit_value, self.update_data = [], None, None
+
+    def select(self, *args):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def lte(self, column, value):
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, value):
+        self.limit_value = value
+        return self
+
+    def update(self, data):
+        self.update_data = data
+        return self
+
+    def execute(self):
+        rows = [row for row in self.db[self.table] if all(f(row) for f in self.filters)]
+        if self.update_data is not None:
+            for row in rows:
+                row.update(self.update_data)
+        result = type("Result", (), {})()
+        result.data = rows[:self.limit_value] if self.limit_value else rows
+        return result
+
+
+class _FakeSupabase:
+    def __init__(self, **tables):
+        self.tables = tables
+
+    def table(self, name):
+        return _Query(self.tables, name)
+
+
+def test_digest_aggregates_events_and_escapes_lead_data():
+    """Um único email lista todos os eventos, com dados do lead escapados"""
+    events = [
+        {"tipo": "qualificado", "lead_data": {"nome": "Ana <script>", "phone": "5511"}},
+        {"tipo": "qualificado", "lead_data": {"nome": "Bruno"}},
+        {"tipo": "agendado", "lead_data": {"nome": "Carla"}},
+    ]
+
+    subject, body, text = render_digest(events, "diario")
+
+    assert subject == "📊 Resumo do dia: 1 agendado, 2 qualificados"
+    assert body.count("<tr><td>") == 3
+    assert "Ana &lt;script&gt;" in body
+    assert "<script>" not in body
+    assert "- [Agendado] Carla" in text
+
+
+def test_digest_due_respects_frequency():
+    """Resumo horário vence após 1h; diário só após 24h"""
+    now = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+    two_hours_ago = (now - timedelta(hours=2)).isoformat()
+
+    assert digest_due({"frequencia_resumo": "horario", "resumo_enviado_em": two_hours_ago}, now)
+    assert not digest_due({"frequencia_resumo": "diario", "resumo_enviado_em": two_hours_ago}, now)
+    assert digest_due({"frequencia_resumo": "diario", "resumo_enviado_em": None}, now)
+
+
+@pytest.mark.asyncio
+async def test_run_once_reads_events_per_tenant(monkeypatch):
+    """O limite de eventos vale por agência: nenhuma agência com eventos é tratada como ociosa"""
+    monkeypatch.setattr(settings, "NOTIFICATION_DIGEST_MAX_EVENTS", 2)
+    configs = [{"tenet_id": t, "email_ativo": True, "notificar_resumo_diario": True,
+                "resumo_enviado_em": None} for t in ("a", "b", "c")]
+    events = [{"id": f"{t}{i}", "tenet_id": t, "resumido_em": None}
+              for t, total in (("a", 3), ("b", 2)) for i in range(total)]
+    scheduler = NotificationDigestScheduler()
+    scheduler._service = type("Service", (), {})()
+    scheduler._service.supabase = _FakeSupabase(notificacoes_config=configs, notificacoes_eventos=events)
+
+    sent = {}
+
+    async def fake_send(config, tenet_events, now):
+        sent[config["tenet_id"]] = [event["id"] for event in tenet_events]
+
+    monkeypatch.setattr(scheduler, "send_digest", fake_send)
+    await scheduler.run_once()
+
+    assert sent == {"a": ["a0", "a1"], "b": ["b0", "b1"]}
+    # Só a agência sem eventos recomeça a contagem
+    assert [c["tenet_id"] for c in configs if c["resumo_enviado_em"]] == ["c"]
@@ -0,0 +1,52 @@
+import pytest
+from app.config import settings
+from app.services.rag_service import rag_service, estimate_tokens, split_into_chunks
+
+
+def _doc(titulo, conteudo, similarity=0.9):
+    return {"titulo": titulo, "conteudo": conteudo, "similarity": similarity}
+
+
+def test_context_respects_token_budget():
+    """Documento longo não pode ultrapassar o orçamento de tokens"""
+    long_text = "\n\n".join(f"Parágrafo {i} sobre planos e preços do produto." * 10 for i in range(50))
+    context = rag_service.assemble_context([_doc("Manual", long_text)], "preços", token_budget=300)
+    assert context["tokens"] <= 300
+    assert context["text"].startswith("[Base de Conhecimento]")
+    assert context["chunks_used"] >= 1
+
+
+def test_duplicate_chunks_are_skipped():
+    """Trechos repetidos em documentos diferentes entram apenas uma vez"""
+    text = "O plano Starter inclui integração com Google Calendar e Google Sheets."
+    docs = [_doc("FAQ", text, 0.95), _doc("FAQ cópia", text, 0.9)]
+    context = rag_service.assemble_context(docs, "plano starter", token_budget=500)
+    assert context["duplicates_skipped"] == 1
+    assert context["documents"] == 1
+
+
+def test_empty_docs_returns_empty_context():
+    """Sem documentos o contexto é vazio e não consome tokens"""
+    context = rag_service.assemble_context([], "qualquer coisa", token_budget=500)
+    assert context["text"] == ""
+    assert context["tokens"] == 0
+
+
+def test_split_into_chunks_limits_size():
+    """Trechos gerados respeitam o limite de tokens"""
+    chunks = split_into_chunks("Frase curta. " * 500, max_tokens=50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 50 for c in chunks)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client, monkeypatch):
+    """Endpoint de métricas retorna snapshot só com o token interno"""
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "segredo-interno")
+
+    assert (await client.get("/health/metrics")).status_code == 401
+    assert (await client.get("/health/metrics", headers={"X-Metrics-Token": "errado"})).status_code == 401
+
+    response = await client.get("/health/metrics", headers={"X-Metrics-Token": "segredo-interno"})
+    assert response.status_code == 200
+    assert "counters" in response.json()
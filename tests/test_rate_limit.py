@@ -23,3 +23,94 @@ async def test_health_no_rate_limit(client):
     for _ in range(5):
         response = await client.get("/health")
         assert response.status_code == 200
+
+
+def _webhook_app(tenant_limit="2/minute", ip_limit="100/minute"):
+    from fastapi import FastAPI, Request
+    from slowapi import Limiter, _rate_limit_exceeded_handler
+    from slowapi.errors import RateLimitExceeded
+    from app.middleware.webhook_tenant import WebhookTenantMiddleware
+    from app.utils.rate_limit import get_webhook_ip_key, get_webhook_tenant_key
+
+    limiter = Limiter(key_func=get_webhook_tenant_key, storage_uri="memory://", strategy="sliding-window-counter")
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    app.add_middleware(WebhookTenantMiddleware)
+
+    @app.post("/webhooks/whatsapp")
+    @limiter.limit(tenant_limit, key_func=get_webhook_tenant_key)
+    @limiter.limit(ip_limit, key_func=get_webhook_ip_key)
+    async def webhook(request: Request):
+        return {"instance": (await request.json()).get("instance")}
+
+    return app
+
+
+@pytest.fixture
+def known_instances(monkeypatch):
+    """Agências cadastradas: agencia-a e agencia-b."""
+    from app.middleware import webhook_tenant
+
+    lookups = []
+
+    def lookup(instance):
+        lookups.append(instance)
+        return instance in ("agencia-a", "agencia-b")
+
+    monkeypatch.setattr(webhook_tenant, "_lookup_instance", lookup)
+    monkeypatch.setattr(webhook_tenant, "_known_instances", webhook_tenant.OrderedDict())
+    return lookups
+
+
+@pytest.mark.asyncio
+async def test_webhook_limit_is_per_instance(known_instances):
+    """Webhook Evolution limita por instância (agência), não pelo IP compartilhado"""
+    from httpx import AsyncClient, ASGITransport
+
+    async with AsyncClient(transport=ASGITransport(app=_webhook_app()), base_url="http://test") as ac:
+        first = [await ac.post("/webhooks/whatsapp", json={"instance": "agencia-a"}) for _ in range(3)]
+        other = await ac.post("/webhooks/whatsapp", json={"instance": "agencia-b"})
+        spoofed = await ac.post("/webhooks/whatsapp", json={"instance": "agencia-a"},
+                                headers={"X-Forwarded-For": "203.0.113.9"})
+
+    assert [r.status_code for r in first] == [200, 200, 429]
+    assert first[0].json() == {"instance": "agencia-a"}  # corpo repassado intacto
+    assert other.status_code == 200
+    # Outra origem com o nome da instância não usa a cota da agência
+    assert spoofed.status_code == 200
+    assert known_instances.count("agencia-a") == 1  # verificação em cache
+
+
+@pytest.mark.asyncio
+async def test_unknown_instances_share_the_origin_limit(known_instances):
+    """Instâncias inventadas não criam cotas novas: valem o limite da origem"""
+    from httpx import AsyncClient, ASGITransport
+
+    async with AsyncClient(transport=ASGITransport(app=_webhook_app(ip_limit="3/minute")),
+                           base_url="http://test") as ac:
+        invented = [await ac.post("/webhooks/whatsapp", json={"instance": f"falsa-{i}"}) for i in range(3)]
+        known = [await ac.post("/webhooks/whatsapp", json={"instance": "agencia-a"}) for i in range(2)]
+
+    assert [r.status_code for r in invented] == [200, 200, 429]
+    # O teto por origem vale também para instâncias cadastradas
+    assert [r.status_code for r in known] == [429, 429]
+
+
+@pytest.mark.asyncio
+async def test_storage_check_falls_back_without_blocking(monkeypatch):
+    """Storage inacessível é detectado na inicialização, com timeout, sem travar o import"""
+    import time
+    from app.config import settings
+    from app.utils.rate_limit import check_rate_limit_storage, get_storage_uri
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_STORAGE_URI", "")
+    monkeypatch.setattr(settings, "REDIS_URL", "")
+    assert get_storage_uri() == "memory://"
+    assert await check_rate_limit_storage()
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_STORAGE_URI", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(settings, "RATE_LIMIT_STORAGE_TIMEOUT", 0.5)
+    start = time.monotonic()
+    assert not await check_rate_limit_storage()
+    assert time.monotonic() - start < 2
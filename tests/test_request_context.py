@@ -0,0 +1,39 @@
+import asyncio
+import logging
+import pytest
+from app.utils.logger import ContextFilter
+from app.utils.metrics import MetricsRegistry
+from app.utils.request_context import bind_context, get_context
+
+
+@pytest.mark.asyncio
+async def test_context_reaches_background_tasks_and_threads():
+    """Tasks e threads criadas dentro da requisição herdam request_id e tenant"""
+    with bind_context(request_id="req-1", tenet_id="t1"):
+        in_task = asyncio.create_task(_read_context())
+        in_thread = await asyncio.to_thread(get_context)
+
+    assert await in_task == {"request_id": "req-1", "tenet_id": "t1"}
+    assert in_thread == {"request_id": "req-1", "tenet_id": "t1"}
+    assert get_context() == {}
+
+
+async def _read_context():
+    await asyncio.sleep(0)
+    return get_context()
+
+
+def test_metrics_and_logs_pick_up_context():
+    """Métricas ganham tenet_id/stage do contexto; logs ganham também o request_id"""
+    registry = MetricsRegistry()
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "msg", None, None)
+
+    with bind_context(request_id="req-1", tenet_id="t1", stage="generate"):
+        registry.increment("ai_calls")
+        registry.increment("ai_calls", stage="custom")
+        ContextFilter().filter(record)
+
+    labels = [series["labels"] for series in registry.snapshot()["counters"]["ai_calls"]]
+    assert {"tenet_id": "t1", "stage": "generate"} in labels
+    assert {"tenet_id": "t1", "stage": "custom"} in labels
+    assert (record.request_id, record.tenet_id, record.stage) == ("req-1", "t1", "generate")
@@ -0,0 +1,60 @@
+from app.config import settings
+from app.services.google_sheets_service import SheetsBufferedWriter, build_lead_row
+
+
+class _FakeWorksheet:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.options = []
+        self.fail = fail
+
+    def append_rows(self, rows, value_input_option=None):
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        self.calls.append(rows)
+        self.options.append(value_input_option)
+
+
+def test_rows_are_flushed_in_single_append(monkeypatch):
+    """Leads do mesmo tenant são gravados com um único append_rows"""
+    writer = SheetsBufferedWriter()
+    worksheet = _FakeWorksheet()
+    monkeypatch.setattr(writer, "_get_worksheet", lambda tenet_id: worksheet)
+
+    for nome in ("Ana", "Bruno", "Carla"):
+        writer.enqueue("tenet-1", build_lead_row({"nome": nome}))
+    writer.flush_all()
+
+    assert len(worksheet.calls) == 1
+    assert [row[1] for row in worksheet.calls[0]] == ["Ana", "Bruno", "Carla"]
+    assert worksheet.options == ["RAW"]  # "=HYPERLINK(...)" do lead fica como texto
+
+
+def test_failed_flush_keeps_rows_buffered(monkeypatch):
+    """Falha na gravação devolve as linhas ao buffer, na ordem original"""
+    writer = SheetsBufferedWriter()
+    monkeypatch.setattr(writer, "_get_worksheet", lambda tenet_id: _FakeWorksheet(fail=True))
+
+    writer.enqueue("tenet-1", build_lead_row({"nome": "Ana"}))
+    writer.enqueue("tenet-1", build_lead_row({"nome": "Bruno"}))
+    writer.flush_all()
+
+    worksheet = _FakeWorksheet()
+    monkeypatch.setattr(writer, "_get_worksheet", lambda tenet_id: worksheet)
+    writer.flush_all()
+    assert worksheet.calls == []  # ainda em backoff
+    writer.flush_all(force=True)
+    assert [row[1] for row in worksheet.calls[0]] == ["Ana", "Bruno"]
+
+
+def test_buffer_is_dropped_after_max_failed_flushes(monkeypatch):
+    """Tenant que falha sempre tem o buffer descartado após o limite de tentativas"""
+    monkeypatch.setattr(settings, "SHEETS_FLUSH_MAX_ATTEMPTS", 3)
+    writer = SheetsBufferedWriter()
+    monkeypatch.setattr(writer, "_get_worksheet", lambda tenet_id: _FakeWorksheet(fail=True))
+
+    writer.enqueue("tenet-1", build_lead_row({"nome": "Ana"}))
+    for _ in range(3):
+        writer.flush_all(force=True)
+
+    assert not writer._buffers.get("tenet-1")
@@ -0,0 +1,110 @@
+import socketserver
+import threading
+import smtplib
+import pytest
+from app.config import settings
+from app.services.notification_service import NotificationService
+from app.utils.smtp_pool import SMTPPool
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo: aceita tudo e conta conexões/mensagens."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost ESMTP")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(" ")[0].upper()
+            self.server.commands.append(command)
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 OK")
+            elif command == "DATA":
+                self.reply("354 fim com .")
+                while self.rfile.readline().strip() != b".":
+                    pass
+                self.server.messages += 1
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    # O servidor de teste não oferece STARTTLS
+    monkeypatch.setattr(settings, "SMTP_ALLOW_PLAINTEXT", True)
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.commands = []
+    server.connections = 0
+    server.messages = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuses_session(smtp_server):
+    """Envios sequenciais reaproveitam a mesma sessão autenticada"""
+    pool = SMTPPool()
+    host, port = smtp_server.server_address
+
+    for _ in range(3):
+        with pool.connection(host, port, "user", "secret") as server:
+            server.sendmail("a@example.com", ["b@example.com"], "Subject: t\r\n\r\nok")
+    pool.close_all()
+
+    assert smtp_server.messages == 3
+    assert smtp_server.connections == 1
+
+
+def test_sessions_are_not_shared_across_passwords(smtp_server):
+    """Mesmo host e usuário com outra senha (ou sem senha) abrem nova sessão"""
+    pool = SMTPPool()
+    host, port = smtp_server.server_address
+
+    for password in ("secret", "outra", None, "secret"):
+        with pool.connection(host, port, "user", password) as server:
+            server.noop()
+    pool.close_all()
+
+    assert smtp_server.connections == 3
+    assert smtp_server.commands.count("AUTH") == 2
+
+
+def test_connect_requires_starttls(smtp_server, monkeypatch):
+    """Sem STARTTLS e sem opt-in a conexão falha antes do login"""
+    monkeypatch.setattr(settings, "SMTP_ALLOW_PLAINTEXT", False)
+    pool = SMTPPool()
+    host, port = smtp_server.server_address
+
+    with pytest.raises(smtplib.SMTPNotSupportedError):
+        with pool.connection(host, port, "user", "secret"):
+            pass
+
+    assert "AUTH" not in smtp_server.commands
+
+
+@pytest.mark.asyncio
+async def test_send_email_does_not_block_and_reports_success(smtp_server, monkeypatch):
+    """_send_email roda fora do event loop e usa o pool"""
+    host, port = smtp_server.server_address
+    service = NotificationService(supabase_client=None)
+    monkeypatch.setattr(service.encryption, "decrypt", lambda value: "secret")
+    config = {"smtp_host": host, "smtp_port": port, "smtp_user": "user",
+              "smtp_password_encrypted": "x", "smtp_from_email": "a@example.com"}
+
+    assert await service._send_email(config, "b@example.com", "Assunto", "<p>ok</p>")
+    assert smtp_server.messages == 1
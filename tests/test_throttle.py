@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.config import settings
+from app.services.crm_service import CRMService, BaseCRMIntegration, crm_throttle
+from app.utils.throttle import Throttle, MemoryThrottleBackend
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_queues_requests():
+    """Sem tokens, a chamada espera na fila em vez de falhar"""
+    throttle = Throttle(MemoryThrottleBackend())
+    start = time.perf_counter()
+    for _ in range(3):
+        assert await throttle.acquire("t:notion", rate=10.0, burst=1.0, max_wait=1.0) is None
+    assert time.perf_counter() - start >= 0.18
+
+
+@pytest.mark.asyncio
+async def test_long_wait_is_deferred():
+    """Espera acima do limite retorna o tempo sugerido para nova tentativa"""
+    throttle = Throttle(MemoryThrottleBackend())
+    assert await throttle.acquire("t:zoho", rate=0.5, burst=1.0, max_wait=0.1) is None
+    retry_after = await throttle.acquire("t:zoho", rate=0.5, burst=1.0, max_wait=0.1)
+    assert retry_after == pytest.approx(2.0, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_repeated_failures():
+    """Circuito abre após falhas seguidas e fecha com sucesso"""
+    throttle = Throttle(MemoryThrottleBackend())
+    for _ in range(3):
+        await throttle.record_failure("t:pipedrive", threshold=3, cooldown=30)
+    assert await throttle.circuit_open_for("t:pipedrive") > 29
+    await throttle.record_success("t:pipedrive")
+    assert await throttle.circuit_open_for("t:pipedrive") == 0
+
+
+class _FailingCRM(BaseCRMIntegration):
+    calls = 0
+
+    async def send_lead(self, lead_data):
+        _FailingCRM.calls += 1
+        return {"success": False, "status_code": 500, "error": "HTTP 500"}
+
+    async def test_connection(self):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_defers_without_calling_crm(monkeypatch):
+    """Com o circuito aberto o CRM não é chamado e o envio é adiado"""
+    monkeypatch.setattr(settings, "CRM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(crm_throttle, "_backend", MemoryThrottleBackend())
+    service = CRMService(MagicMock())
+    service.CRM_CLASSES = {"failing": _FailingCRM}
+    integration = {"crm_type": "failing"}
+
+    for _ in range(2):
+        await service._send_to_crm("tenet-1", "conversa-1", integration, {"phone": "1"})
+    result = await service._send_to_crm("tenet-1", "conversa-1", integration, {"phone": "1"})
+
+    assert _FailingCRM.calls == 2
+    assert result["deferred"] is True
+    assert result["retry_after"] > 0
+
+
+class _BlockingBackend(MemoryThrottleBackend):
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def reserve(self, *args):
+        self.threads.add(threading.get_ident())
+        return super().reserve(*args)
+
+
+@pytest.mark.asyncio
+async def test_blocking_backend_runs_off_the_event_loop():
+    """Backend com I/O síncrono (Redis) é chamado em outra thread, não no loop"""
+    backend = _BlockingBackend()
+    throttle = Throttle(backend)
+    assert await throttle.acquire("t:rdstation", rate=10.0, burst=5.0) is None
+    assert threading.get_ident() not in backend.threads
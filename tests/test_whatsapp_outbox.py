@@ -0,0 +1,143 @@
+import httpx
+import pytest
+from unittest.mock import MagicMock
+from app.config import settings
+from app.services import whatsapp_outbox_service
+from app.services.whatsapp_outbox_service import WhatsAppOutbox, claim_lease_seconds, typing_delay
+from app.services.whatsapp_service import WhatsAppService
+from app.utils.throttle import MemoryThrottleBackend, Throttle
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setattr(whatsapp_outbox_service, "whatsapp_throttle", Throttle(MemoryThrottleBackend()))
+    monkeypatch.setattr(settings, "WHATSAPP_MESSAGES_PER_SECOND", 1000.0)
+    monkeypatch.setattr(settings, "WHATSAPP_BURST", 1000.0)
+    return WhatsAppOutbox(MagicMock())
+
+
+def _updates(outbox):
+    return [c[0][0] for c in outbox.supabase.table.return_value.update.call_args_list]
+
+
+def test_typing_delay_is_proportional_and_capped(monkeypatch):
+    """Tempo de digitação cresce com o texto e respeita o teto"""
+    monkeypatch.setattr(settings, "WHATSAPP_TYPING_CHARS_PER_SECOND", 20.0)
+    monkeypatch.setattr(settings, "WHATSAPP_TYPING_MAX_DELAY", 3.0)
+    assert typing_delay("a" * 20) == 1.0
+    assert typing_delay("a" * 1000) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_claim_lease_covers_sender_batch(outbox, monkeypatch):
+    """A reserva cobre o envio de todas as mensagens de um remetente no ciclo"""
+    monkeypatch.setattr(settings, "WHATSAPP_MESSAGES_PER_SECOND", 1.0)
+    monkeypatch.setattr(settings, "WHATSAPP_TYPING_MAX_DELAY", 4.0)
+    monkeypatch.setattr(settings, "EVOLUTION_TIMEOUT", 15.0)
+    monkeypatch.setattr(settings, "WHATSAPP_OUTBOX_MAX_PER_SENDER", 10)
+    outbox.supabase.rpc.return_value.execute.return_value.data = []
+
+    await outbox.run_once()
+
+    name, params = outbox.supabase.rpc.call_args[0]
+    assert name == "claim_whatsapp_outbox"
+    assert params["p_per_sender"] == 10
+    assert params["p_lease_seconds"] == claim_lease_seconds() >= 10 * (1 + 4 + 15)
+
+
+@pytest.mark.asyncio
+async def test_messages_keep_order_per_sender_and_track_result(outbox, monkeypatch):
+    """Cada remetente envia na ordem de criação; falhas transitórias voltam à fila"""
+    sent = []
+
+    async def fake_send(item, simulate_typing=True):
+        sent.append(item["message"])
+        if item["message"] == "erro":
+            return {"success": False, "retryable": True, "error": "HTTP 503"}
+        return {"success": True, "message_id": f"id-{item['message']}"}
+
+    monkeypatch.setattr(outbox, "send", fake_send)
+    await outbox.process([
+        {"id": "2", "channel": "evolution", "sender_id": "a", "message": "segunda", "created_at": "2024-01-01T00:00:02+00:00"},
+        {"id": "1", "channel": "evolution", "sender_id": "a", "message": "primeira", "created_at": "2024-01-01T00:00:01+00:00"},
+        {"id": "3", "channel": "meta", "sender_id": "b", "message": "erro", "created_at": "2024-01-01T00:00:03+00:00"},
+    ])
+
+    assert [m for m in sent if m != "erro"] == ["primeira", "segunda"]
+    statuses = [u["status"] for u in _updates(outbox)]
+    assert statuses.count("sent") == 2
+    assert statuses.count("pending") == 1
+
+
+@pytest.mark.asyncio
+async def test_uncertain_send_is_not_retried(outbox, monkeypatch):
+    """Timeout de leitura / 5xx no envio marcam falha em vez de reenviar"""
+    async def fake_send(item, simulate_typing=True):
+        return {"success": False, "retryable": False, "uncertain": True, "error": "ReadTimeout"}
+
+    monkeypatch.setattr(outbox, "send", fake_send)
+    await outbox.process([{"id": "1", "channel": "evolution", "sender_id": "a", "message": "oi"}])
+
+    [update] = _updates(outbox)
+    assert update["status"] == "failed"
+    assert update["last_error"].startswith("Entrega incerta")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure, retryable, uncertain", [
+    (httpx.ConnectError("recusada"), True, False),
+    (httpx.ReadTimeout("sem resposta"), False, True),
+    (httpx.Response(429), True, False),
+    (httpx.Response(503), False, True),
+    (httpx.Response(400), False, False),
+])
+async def test_send_text_retries_only_when_message_was_not_sent(monkeypatch, failure, retryable, uncertain):
+    """Só falhas de conexão e 429 são repetidas; o resto pode já ter sido entregue"""
+    monkeypatch.setattr(settings, "EVOLUTION_MAX_RETRIES", 0)
+
+    def handler(request):
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    service = WhatsAppService("http://evolution.local", "key")
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(service.client, "get_client", lambda: http)
+
+    result = await service.send_text("5511999999999", "oi", "x")
+
+    assert not result["success"]
+    assert result["retryable"] is retryable
+    assert bool(result.get("uncertain")) is uncertain
+
+
+@pytest.mark.asyncio
+async def test_sender_over_rate_is_deferred(outbox, monkeypatch):
+    """Acima da cadência as mensagens são reagendadas sem enviar"""
+    monkeypatch.setattr(settings, "WHATSAPP_MESSAGES_PER_SECOND", 0.01)
+    monkeypatch.setattr(settings, "WHATSAPP_BURST", 1.0)
+    monkeypatch.setattr(settings, "WHATSAPP_SHAPING_MAX_WAIT", 0.0)
+    sent = []
+
+    async def fake_send(item, simulate_typing=True):
+        sent.append(item["id"])
+        return {"success": True, "message_id": "x"}
+
+    monkeypatch.setattr(outbox, "send", fake_send)
+    await outbox.process([
+        {"id": str(i), "channel": "evolution", "sender_id": "lenta", "message": "oi", "created_at": f"2024-01-01T00:00:0{i}+00:00"}
+        for i in range(3)
+    ])
+
+    assert sent == ["0"]
+    assert [u["status"] for u in _updates(outbox)] == ["sent", "pending", "pending"]
+
+
+def test_delivery_status_only_moves_forward(outbox):
+    """Status de entrega só avança a partir de estados anteriores"""
+    assert outbox.update_delivery_status("wamid.1", "DELIVERY_ACK")
+    query = outbox.supabase.table.return_value.update.return_value.eq.return_value
+    query.in_.assert_called_with("status", ["processing", "sent"])
+    assert _updates(outbox)[-1]["status"] == "delivered"
+
+    assert not outbox.update_delivery_status("wamid.1", "DESCONHECIDO")